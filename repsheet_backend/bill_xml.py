@@ -0,0 +1,252 @@
+from io import BytesIO
+import re
+from typing import IO, NamedTuple, Optional
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from repsheet_backend.genai import estimate_tokens
+
+# Increment when the reducer changes, to invalidate the reduced bills cached next to the XML
+BILL_XML_REDUCER_VERSION = 1
+
+XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+# Elements that make up the structure of the legislative text, kept as (attribute-free) elements
+STRUCTURAL_TAGS = {
+    "Bill",
+    "Identification",
+    "BillNumber",
+    "LongTitle",
+    "ShortTitle",
+    "Introduction",
+    "Summary",
+    "Preamble",
+    "Enacts",
+    "Body",
+    "Heading",
+    "Section",
+    "Subsection",
+    "Paragraph",
+    "Subparagraph",
+    "Clause",
+    "Subclause",
+    "Definition",
+    "Provision",
+    "MarginalNote",
+    "Label",
+    "TitleText",
+    "Text",
+    "AmendedText",
+    "Schedule",
+    "ScheduleFormHeading",
+    "TableGroup",
+}
+# Metadata and boilerplate that says nothing about what the bill does
+DROPPED_TAGS = {
+    "BillHistory",
+    "Stages",
+    "RunningHead",
+    "Chamber",
+    "HistoricalNote",
+    "FootnoteRef",
+    "ImageGroup",
+    "Image",
+    # the French term given after each defined English term
+    "DefinedTermFr",
+}
+# Everything else (cross references, emphasis, defined terms etc.) is flattened into its text,
+# with table cells and rows kept apart
+TABLE_CELL_TAGS = {"entry"}
+TABLE_ROW_TAGS = {"row"}
+
+WHITESPACE_REGEX = re.compile(r"\s+")
+
+# Headings in the body of a bill, a Part is level 1 and a Division (in a Part) is level 2
+PART_LEVEL = 1
+DIVISION_LEVEL = 2
+# anything in the body that isn't a Part or Division heading
+ELEMENT_LEVEL = 3
+
+
+def local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def reduced_text(text: str | None) -> str:
+    return escape(WHITESPACE_REGEX.sub(" ", text)) if text else ""
+
+
+def reduce_element(elem: ElementTree.Element, content: str) -> str:
+    tag = local_name(elem.tag)
+    if tag in DROPPED_TAGS or elem.get(XML_LANG, "en") != "en":
+        return ""
+    if tag in STRUCTURAL_TAGS:
+        level = elem.get("level")
+        attributes = f' level="{level}"' if tag == "Heading" and level is not None else ""
+        return f"<{tag}{attributes}>{content.strip()}</{tag}>\n"
+    if tag in TABLE_CELL_TAGS:
+        return content.strip() + " | "
+    if tag in TABLE_ROW_TAGS:
+        return content.strip() + "\n"
+    return content
+
+
+def reduce_bill_xml(source: str | IO[bytes]) -> str:
+    """Reduce bill XML (a path or file) to just the legislative text and headings, dropping
+    attributes, metadata, French text and inline markup. The result is still XML with the same
+    structure, so it can be sectioned. Elements are freed as they are reduced, so the whole tree
+    is never held in memory."""
+    # reduced content of the children of each open element, in document order
+    stack: list[list[str]] = []
+    result = ""
+    for event, elem in ElementTree.iterparse(source, events=("start", "end")):
+        if event == "start":
+            stack.append([])
+            continue
+        children_content = stack.pop()
+        # tails are only complete once the parent has ended, so children are emptied but kept until then
+        content = [reduced_text(elem.text)]
+        for child, child_content in zip(elem, children_content):
+            content.append(child_content)
+            content.append(reduced_text(child.tail))
+        reduced = reduce_element(elem, "".join(content))
+        for child in list(elem):
+            elem.remove(child)
+        elem.text = None
+        if stack:
+            stack[-1].append(reduced)
+        else:
+            result = reduced
+    return result
+
+
+class BillUnit(NamedTuple):
+    """A top level element of a bill, and the level of the structural boundary it starts, if any.
+    Elements of a schedule have the schedule's index and heading, to be wrapped in it again."""
+
+    level: int
+    is_heading: bool
+    xml: str
+    tokens: int
+    schedule: Optional[tuple[int, str]] = None
+
+
+def bill_units(xml_text: str) -> tuple[str, list[BillUnit]]:
+    """Stream through the bill XML, returning the front matter (title, summary etc.) and the
+    top level elements of the body and of each schedule. Elements are freed as they are read so
+    huge bills (and schedules, which hold most of the text of appropriation bills) are never held
+    as a whole tree."""
+    front_matter = []
+    units = []
+    depth = 0
+    in_body = False
+    # the index and heading of the schedule being read, and where its units start
+    schedule: Optional[tuple[int, str]] = None
+    schedule_start = 0
+    schedule_count = 0
+    for event, elem in ElementTree.iterparse(
+        BytesIO(xml_text.encode()), events=("start", "end")
+    ):
+        if event == "start":
+            depth += 1
+            if depth == 2 and elem.tag == "Body":
+                in_body = True
+            elif depth == 2 and elem.tag == "Schedule":
+                schedule = (schedule_count, "")
+                schedule_start = len(units)
+                schedule_count += 1
+            continue
+        depth -= 1
+        if depth == 2 and in_body:
+            level = (
+                int(elem.get("level", ELEMENT_LEVEL)) if elem.tag == "Heading" else ELEMENT_LEVEL
+            )
+            xml = ElementTree.tostring(elem, encoding="unicode")
+            units.append(
+                BillUnit(min(level, ELEMENT_LEVEL), elem.tag == "Heading", xml, estimate_tokens(xml))
+            )
+            elem.clear()
+        elif depth == 2 and schedule is not None:
+            xml = ElementTree.tostring(elem, encoding="unicode")
+            if elem.tag == "ScheduleFormHeading" and len(units) == schedule_start:
+                schedule = (schedule[0], xml)
+            else:
+                # a schedule starts a Part boundary, its elements can be split between sections
+                level = PART_LEVEL if len(units) == schedule_start else ELEMENT_LEVEL
+                units.append(BillUnit(level, False, xml, estimate_tokens(xml), schedule))
+            elem.clear()
+        elif depth == 1:
+            if elem.tag == "Body":
+                in_body = False
+            elif elem.tag == "Schedule" and schedule is not None:
+                if len(units) == schedule_start and schedule[1] != "":
+                    # just a heading, which units_xml adds
+                    units.append(
+                        BillUnit(PART_LEVEL, False, "", estimate_tokens(schedule[1]), schedule)
+                    )
+                elif len(units) == schedule_start:
+                    # just text
+                    xml = ElementTree.tostring(elem, encoding="unicode")
+                    units.append(BillUnit(PART_LEVEL, False, xml, estimate_tokens(xml)))
+                schedule = None
+            else:
+                front_matter.append(ElementTree.tostring(elem, encoding="unicode"))
+            elem.clear()
+    return "".join(front_matter), units
+
+
+def units_xml(units: list[BillUnit]) -> str:
+    """The XML of consecutive units, with the elements of each schedule wrapped in it again, along
+    with its heading, so every section a schedule is split across says which schedule it's from."""
+    parts = []
+    schedule = None
+    for unit in units:
+        if unit.schedule != schedule:
+            if schedule is not None:
+                parts.append("</Schedule>")
+            if unit.schedule is not None:
+                parts.append(f"<Schedule>{unit.schedule[1]}")
+            schedule = unit.schedule
+        parts.append(unit.xml)
+    if schedule is not None:
+        parts.append("</Schedule>")
+    return "".join(parts)
+
+
+def split_units(
+    units: list[BillUnit], token_budget: int, level: int = PART_LEVEL
+) -> list[list[BillUnit]]:
+    """Split units at boundaries of the given level, recursing into smaller boundaries
+    for any piece that is still too big."""
+    pieces: list[list[BillUnit]] = []
+    for unit in units:
+        # consecutive headings stay with the text that follows them, e.g. a Part and its first Division
+        if not pieces or (
+            unit.level <= level and not all(prev.is_heading for prev in pieces[-1])
+        ):
+            pieces.append([])
+        pieces[-1].append(unit)
+    result = []
+    for piece in pieces:
+        if sum(unit.tokens for unit in piece) <= token_budget or level >= ELEMENT_LEVEL:
+            result.append(piece)
+        else:
+            result.extend(split_units(piece, token_budget, level + 1))
+    return result
+
+
+def section_bill_xml(xml_text: str, token_budget: int) -> list[str]:
+    """Split a bill into sections of at most `token_budget` tokens, on Part, Division and Schedule
+    boundaries where possible. Small neighbouring pieces are packed into the same section."""
+    front_matter, units = bill_units(xml_text)
+    sections: list[list[BillUnit]] = []
+    section_tokens = 0
+    for piece in split_units(units, token_budget):
+        piece_tokens = sum(unit.tokens for unit in piece)
+        if not sections or section_tokens + piece_tokens > token_budget:
+            sections.append([])
+            section_tokens = 0
+        sections[-1].extend(piece)
+        section_tokens += piece_tokens
+    # every section gets the front matter, so it knows which bill it is part of
+    return [front_matter + units_xml(section) for section in sections]
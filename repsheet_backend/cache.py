@@ -1,5 +1,5 @@
 import traceback
-from typing import Any, Callable, Literal, Optional, Protocol
+from typing import Any, Callable, Iterable, Literal, Optional, Protocol
 
 from google.cloud import storage
 from google.cloud.storage.blob import BlobWriter
@@ -10,10 +10,12 @@ import hashlib
 import lzma
 import pickle
 from base64 import urlsafe_b64encode
-from functools import wraps
+from functools import cached_property, wraps
 from typing import Any
 import orjson
 
+from repsheet_backend.tracing import traced
+
 CacheKey = str | dict[str, Any]
 """
 A cache key can be either a string or a dictionary of attributes.
@@ -21,6 +23,10 @@ If a dictionary is used, the key will be generated using cache_key to hash the o
 """
 
 MAX_CONCURRENT_CACHE_REQUESTS = 32
+# The blobs stored under each key
+ENTRY_BLOB_NAMES = ("data.json.xz", "data.pickle.xz", "key.json")
+# Cloud Storage batches are limited to 100 calls
+DELETE_BATCH_SIZE = 100
 cache_semaphore = asyncio.Semaphore(MAX_CONCURRENT_CACHE_REQUESTS)
 
 
@@ -56,6 +62,7 @@ class GCSCache:
     """
 
     mode: Literal["pickle", "json"]
+    project: str
     cache_bucket: str
     key_prefix: str
 
@@ -66,12 +73,16 @@ class GCSCache:
         key_prefix: str = "",
         mode: Literal["pickle", "json"] = "pickle",
     ):
+        self.project = project
         self.cache_bucket = cache_bucket
-        self.gcs = storage.Client(project=project)
-        self.bucket = self.gcs.bucket(self.cache_bucket)
         self.key_prefix = key_prefix
         self.mode = mode
 
+    @cached_property
+    def bucket(self) -> storage.Bucket:
+        """The client is created on first use, as it loads credentials."""
+        return storage.Client(project=self.project).bucket(self.cache_bucket)
+
     def _has_sync(self, key: CacheKey) -> bool:
         if not isinstance(key, str):
             key, _ = cache_key(key)
@@ -82,7 +93,7 @@ class GCSCache:
             blob = self.bucket.blob(f"{key}/data.pickle.xz")
         return blob.exists()
 
-    def _set_sync(self, key: CacheKey, value: Any):
+    def _set_sync(self, key: CacheKey, value: Any) -> int:
         if not isinstance(key, str):
             key, key_json = cache_key(key)
         else:
@@ -100,6 +111,7 @@ class GCSCache:
             json_blob = self.bucket.blob(f"{key}/key.json")
             with BlobWriter(json_blob) as f:
                 f.write(key_json)
+        return len(data)
 
     def _get_sync(self, key: CacheKey) -> Any:
         try:
@@ -130,19 +142,21 @@ class GCSCache:
         """Checks if we can connect to the bucket. Doesn't actually "initialize" anything per se."""
         await asyncio.to_thread(self.bucket.reload)
 
-    async def set(self, key: CacheKey, value: Any):
-        """Set a value in the cache.
+    @traced("cache")
+    async def set(self, key: CacheKey, value: Any) -> int:
+        """Set a value in the cache, returning the size of the stored value in bytes.
 
         Args:
             key: The key to use for the cache entry. If not a string, the key will be generated using cache_key.
             value: The value to store in the cache.
         """
         async with cache_semaphore:
-            await asyncio.to_thread(self._set_sync, key, value)
+            return await asyncio.to_thread(self._set_sync, key, value)
 
     def set_nowait(self, key: CacheKey, value: Any):
         asyncio.create_task(self.set(key, value))
 
+    @traced("cache")
     async def get(self, key: CacheKey) -> Any:
         """Get a value from the cache.
 
@@ -152,6 +166,7 @@ class GCSCache:
         async with cache_semaphore:
             return await asyncio.to_thread(self._get_sync, key)
 
+    @traced("cache")
     async def has(self, key: CacheKey) -> bool:
         """Check if a key exists in the cache.
 
@@ -161,6 +176,26 @@ class GCSCache:
         async with cache_semaphore:
             return await asyncio.to_thread(self._has_sync, key)
 
+    def list_entries(self) -> dict[str, int]:
+        """Every key in the cache, with the total size in bytes of its blobs.
+        This lists the whole prefix, so takes a while for a big cache."""
+        sizes: dict[str, int] = {}
+        for blob in self.bucket.list_blobs(prefix=self.key_prefix):
+            key = blob.name.removeprefix(self.key_prefix).split("/")[0]
+            sizes[key] = sizes.get(key, 0) + (blob.size or 0)
+        return sizes
+
+    def delete_entries(self, keys: Iterable[str]) -> None:
+        """Delete the blobs of each key (as returned by cache_key or list_entries)."""
+        blobs = [
+            self.bucket.blob(f"{self.key_prefix}{key}/{blob_name}")
+            for key in keys
+            for blob_name in ENTRY_BLOB_NAMES
+        ]
+        for i in range(0, len(blobs), DELETE_BATCH_SIZE):
+            # not every entry has every blob
+            self.bucket.delete_blobs(blobs[i : i + DELETE_BATCH_SIZE], on_error=lambda _: None)
+
     def cache_async_function(self, get_key: Optional[Callable] = None):
         """Decorator to cache the return value of an async function.
 
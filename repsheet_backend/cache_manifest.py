@@ -0,0 +1,166 @@
+from collections import defaultdict
+from dataclasses import dataclass
+from functools import cached_property
+import sqlite3
+import time
+from typing import Iterable, Optional
+
+from repsheet_backend.common import load_prompt_template
+
+CACHE_MANIFEST = "genai_cache_manifest.sqlite"
+
+CREATE_MANIFEST_TABLE_QUERY = """
+CREATE TABLE IF NOT EXISTS cache_manifest (
+    [Key] TEXT PRIMARY KEY,
+    [Template] TEXT,
+    [Template Version] TEXT,
+    [Model] TEXT,
+    [Stage] TEXT,
+    [Size] INTEGER,
+    [Created At] REAL,
+    [Last Access] REAL NOT NULL
+)
+"""
+
+# Entries first seen on a read (e.g. written before the manifest existed) have no size or
+# creation time until they are listed by the GC
+RECORD_ACCESS_QUERY = """
+INSERT INTO cache_manifest
+    ([Key], [Template], [Template Version], [Model], [Stage], [Last Access])
+VALUES (:key, :template, :template_version, :model, :stage, :now)
+ON CONFLICT ([Key]) DO UPDATE SET
+    [Template] = COALESCE(excluded.[Template], [Template]),
+    [Template Version] = COALESCE(excluded.[Template Version], [Template Version]),
+    [Model] = excluded.[Model],
+    [Stage] = excluded.[Stage],
+    [Last Access] = excluded.[Last Access]
+"""
+
+RECORD_WRITE_QUERY = """
+INSERT OR REPLACE INTO cache_manifest
+    ([Key], [Template], [Template Version], [Model], [Stage], [Size], [Created At], [Last Access])
+VALUES (:key, :template, :template_version, :model, :stage, :size, :now, :now)
+"""
+
+
+@dataclass
+class ManifestEntry:
+    key: str
+    template: Optional[str]
+    template_version: Optional[str]
+    model: Optional[str]
+    stage: Optional[str]
+    size: Optional[int]
+    created_at: Optional[float]
+    last_access: float
+
+
+class CacheManifest:
+    """A local index of the genai cache, recording which prompt template (and version of it),
+    model and stage each entry was generated for, its size and when it was last read or written,
+    so the cache can be audited and garbage collected without reading every entry.
+
+    The cache itself stays the source of truth: entries written elsewhere are picked up the next
+    time they're read, and `repsheet_backend.scripts.cache_gc` fills in their sizes."""
+
+    manifest_path: str
+
+    def __init__(self, manifest_path: str = CACHE_MANIFEST):
+        self.manifest_path = manifest_path
+
+    @cached_property
+    def db(self) -> sqlite3.Connection:
+        """Opened on first use, so importing doesn't create the file."""
+        db = sqlite3.connect(self.manifest_path)
+        # written to on every cache read, durability isn't worth an fsync each time
+        db.execute("PRAGMA journal_mode = WAL")
+        db.execute("PRAGMA synchronous = NORMAL")
+        db.execute(CREATE_MANIFEST_TABLE_QUERY)
+        db.commit()
+        return db
+
+    def _params(self, key: str, template: Optional[str], model: str, stage: str) -> dict:
+        return {
+            "key": key,
+            "template": template,
+            "template_version": load_prompt_template(template).version if template else None,
+            "model": model,
+            "stage": stage,
+            "now": time.time(),
+        }
+
+    def record_access(self, key: str, template: Optional[str], model: str, stage: str) -> None:
+        self.db.execute(RECORD_ACCESS_QUERY, self._params(key, template, model, stage))
+        self.db.commit()
+
+    def record_write(
+        self, key: str, template: Optional[str], model: str, stage: str, size: int
+    ) -> None:
+        self.db.execute(
+            RECORD_WRITE_QUERY, {**self._params(key, template, model, stage), "size": size}
+        )
+        self.db.commit()
+
+    def record_sizes(self, sizes: dict[str, int]) -> None:
+        self.db.executemany(
+            "UPDATE cache_manifest SET [Size] = ? WHERE [Key] = ?",
+            [(size, key) for key, size in sizes.items()],
+        )
+        self.db.commit()
+
+    def entries(self) -> dict[str, ManifestEntry]:
+        rows = self.db.execute("SELECT * FROM cache_manifest").fetchall()
+        return {row[0]: ManifestEntry(*row) for row in rows}
+
+    def accessed_since(self, since: float) -> set[str]:
+        rows = self.db.execute(
+            "SELECT [Key] FROM cache_manifest WHERE [Last Access] >= ?", (since,)
+        ).fetchall()
+        return {key for (key,) in rows}
+
+    def remove(self, keys: Iterable[str]) -> None:
+        self.db.executemany("DELETE FROM cache_manifest WHERE [Key] = ?", [(k,) for k in keys])
+        self.db.commit()
+
+    def template_changes(self) -> str:
+        """Entries recorded for versions of each template other than the current one, which the
+        pipeline won't read again, without listing or replaying anything."""
+        rows = self.db.execute(
+            """SELECT [Template], [Template Version], COUNT(*), COALESCE(SUM([Size]), 0)
+            FROM cache_manifest WHERE [Template] IS NOT NULL
+            GROUP BY [Template], [Template Version]"""
+        ).fetchall()
+        lines = []
+        for template, template_version, count, size in sorted(rows):
+            try:
+                current_version = load_prompt_template(template).version
+            except FileNotFoundError:
+                current_version = None
+            if template_version != current_version:
+                status = "removed" if current_version is None else f"now {current_version}"
+                lines.append(f"{template_version} ({status}): {count} entries, {size / 1e6:.1f} MB")
+        if len(lines) == 0:
+            return "Every recorded entry is for a current template version"
+        return "\n".join(lines)
+
+    def report(self, sizes: dict[str, int]) -> str:
+        """Entries and bytes of the given cache entries by template version and model.
+        Entries missing from the manifest are reported as "unknown"."""
+        entries = self.entries()
+        totals: dict[tuple[str, str], list[int]] = defaultdict(lambda: [0, 0])
+        for key, size in sizes.items():
+            entry = entries.get(key)
+            group = (
+                (entry.template_version or "no template", entry.model or "unknown")
+                if entry is not None
+                else ("unknown", "unknown")
+            )
+            totals[group][0] += 1
+            totals[group][1] += size
+        lines = [f"{'template version':<50} {'model':<30} {'entries':>8} {'MB':>9}"]
+        for (template_version, model), (count, size) in sorted(totals.items()):
+            lines.append(f"{template_version:<50} {model:<30} {count:>8} {size / 1e6:>9.1f}")
+        return "\n".join(lines)
+
+
+cache_manifest = CacheManifest()
@@ -0,0 +1,91 @@
+from os import path
+import os
+import sqlite3
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from repsheet_backend.common import (
+    BILL_FINAL_READING_VOTE_TABLE,
+    BILLS_TABLE,
+    COLUMNAR_DIR,
+    MEMBER_STATS_TABLE,
+    MEMBER_VOTES_TABLE,
+    MEMBERS_TABLE,
+    VOTE_PARTY_SUMMARY_TABLE,
+    VOTE_SUMMARY_TABLE,
+    VOTES_HELD_TABLE,
+)
+
+COLUMNAR_TABLES = (
+    MEMBERS_TABLE,
+    BILLS_TABLE,
+    VOTES_HELD_TABLE,
+    MEMBER_VOTES_TABLE,
+    VOTE_SUMMARY_TABLE,
+    VOTE_PARTY_SUMMARY_TABLE,
+    MEMBER_STATS_TABLE,
+    BILL_FINAL_READING_VOTE_TABLE,
+)
+
+# Low cardinality columns repeated across many rows, stored as dictionary arrays
+# so each distinct string is only stored (and loaded) once
+CATEGORICAL_COLUMNS = {
+    "Vote ID",
+    "Bill ID",
+    "Member ID",
+    "Member of Parliament",
+    "Political Affiliation",
+    "Member Voted",
+    "Paired",
+    "Vote Kind",
+    "Vote Result",
+    "Bill Type",
+    "Province / Territory",
+}
+
+DICTIONARY_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+
+def columnar_path(table: str, directory: str = COLUMNAR_DIR) -> str:
+    """The compressed Parquet copy of a table, for analytics tools and sharing."""
+    return path.join(directory, f"{table}.parquet")
+
+
+def arrow_path(table: str, directory: str = COLUMNAR_DIR) -> str:
+    """The uncompressed Arrow IPC copy of a table, which `load_columnar` memory-maps."""
+    return path.join(directory, f"{table}.arrow")
+
+
+def export_table(db: sqlite3.Connection, table: str, directory: str = COLUMNAR_DIR) -> int:
+    """Write a table to Parquet and Arrow IPC, returning the number of rows written."""
+    df = pd.read_sql_query(f"SELECT * FROM {table}", db)
+    arrow_table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(arrow_table.schema):
+        if field.name in CATEGORICAL_COLUMNS and (
+            pa.types.is_string(field.type) or pa.types.is_large_string(field.type)
+        ):
+            arrow_table = arrow_table.set_column(
+                i, field.name, arrow_table.column(i).cast(DICTIONARY_TYPE)
+            )
+    pq.write_table(arrow_table, columnar_path(table, directory), compression="zstd")
+    # decompressing would copy every column, so this one is left uncompressed to map as is
+    with pa.OSFile(arrow_path(table, directory), "wb") as sink:
+        with pa.ipc.new_file(sink, arrow_table.schema) as writer:
+            writer.write_table(arrow_table)
+    return arrow_table.num_rows
+
+
+def export_tables(db: sqlite3.Connection, directory: str = COLUMNAR_DIR) -> None:
+    os.makedirs(directory, exist_ok=True)
+    for table in COLUMNAR_TABLES:
+        rows = export_table(db, table, directory)
+        print(f"Exported {rows} rows from {table} to {columnar_path(table, directory)}")
+
+
+def load_columnar(table: str, directory: str = COLUMNAR_DIR) -> pa.Table:
+    """Load an exported table without copying it: its columns are views of the memory-mapped
+    Arrow file, paged in as they're read. Dictionary encoded columns come back as dictionary
+    arrays, use `.to_pandas()` to get categoricals."""
+    return pa.ipc.open_file(pa.memory_map(arrow_path(table, directory))).read_all()
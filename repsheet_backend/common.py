@@ -1,8 +1,9 @@
-import os
+from functools import cache
+import hashlib
 from os import path
-import pandas as pd
 import sqlite3
 from contextlib import contextmanager
+from dataclasses import dataclass
 from typing import Iterator, Literal, NamedTuple, Optional
 import re
 from httpx import AsyncClient
@@ -55,10 +56,17 @@ CACHE_BUCKET = "repsheet-cache"
 VOTES_HELD_TABLE = "votes_held"
 BILLS_TABLE = "bills"
 MEMBER_VOTES_TABLE = "member_votes"
+MEMBER_VOTES_COMPACT_TABLE = "member_votes_compact"
+VOTE_KEYS_TABLE = "vote_keys"
+MEMBER_KEYS_TABLE = "member_keys"
+PARTY_KEYS_TABLE = "party_keys"
 VOTE_SUMMARY_TABLE = "vote_summary"
 VOTE_PARTY_SUMMARY_TABLE = "vote_party_summary"
+BILL_FINAL_READING_VOTE_TABLE = "bill_final_reading_vote"
 MEMBERS_TABLE = "members"
+MEMBER_STATS_TABLE = "member_stats"
 PARLIAMENTS_TABLE = "parliaments"
+COLUMNAR_DIR = "repsheet_columnar"
 PARTY_LEADERS = (
     "Pierre Poilievre (Carleton)",
     "Jagmeet Singh (Burnaby South)",
@@ -70,43 +78,103 @@ LOCAL_MPS = (
     "Laurel Collins (Victoria)",
 )
 
-os.makedirs(DATA_DIR, exist_ok=True)
+# Found relative to the package rather than the working directory
+PROMPTS_DIR = path.join(path.dirname(path.dirname(path.abspath(__file__))), "prompts")
+PROMPT_PARTIALS = {
+    "{{PARTIALS/ISSUES/001}}": "partials/issues/001.txt",
+    "{{PARTIALS/CONTEXT/001}}": "partials/context/001.txt",
+    "{{PARTIALS/PARLIAMENT/001}}": "partials/parliament/001.txt",
+}
 
-httpx = AsyncClient()
 
-with open("prompts/partials/issues/001.txt", "r") as f:
-    ISSUE_SUMMARY_PARTIAL = f.read()
+@cache
+def http_client() -> AsyncClient:
+    """Created on first use rather than on import, so scripts that don't fetch don't pay for it."""
+    return AsyncClient()
 
-with open("prompts/partials/context/001.txt", "r") as f:
-    CONTEXT_PARTIAL = f.read()
 
-with open("prompts/partials/parliament/001.txt", "r") as f:
-    PARLIAMENT_PARTIAL = f.read()
+@cache
+def read_prompt_file(file_name: str) -> str:
+    with open(path.join(PROMPTS_DIR, file_name), "r") as f:
+        return f.read()
 
 
-def load_prompt_template(file_name: str) -> str:
-    """Read a template file and return its contents."""
-    with open(path.join("prompts", file_name), "r") as f:
-        return (
-            f.read()
-            .replace("{{PARTIALS/ISSUES/001}}", ISSUE_SUMMARY_PARTIAL)
-            .replace("{{PARTIALS/CONTEXT/001}}", CONTEXT_PARTIAL)
-            .replace("{{PARTIALS/PARLIAMENT/001}}", PARLIAMENT_PARTIAL)
-        )
+# Filled in when rendering, e.g. {{RAW_INPUT_DATA}}. Partials are filled in when compiling.
+TEMPLATE_SLOT_REGEX = re.compile(r"\{\{([A-Z_]+)\}\}")
+
+
+def content_version(file_name: str, content: str) -> str:
+    """e.g. "summarize-member/001.txt@1a2b3c4d5e6f", changes whenever the content does."""
+    return f"{file_name}@{hashlib.sha256(content.encode()).hexdigest()[:12]}"
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A template compiled into the literal text between its slots, so rendering is a single
+    join however big the values are, rather than a copy of the whole prompt per replace.
+
+    `version` hashes the template with its partials filled in, so it changes whenever the
+    prompts it renders would, and `partials` has the version of each partial it includes."""
+
+    file_name: str
+    segments: tuple[str, ...]
+    slots: tuple[str, ...]
+    partials: tuple[str, ...]
+    version: str
+
+    @property
+    def prefix(self) -> str:
+        """The literal text before the first slot, the same in every prompt rendered from the
+        template, so templates keep their instructions first and their data last."""
+        return self.segments[0]
+
+    @property
+    def source(self) -> str:
+        """The template with its partials filled in and its slots left as {{SLOT}}."""
+        return self.render(**{slot: f"{{{{{slot}}}}}" for slot in self.slots})
+
+    def render(self, **values: str) -> str:
+        if set(values) != set(self.slots):
+            raise ValueError(
+                f"{self.file_name} has slots {sorted(set(self.slots))}, got {sorted(values)}"
+            )
+        parts = [self.segments[0]]
+        for slot, segment in zip(self.slots, self.segments[1:]):
+            parts.append(values[slot])
+            parts.append(segment)
+        return "".join(parts)
+
 
-def fix_broken_newlines_in_json(text: str):
-    """Sometimes the AI puts unescaped new lines in JSON strings, this should fix that."""
-    inside_quote = False 
-    i = 0
-    while i < len(text):
-        c = text[i]
-        if c == "\n" and inside_quote:
-            text = text[:i] + "\\n" + text[i+1:]
-            i = i + 1
-        if c == '"' and text[i - 1] != "\\":
-            inside_quote = not inside_quote
-        i = i + 1
-    return text
+def compile_prompt_template(file_name: str, template: str) -> PromptTemplate:
+    partials = []
+    for placeholder, partial_file_name in PROMPT_PARTIALS.items():
+        if placeholder in template:
+            partial = read_prompt_file(partial_file_name)
+            partials.append(content_version(partial_file_name, partial))
+            template = template.replace(placeholder, partial)
+    unknown = [
+        placeholder
+        for placeholder in re.findall(r"\{\{[^}]*\}\}", template)
+        if TEMPLATE_SLOT_REGEX.fullmatch(placeholder) is None
+    ]
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown placeholders in {file_name}: {unknown}")
+    # the split alternates literal text and slot names
+    parts = TEMPLATE_SLOT_REGEX.split(template)
+    segments, slots = tuple(parts[0::2]), tuple(parts[1::2])
+    return PromptTemplate(
+        file_name=file_name,
+        segments=segments,
+        slots=slots,
+        partials=tuple(partials),
+        version=content_version(file_name, template),
+    )
+
+
+@cache
+def load_prompt_template(file_name: str) -> PromptTemplate:
+    """Read and compile a template file. Templates are compiled on first use and kept."""
+    return compile_prompt_template(file_name, read_prompt_file(file_name))
 
 
 class BillId(NamedTuple):
@@ -198,4 +266,9 @@ class MemberInfo(BaseModel):
 
     @property
     def url_slug(self) -> str:
-        return f"{self.first_name}_{self.last_name}"
+        return member_slug(self.first_name, self.last_name)
+
+
+def member_slug(first_name: str, last_name: str) -> str:
+    """The URL slug of a member's page, also used to name their photo."""
+    return f"{first_name}_{last_name}"
@@ -1,16 +1,37 @@
 from collections import defaultdict
 from contextlib import contextmanager
 from datetime import datetime
+import hashlib
+import json
 import re
 import sqlite3
-from typing import Iterable, Iterator, Optional
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+    TypeVar,
+)
 import pandas as pd
 from tqdm import tqdm
 
+from repsheet_backend.streams import micro_batches
+from repsheet_backend.tracing import traced
 from repsheet_backend.common import (
+    BILL_FINAL_READING_VOTE_TABLE,
     BILLS_TABLE,
+    COLUMNAR_DIR,
+    MEMBER_KEYS_TABLE,
+    MEMBER_STATS_TABLE,
+    MEMBER_VOTES_COMPACT_TABLE,
     MEMBER_VOTES_TABLE,
     MEMBERS_TABLE,
+    PARTY_KEYS_TABLE,
+    VOTE_KEYS_TABLE,
     PARLIAMENTS_TABLE,
     PARLIMENTARY_SESSIONS,
     LATEST_PARLIAMENT,
@@ -24,6 +45,7 @@ from repsheet_backend.common import (
     MemberInfo,
     MemberSummary,
     PartyVotes,
+    member_slug,
 )
 
 FULL_MEMBER_NAME_REGEX = re.compile(r"^([^ ]+\. )?([^\(]+)(\([^\)]+\))?$")
@@ -31,21 +53,93 @@ HOUSE_CHAMBER_ID = 1
 SENATE_CHAMBER_ID = 2
 REPSHEET_DB = "repsheet.sqlite"
 
+# Results streamed into the database are committed once this many have arrived,
+# or this many seconds after the first uncommitted one, whichever comes first
+WRITE_BATCH_SIZE = 20
+WRITE_BATCH_SECONDS = 5.0
+
+T = TypeVar("T")
+
+# Store member votes with integer keys, exposing the usual member_votes columns through a view.
+# The default for build_db and run_pipeline, which take --compact-member-votes to turn it on.
+COMPACT_MEMBER_VOTES = False
+MEMBER_VOTED_VALUES = {"Yea": 1, "Nay": 2, "Paired": 3}
+# Compact member votes are passed to SQLite as JSON arrays of about this many rows
+COMPACT_INSERT_ROWS = 10_000
+
+VoteKind = Literal["First Reading", "Second Reading", "Third Reading", "Amendment", "Other"]
+READING_VOTE_KINDS: tuple[VoteKind, ...] = ("First Reading", "Second Reading", "Third Reading")
+
+# Subjects look like "2nd reading and referral to a committee of Bill C-234, ..."
+# or "Amendment to the motion at 3rd reading of Bill C-69, ...". Amendments are checked first,
+# as a vote on an amendment is not a vote on the bill itself even when it happens at a reading.
+AMENDMENT_SUBJECT_REGEX = re.compile(r"\b(sub)?amendments?\b", re.IGNORECASE)
+READING_SUBJECT_REGEX = re.compile(r"\b(1st|first|2nd|second|3rd|third) reading\b", re.IGNORECASE)
+READING_ORDINALS: dict[str, VoteKind] = {
+    "1st": "First Reading",
+    "first": "First Reading",
+    "2nd": "Second Reading",
+    "second": "Second Reading",
+    "3rd": "Third Reading",
+    "third": "Third Reading",
+}
+
+_READING_VOTE_KINDS_SQL = ", ".join(f"'{kind}'" for kind in READING_VOTE_KINDS)
+
+CREATE_BILL_FINAL_READING_VOTE_TABLE_QUERY = f"""
+CREATE TABLE {BILL_FINAL_READING_VOTE_TABLE} (
+    [Member ID] TEXT NOT NULL,
+    [Bill ID] TEXT NOT NULL,
+    [Vote ID] TEXT NOT NULL,
+    PRIMARY KEY ([Member ID], [Bill ID])
+) WITHOUT ROWID
+"""
+
+# The most recent reading vote on each bill that each member took part in. Votes are matched to
+# members by Member ID, so members who could not be matched to one are left out. Vote IDs
+# compare as text ("44-1-99" > "44-1-100"), so votes are ordered by their number, which counts up
+# through the session that the bill belongs to.
+INSERT_BILL_FINAL_READING_VOTE_QUERY = f"""
+INSERT INTO {BILL_FINAL_READING_VOTE_TABLE} ([Member ID], [Bill ID], [Vote ID])
+SELECT
+    member_id,
+    bill_id,
+    vote_id
+FROM (
+    SELECT
+        mv.[Member ID] AS member_id,
+        v.[Bill ID] AS bill_id,
+        v.[Vote ID] AS vote_id,
+        ROW_NUMBER() OVER (
+            PARTITION BY mv.[Member ID], v.[Bill ID]
+            ORDER BY v.[Vote Number] DESC
+        ) AS recency
+    FROM {VOTES_HELD_TABLE} AS v
+    JOIN {MEMBER_VOTES_TABLE} AS mv
+        ON mv.[Vote ID] = v.[Vote ID]
+    WHERE
+        v.[Vote Kind] IN ({_READING_VOTE_KINDS_SQL})
+    AND v.[Bill ID] IS NOT NULL
+    AND mv.[Member ID] IS NOT NULL
+    AND (:bill_ids IS NULL OR v.[Bill ID] IN (SELECT value FROM json_each(:bill_ids)))
+)
+WHERE recency = 1
+"""
+
+# The bills whose final reading votes can change when the given votes are (re)inserted
+DELETE_BILL_FINAL_READING_VOTE_QUERY = f"""
+DELETE FROM {BILL_FINAL_READING_VOTE_TABLE}
+WHERE [Bill ID] IN (SELECT value FROM json_each(:bill_ids))
+"""
+
 MEMBER_BILL_VOTING_QUERY = f"""
 WITH most_recent_reading_vote AS (
 SELECT
-    b.[Bill ID] AS bill_id,
-    MAX(v.[Vote ID]) AS vote_id
-FROM {MEMBER_VOTES_TABLE} AS mv
-JOIN {VOTES_HELD_TABLE} v
-    ON mv.[Vote ID] = v.[Vote ID]
-JOIN {BILLS_TABLE} AS b
-    ON v.[Bill ID] = b.[Bill ID]
-WHERE 
-    mv.[Member ID] = :member_id
-AND v.[Vote Subject] LIKE "%reading%"
-GROUP BY
-    b.[Bill ID]
+    [Bill ID] AS bill_id,
+    [Vote ID] AS vote_id
+FROM {BILL_FINAL_READING_VOTE_TABLE}
+WHERE
+    [Member ID] = :member_id
 )
 
 SELECT
@@ -82,8 +176,133 @@ ORDER BY
     b.[Bill ID] DESC
 """
 
+CREATE_VOTE_KEYS_TABLE_QUERY = f"""
+CREATE TABLE {VOTE_KEYS_TABLE} (
+    [Vote Key] INTEGER NOT NULL PRIMARY KEY,
+    [Vote ID] TEXT NOT NULL UNIQUE
+)
+"""
+
+CREATE_MEMBER_KEYS_TABLE_QUERY = f"""
+CREATE TABLE {MEMBER_KEYS_TABLE} (
+    [Member Key] INTEGER NOT NULL PRIMARY KEY,
+    [Member of Parliament] TEXT NOT NULL UNIQUE,
+    [Member ID] TEXT NULL
+)
+"""
+
+CREATE_PARTY_KEYS_TABLE_QUERY = f"""
+CREATE TABLE {PARTY_KEYS_TABLE} (
+    [Party Key] INTEGER NOT NULL PRIMARY KEY,
+    [Political Affiliation] TEXT NOT NULL UNIQUE
+)
+"""
+
+CREATE_MEMBER_VOTES_COMPACT_TABLE_QUERY = f"""
+CREATE TABLE {MEMBER_VOTES_COMPACT_TABLE} (
+    [Vote Key] INTEGER NOT NULL,
+    [Member Key] INTEGER NOT NULL,
+    [Party Key] INTEGER NOT NULL,
+    [Member Voted] INTEGER NULL,
+    [Paired] TEXT NULL,
+    PRIMARY KEY ([Vote Key], [Member Key])
+) WITHOUT ROWID
+"""
+
+_MEMBER_VOTED_CASE_SQL = " ".join(
+    f"WHEN {value} THEN '{vote}'" for vote, value in MEMBER_VOTED_VALUES.items()
+)
+
+# Same columns as the plain member_votes table, so queries and the frontend work with either layout
+CREATE_MEMBER_VOTES_VIEW_QUERY = f"""
+CREATE VIEW {MEMBER_VOTES_TABLE} AS
+SELECT
+    vk.[Vote ID] AS [Vote ID],
+    mk.[Member ID] AS [Member ID],
+    mk.[Member of Parliament] AS [Member of Parliament],
+    pk.[Political Affiliation] AS [Political Affiliation],
+    CASE mv.[Member Voted] {_MEMBER_VOTED_CASE_SQL} END AS [Member Voted],
+    mv.[Paired] AS [Paired]
+FROM {MEMBER_VOTES_COMPACT_TABLE} AS mv
+JOIN {VOTE_KEYS_TABLE} AS vk
+    ON mv.[Vote Key] = vk.[Vote Key]
+JOIN {MEMBER_KEYS_TABLE} AS mk
+    ON mv.[Member Key] = mk.[Member Key]
+JOIN {PARTY_KEYS_TABLE} AS pk
+    ON mv.[Party Key] = pk.[Party Key]
+"""
+
+# Surrogate keys are assigned and resolved in SQL for a whole JSON array of member votes at once.
+# Members are keyed by name, keeping the Member ID of the first vote they were seen in.
+INSERT_VOTE_KEYS_QUERY = f"""
+INSERT OR IGNORE INTO {VOTE_KEYS_TABLE} ([Vote ID])
+SELECT DISTINCT json_extract(value, '$.vote_id') FROM json_each(:rows)
+"""
+
+INSERT_MEMBER_KEYS_QUERY = f"""
+INSERT OR IGNORE INTO {MEMBER_KEYS_TABLE} ([Member of Parliament], [Member ID])
+SELECT json_extract(value, '$.member'), json_extract(value, '$.member_id') FROM json_each(:rows)
+"""
+
+INSERT_PARTY_KEYS_QUERY = f"""
+INSERT OR IGNORE INTO {PARTY_KEYS_TABLE} ([Political Affiliation])
+SELECT DISTINCT json_extract(value, '$.party') FROM json_each(:rows)
+"""
+
+INSERT_MEMBER_VOTES_COMPACT_QUERY = f"""
+INSERT INTO {MEMBER_VOTES_COMPACT_TABLE}
+    ([Vote Key], [Member Key], [Party Key], [Member Voted], [Paired])
+SELECT
+    vk.[Vote Key],
+    mk.[Member Key],
+    pk.[Party Key],
+    json_extract(r.value, '$.voted'),
+    json_extract(r.value, '$.paired')
+FROM json_each(:rows) AS r
+JOIN {VOTE_KEYS_TABLE} AS vk
+    ON vk.[Vote ID] = json_extract(r.value, '$.vote_id')
+JOIN {MEMBER_KEYS_TABLE} AS mk
+    ON mk.[Member of Parliament] = json_extract(r.value, '$.member')
+JOIN {PARTY_KEYS_TABLE} AS pk
+    ON pk.[Political Affiliation] = json_extract(r.value, '$.party')
+"""
+
 CREATE_VOTE_SUMMARY_TABLE_QUERY = f"""
-CREATE TABLE {VOTE_SUMMARY_TABLE} AS
+CREATE TABLE {VOTE_SUMMARY_TABLE} (
+    [Bill ID] TEXT NULL,
+    [Vote ID] TEXT NOT NULL PRIMARY KEY,
+    [Yea] INTEGER NOT NULL,
+    [Nay] INTEGER NOT NULL,
+    [Yea Percentage] REAL NOT NULL,
+    [Nay Percentage] REAL NOT NULL,
+    [Paired Percentage] REAL NOT NULL
+) WITHOUT ROWID
+"""
+
+CREATE_PARTY_VOTE_SUMMARY_TABLE_QUERY = f"""
+CREATE TABLE {VOTE_PARTY_SUMMARY_TABLE} (
+    [Bill ID] TEXT NULL,
+    [Vote ID] TEXT NOT NULL,
+    [Political Affiliation] TEXT NOT NULL,
+    [Yea] INTEGER NOT NULL,
+    [Nay] INTEGER NOT NULL,
+    [Paired] INTEGER NOT NULL,
+    [Yea Percentage] REAL NOT NULL,
+    [Nay Percentage] REAL NOT NULL,
+    [Paired Percentage] REAL NOT NULL,
+    PRIMARY KEY ([Vote ID], [Political Affiliation])
+) WITHOUT ROWID
+"""
+
+# The summary queries below take the Vote IDs to (re)compute as a JSON array in :vote_ids,
+# so adding a few divisions only touches the summary rows for those divisions.
+DELETE_VOTE_SUMMARY_QUERY = f"""
+DELETE FROM {VOTE_SUMMARY_TABLE}
+WHERE [Vote ID] IN (SELECT value FROM json_each(:vote_ids))
+"""
+
+INSERT_VOTE_SUMMARY_QUERY = f"""
+INSERT INTO {VOTE_SUMMARY_TABLE}
 SELECT
     v.[Bill ID] AS [Bill ID],
     v.[Vote ID] AS [Vote ID],
@@ -95,11 +314,17 @@ SELECT
 FROM {VOTES_HELD_TABLE} AS v
 JOIN {MEMBER_VOTES_TABLE} AS mv
     ON v.[Vote ID] = mv.[Vote ID]
+WHERE v.[Vote ID] IN (SELECT value FROM json_each(:vote_ids))
 GROUP BY v.[Bill ID], v.[Vote ID]
 """
 
-CREATE_PARTY_VOTE_SUMMARY_TABLE_QUERY = f"""
-CREATE TABLE {VOTE_PARTY_SUMMARY_TABLE} AS
+DELETE_PARTY_VOTE_SUMMARY_QUERY = f"""
+DELETE FROM {VOTE_PARTY_SUMMARY_TABLE}
+WHERE [Vote ID] IN (SELECT value FROM json_each(:vote_ids))
+"""
+
+INSERT_PARTY_VOTE_SUMMARY_QUERY = f"""
+INSERT INTO {VOTE_PARTY_SUMMARY_TABLE}
 SELECT
     v.[Bill ID] AS [Bill ID],
     v.[Vote ID] AS [Vote ID],
@@ -113,84 +338,98 @@ SELECT
 FROM {VOTES_HELD_TABLE} AS v
 JOIN {MEMBER_VOTES_TABLE} AS mv
     ON v.[Vote ID] = mv.[Vote ID]
+WHERE v.[Vote ID] IN (SELECT value FROM json_each(:vote_ids))
 GROUP BY v.[Bill ID], v.[Vote ID], mv.[Political Affiliation]
 """
 
-INSERT_MEMBER_VOTES_ATTENDED_QUERY = f"""
-WITH member_vote_count AS (
-SELECT
-    [Member ID],
-    COUNT(*) AS vote_count
-FROM {MEMBER_VOTES_TABLE}
-WHERE [Member ID] IS NOT NULL
-GROUP BY [Member ID])
-
-UPDATE {MEMBERS_TABLE} AS m
-SET [Votes Attended] = mv.vote_count
-FROM member_vote_count AS mv
-WHERE m.[Member ID] = mv.[Member ID]
+CREATE_MEMBER_STATS_TABLE_QUERY = f"""
+CREATE TABLE {MEMBER_STATS_TABLE} (
+    [Member ID] TEXT NOT NULL PRIMARY KEY,
+    [Votes Attended] INTEGER NOT NULL DEFAULT 0,
+    [Votes Attendable] INTEGER NOT NULL DEFAULT 0,
+    [Parliament Count] INTEGER NOT NULL DEFAULT 0,
+    [Private Bill Count] INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY ([Member ID]) REFERENCES {MEMBERS_TABLE}([Member ID])
+) WITHOUT ROWID
 """
 
-INSERT_MEMBER_VOTES_ATTENDABLE_QUERY = f"""
+# Single pass over member_votes, every member gets a row even if they have no votes or private bills
+# The stats of the given members, filtered in each CTE so a refresh only reads their votes
+INSERT_MEMBER_STATS_QUERY = f"""
 WITH parliament_votes AS (
-SELECT 
+SELECT
     Parliament,
-    COUNT(*) AS vote_count      
+    COUNT(*) AS vote_count
 FROM {VOTES_HELD_TABLE}
-GROUP BY Parliament                
+GROUP BY Parliament
 ),
 
-member_parliaments AS (
-SELECT 
+member_parliament_votes AS (
+SELECT
     mv.[Member ID],
-    vh.Parliament
+    vh.Parliament,
+    COUNT(*) AS vote_count
 FROM {MEMBER_VOTES_TABLE} mv
 JOIN {VOTES_HELD_TABLE} vh ON mv.[Vote ID] = vh.[Vote ID]
-WHERE mv.[Member ID] IS NOT NULL
+WHERE mv.[Member ID] IN (SELECT value FROM json_each(:member_ids))
 GROUP BY mv.[Member ID], vh.Parliament
 ),
 
-member_votes_attendable AS (
+member_vote_stats AS (
 SELECT
-    mp.[Member ID],
-    SUM(pv.vote_count) AS possible_votes
-FROM member_parliaments mp
-JOIN parliament_votes pv ON mp.Parliament = pv.Parliament
-GROUP BY mp.[Member ID]
+    mpv.[Member ID],
+    SUM(mpv.vote_count) AS votes_attended,
+    SUM(pv.vote_count) AS votes_attendable,
+    COUNT(*) AS parliament_count
+FROM member_parliament_votes mpv
+JOIN parliament_votes pv ON mpv.Parliament = pv.Parliament
+GROUP BY mpv.[Member ID]
+),
+
+member_private_bills AS (
+SELECT
+    [Private Bill Sponsor Member ID] AS [Member ID],
+    COUNT(*) AS private_bill_count
+FROM {BILLS_TABLE}
+WHERE [Private Bill Sponsor Member ID] IN (SELECT value FROM json_each(:member_ids))
+GROUP BY [Private Bill Sponsor Member ID]
 )
 
-UPDATE {MEMBERS_TABLE} AS m
-SET [Votes Attendable] = mv.possible_votes
-FROM member_votes_attendable AS mv
-WHERE m.[Member ID] = mv.[Member ID]
+INSERT INTO {MEMBER_STATS_TABLE} (
+    [Member ID],
+    [Votes Attended],
+    [Votes Attendable],
+    [Parliament Count],
+    [Private Bill Count]
+)
+SELECT
+    m.[Member ID],
+    COALESCE(mvs.votes_attended, 0),
+    COALESCE(mvs.votes_attendable, 0),
+    COALESCE(mvs.parliament_count, 0),
+    COALESCE(mpb.private_bill_count, 0)
+FROM {MEMBERS_TABLE} m
+LEFT JOIN member_vote_stats mvs ON m.[Member ID] = mvs.[Member ID]
+LEFT JOIN member_private_bills mpb ON m.[Member ID] = mpb.[Member ID]
+WHERE m.[Member ID] IN (SELECT value FROM json_each(:member_ids))
 """
 
-INSERT_PRIVATE_BILL_STATS_QUERY = f"""
-WITH member_parliaments AS (
-SELECT 
-    mv.[Member ID],
-    COUNT(DISTINCT vh.Parliament) AS parliament_count
+DELETE_MEMBER_STATS_QUERY = f"""
+DELETE FROM {MEMBER_STATS_TABLE}
+WHERE [Member ID] IN (SELECT value FROM json_each(:member_ids))
+"""
+
+# Adding a vote changes the votes attended by the members who voted in it, and the votes
+# attendable by every member who voted in that parliament
+MEMBERS_AFFECTED_BY_VOTES_QUERY = f"""
+SELECT DISTINCT mv.[Member ID]
 FROM {MEMBER_VOTES_TABLE} mv
 JOIN {VOTES_HELD_TABLE} vh ON mv.[Vote ID] = vh.[Vote ID]
 WHERE mv.[Member ID] IS NOT NULL
-GROUP BY mv.[Member ID]
-),
-
-member_private_bills AS (
-SELECT 
-    m.[Member ID],
-    COUNT(*) AS private_bill_count
-FROM {BILLS_TABLE} b
-JOIN {MEMBERS_TABLE} m ON b.[Private Bill Sponsor Member ID] = m.[Member ID]
-GROUP BY m.[Member ID]
+AND vh.Parliament IN (
+    SELECT Parliament FROM {VOTES_HELD_TABLE}
+    WHERE [Vote ID] IN (SELECT value FROM json_each(:vote_ids))
 )
-
-UPDATE {MEMBERS_TABLE} AS m
-SET [Parliament Count] = mp.parliament_count,
-    [Private Bill Count] = mb.private_bill_count
-FROM member_parliaments mp
-JOIN member_private_bills mb ON mp.[Member ID] = mb.[Member ID]
-WHERE m.[Member ID] = mp.[Member ID]
 """
 
 # I wish "animous" was a correct word to use here
@@ -270,6 +509,7 @@ class RepsheetDB:
         self._full_member_name_cache[full_member_name] = result
         return result
 
+    @traced("db")
     def create_parliaments_table(self):
         self.db.execute(f"DROP TABLE IF EXISTS {PARLIAMENTS_TABLE}")
         self.db.execute(
@@ -293,14 +533,18 @@ class RepsheetDB:
             )
         print(f"Inserted {len(PARLIAMENT_META)} parliaments into {PARLIAMENTS_TABLE} table.")
 
+    @traced("db")
     def create_members_table(self, members: pd.DataFrame):
         members["Start Date"] = members["Start Date"].apply(parse_parl_datetime)
         members["End Date"] = members["End Date"].apply(parse_parl_datetime)
         members["Member ID"] = members.apply(
             lambda row: f"{row['First Name']} {row["Last Name"]} ({row["Constituency"]})", axis=1
         )
+        members["Slug"] = members.apply(
+            lambda row: member_slug(row["First Name"], row["Last Name"]), axis=1
+        )
         members["Photo URL"] = members.apply(
-            lambda row: f"https://storage.googleapis.com/repsheet-images/photos/{row['First Name']}_{row['Last Name']}.jpg", axis=1
+            lambda row: f"https://storage.googleapis.com/repsheet-images/photos/{row['Slug']}.jpg", axis=1
         )
 
         self.db.execute(f"DROP TABLE IF EXISTS {MEMBERS_TABLE}")
@@ -317,9 +561,12 @@ class RepsheetDB:
             "[End Date] TIMESTAMP, "
             "[Summary] TEXT NULL, "
             "[Short Summary] TEXT NULL, "
-            "[Photo URL] TEXT NOT NULL "
+            "[Photo URL] TEXT NOT NULL, "
+            "[Slug] TEXT NOT NULL "
             ")"
         )
+        # static site builds look up each member page by slug
+        self.db.execute(f"CREATE UNIQUE INDEX idx_members_slug ON {MEMBERS_TABLE} ([Slug])")
 
         members.to_sql(MEMBERS_TABLE, self.db, if_exists="append", index=False)
         print(f"Inserted {len(members)} members into {MEMBERS_TABLE} table.")
@@ -330,6 +577,7 @@ class RepsheetDB:
         assert self.find_member_id("Senator Josée Verner (Louis-Saint-Laurent)") is None
         assert self.find_member_id("Gord Johns") is not None
 
+    @traced("db")
     def create_bills_table(self, bills_by_session: dict[str, list[dict]]):
         self.db.execute(f"DROP TABLE IF EXISTS {BILLS_TABLE}")
         self.db.execute(
@@ -350,6 +598,10 @@ class RepsheetDB:
             f"FOREIGN KEY ([Private Bill Sponsor Member ID]) REFERENCES {MEMBERS_TABLE}([Member ID]) "
             ")"
         )
+        # covers counting a member's private bills on their page
+        self.db.execute(
+            f"CREATE INDEX idx_bills_sponsor ON {BILLS_TABLE} ([Private Bill Sponsor Member ID])"
+        )
 
         assert bills_by_session.keys() == set(PARLIMENTARY_SESSIONS)
         for psession, bills in bills_by_session.items():
@@ -419,6 +671,7 @@ class RepsheetDB:
                 f"Inserted {len(bill_rows)} bills into {BILLS_TABLE} table from session {psession}."
             )
 
+    @traced("db")
     def create_votes_table(self, votes_by_session: dict[str, pd.DataFrame]) -> None:
         self.db.execute(f"DROP TABLE IF EXISTS {VOTES_HELD_TABLE}")
         self.db.execute(
@@ -436,19 +689,31 @@ class RepsheetDB:
             "[Bill Number] TEXT NULL, "
             "[Bill ID] TEXT NULL, "
             "[Agreed To] INTEGER NOT NULL, "
+            "[Vote Kind] TEXT NOT NULL, "
             f"FOREIGN KEY ([Bill ID]) REFERENCES {BILLS_TABLE}([Bill ID]) "
             ")"
         )
         self.db.execute(
             f"CREATE UNIQUE INDEX idx_session_vote_id ON {VOTES_HELD_TABLE} ([Parliament], [Session], [Vote Number])"
         )
+        self.db.execute(
+            f"CREATE INDEX idx_bill_vote_kind ON {VOTES_HELD_TABLE} ([Bill ID], [Vote Kind], [Vote ID])"
+        )
 
         assert votes_by_session.keys() == set(PARLIMENTARY_SESSIONS)
+        self.insert_votes(votes_by_session)
+
+    def insert_votes(self, votes_by_session: dict[str, pd.DataFrame]) -> list[str]:
+        """Insert the votes held in each session, replacing any already stored, e.g. a day's
+        divisions before their `insert_member_votes` and `update_vote_summaries`.
+        Returns the Vote IDs inserted."""
+        vote_ids: list[str] = []
         for p_session, v in votes_by_session.items():
             parliament, session = p_session.split("-")
             v["Vote Subject"] = v["Vote Subject"].astype("string")
             v["Vote Result"] = v["Vote Result"].astype("string")
             v["Agreed To"] = v["Vote Result"].apply(lambda x: True if x == "Agreed To" else False)
+            v["Vote Kind"] = v["Vote Subject"].apply(classify_vote_subject).astype("string")
             v["Bill Number"] = v["Bill Number"].astype("string")
             v["Bill ID"] = (
                 v["Bill Number"]
@@ -467,65 +732,124 @@ class RepsheetDB:
             for c in v.columns:
                 assert v[c].dtype != "object", f"Column {c} is still an object type"
 
+            self.db.execute(
+                f"DELETE FROM {VOTES_HELD_TABLE} WHERE [Vote ID] IN (SELECT value FROM json_each(?))",
+                (json.dumps(v["Vote ID"].tolist()),),
+            )
             v.to_sql(VOTES_HELD_TABLE, self.db, if_exists="append", index=False)
+            vote_ids.extend(v["Vote ID"])
             print(
                 f"Inserted {len(v)} votes into {VOTES_HELD_TABLE} table from session {p_session}."
             )
+        return vote_ids
 
     def get_all_votes_held(self) -> list[str]:
         """Return Vote ID for all votes held"""
         rows = self.db.execute(f"SELECT [Vote ID] FROM {VOTES_HELD_TABLE}").fetchall()
         return [row[0] for row in rows]
     
-    def _insert_member_votes_stats(self) -> None:
-        self.db.execute(
-            f"ALTER TABLE {MEMBERS_TABLE} ADD COLUMN [Votes Attended] INTEGER NOT NULL DEFAULT 0"
-        )
-        self.db.execute(INSERT_MEMBER_VOTES_ATTENDED_QUERY)
-        self.db.execute(
-            f"ALTER TABLE {MEMBERS_TABLE} ADD COLUMN [Votes Attendable] INTEGER NOT NULL DEFAULT 0"
-        )
-        self.db.execute(INSERT_MEMBER_VOTES_ATTENDABLE_QUERY)
-        self.db.execute(   
-            f"ALTER TABLE {MEMBERS_TABLE} ADD COLUMN [Private Bill Count] INTEGER NOT NULL DEFAULT 0"
-        )
-        self.db.execute(
-            f"ALTER TABLE {MEMBERS_TABLE} ADD COLUMN [Parliament Count] INTEGER NOT NULL DEFAULT 0"
-        )
-        self.db.execute(INSERT_PRIVATE_BILL_STATS_QUERY)
-        print(f"Inserted member votes stats into {MEMBERS_TABLE} table.")
-    
+    def _create_member_stats_table(self) -> None:
+        self.db.execute(f"DROP TABLE IF EXISTS {MEMBER_STATS_TABLE}")
+        self.db.execute(CREATE_MEMBER_STATS_TABLE_QUERY)
+        member_ids = [
+            member_id for (member_id,) in self.db.execute(f"SELECT [Member ID] FROM {MEMBERS_TABLE}")
+        ]
+        self.db.execute(INSERT_MEMBER_STATS_QUERY, {"member_ids": json.dumps(member_ids)})
+        print(f"Inserted member votes stats into {MEMBER_STATS_TABLE} table.")
 
-    def create_member_votes_table(self, member_votes_by_vote_id: dict[str, pd.DataFrame]) -> None:
-        self.db.execute(f"DROP TABLE IF EXISTS {MEMBER_VOTES_TABLE}")
-        self.db.execute(
-            f"CREATE TABLE {MEMBER_VOTES_TABLE} ("
-            "[Vote ID] TEXT NOT NULL, "
-            # null if this is not a current MP
-            "[Member ID] TEXT NULL, "
-            "[Member of Parliament] TEXT NOT NULL, "
-            "[Political Affiliation] TEXT NOT NULL, "
-            "[Member Voted] TEXT NULL, "
-            "Paired TEXT NULL, "
-            f"FOREIGN KEY ([Vote ID]) REFERENCES {VOTES_HELD_TABLE}([Vote ID]), "
-            f"FOREIGN KEY ([Member ID]) REFERENCES {MEMBERS_TABLE}([Member ID]), "
-            "PRIMARY KEY ([Vote ID], [Member ID]) "
-            ")"
-        )
+    @traced("db")
+    def create_member_votes_table(
+        self,
+        member_votes_by_vote_id: dict[str, pd.DataFrame],
+        compact: bool = COMPACT_MEMBER_VOTES,
+    ) -> None:
+        if self._has_compact_member_votes():
+            self.db.execute(f"DROP VIEW {MEMBER_VOTES_TABLE}")
+        else:
+            self.db.execute(f"DROP TABLE IF EXISTS {MEMBER_VOTES_TABLE}")
+        for table in (
+            MEMBER_VOTES_COMPACT_TABLE,
+            VOTE_KEYS_TABLE,
+            MEMBER_KEYS_TABLE,
+            PARTY_KEYS_TABLE,
+        ):
+            self.db.execute(f"DROP TABLE IF EXISTS {table}")
 
-        self.db.execute(
-            f"CREATE UNIQUE INDEX IF NOT EXISTS idx_member_vote ON {MEMBER_VOTES_TABLE} ([Vote ID], [Member ID])"
-        )
-        self.db.execute(
-            f"CREATE INDEX IF NOT EXISTS idx_member_vote_id ON {MEMBER_VOTES_TABLE} ([Member ID])"
-        )
-        self.db.execute(
-            f"CREATE INDEX IF NOT EXISTS idx_member_vote_vote_id ON {MEMBER_VOTES_TABLE} ([Vote ID])"
-        )
+        if compact:
+            self.db.execute(CREATE_VOTE_KEYS_TABLE_QUERY)
+            self.db.execute(CREATE_MEMBER_KEYS_TABLE_QUERY)
+            self.db.execute(CREATE_PARTY_KEYS_TABLE_QUERY)
+            self.db.execute(CREATE_MEMBER_VOTES_COMPACT_TABLE_QUERY)
+            self.db.execute(CREATE_MEMBER_VOTES_VIEW_QUERY)
+            self.db.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_member_keys_member_id ON {MEMBER_KEYS_TABLE} ([Member ID])"
+            )
+            self.db.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_member_vote_compact_member ON {MEMBER_VOTES_COMPACT_TABLE} ([Member Key])"
+            )
+        else:
+            self.db.execute(
+                f"CREATE TABLE {MEMBER_VOTES_TABLE} ("
+                "[Vote ID] TEXT NOT NULL, "
+                # null if this is not a current MP
+                "[Member ID] TEXT NULL, "
+                "[Member of Parliament] TEXT NOT NULL, "
+                "[Political Affiliation] TEXT NOT NULL, "
+                "[Member Voted] TEXT NULL, "
+                "Paired TEXT NULL, "
+                f"FOREIGN KEY ([Vote ID]) REFERENCES {VOTES_HELD_TABLE}([Vote ID]), "
+                f"FOREIGN KEY ([Member ID]) REFERENCES {MEMBERS_TABLE}([Member ID]), "
+                "PRIMARY KEY ([Vote ID], [Member ID]) "
+                ")"
+            )
 
+            self.db.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS idx_member_vote ON {MEMBER_VOTES_TABLE} ([Vote ID], [Member ID])"
+            )
+            self.db.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_member_vote_id ON {MEMBER_VOTES_TABLE} ([Member ID])"
+            )
+            self.db.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_member_vote_vote_id ON {MEMBER_VOTES_TABLE} ([Vote ID])"
+            )
+
+        self.insert_member_votes(member_votes_by_vote_id)
+        self._create_member_stats_table()
+
+    def _has_compact_member_votes(self) -> bool:
+        """True if member_votes is the view over the compact integer-keyed layout."""
+        row = self.db.execute(
+            "SELECT type FROM sqlite_master WHERE name = ?", (MEMBER_VOTES_TABLE,)
+        ).fetchone()
+        return row is not None and row[0] == "view"
+
+    def _insert_compact_member_votes(self, member_votes: pd.DataFrame) -> None:
+        params = {"rows": compact_member_vote_rows(member_votes)}
+        self.db.execute(INSERT_VOTE_KEYS_QUERY, params)
+        self.db.execute(INSERT_MEMBER_KEYS_QUERY, params)
+        self.db.execute(INSERT_PARTY_KEYS_QUERY, params)
+        self.db.execute(INSERT_MEMBER_VOTES_COMPACT_QUERY, params)
+
+    def insert_member_votes(self, member_votes_by_vote_id: dict[str, pd.DataFrame]) -> None:
+        """Insert the member votes for each vote, replacing any already stored for those votes."""
+        compact = self._has_compact_member_votes()
+        vote_ids_json = json.dumps(list(member_votes_by_vote_id.keys()))
+        if compact:
+            self.db.execute(
+                f"DELETE FROM {MEMBER_VOTES_COMPACT_TABLE} WHERE [Vote Key] IN ("
+                f"SELECT [Vote Key] FROM {VOTE_KEYS_TABLE} WHERE [Vote ID] IN (SELECT value FROM json_each(?)))",
+                (vote_ids_json,),
+            )
+        else:
+            self.db.execute(
+                f"DELETE FROM {MEMBER_VOTES_TABLE} WHERE [Vote ID] IN (SELECT value FROM json_each(?))",
+                (vote_ids_json,),
+            )
         print(
             f"Inserting {sum(len(v) for v in member_votes_by_vote_id.values())} member votes into {MEMBER_VOTES_TABLE} table."
         )
+        pending: list[pd.DataFrame] = []
+        pending_rows = 0
         for vote_id, v in tqdm(member_votes_by_vote_id.items()):
             v["Vote ID"] = vote_id
             v["Member ID"] = v["Member of Parliament"].apply(self.find_member_id)
@@ -534,35 +858,102 @@ class RepsheetDB:
                 raise ValueError(
                     f"Found members of latest Parliament we could not match to an ID: {v[v["Member ID"].isna()]}"
                 )
-            v.to_sql(
-                MEMBER_VOTES_TABLE,
-                self.db,
-                if_exists="append",
-                index=False,
-            )
-        self._insert_member_votes_stats()
+            if compact:
+                pending.append(v)
+                pending_rows += len(v)
+                if pending_rows >= COMPACT_INSERT_ROWS:
+                    self._insert_compact_member_votes(pd.concat(pending))
+                    pending = []
+                    pending_rows = 0
+            else:
+                v.to_sql(
+                    MEMBER_VOTES_TABLE,
+                    self.db,
+                    if_exists="append",
+                    index=False,
+                )
+        if pending:
+            self._insert_compact_member_votes(pd.concat(pending))
 
+    @traced("db")
     def create_vote_summary_tables(self):
         self.db.execute(f"DROP TABLE IF EXISTS {VOTE_SUMMARY_TABLE}")
         self.db.execute(f"DROP TABLE IF EXISTS {VOTE_PARTY_SUMMARY_TABLE}")
         self.db.execute(CREATE_VOTE_SUMMARY_TABLE_QUERY)
         self.db.execute(CREATE_PARTY_VOTE_SUMMARY_TABLE_QUERY)
+        self._update_vote_summary_rows(json.dumps(self.get_all_votes_held()))
         print("Inserted voting summary tables.")
 
+    def _update_vote_summary_rows(self, vote_ids_json: str) -> None:
+        params = {"vote_ids": vote_ids_json}
+        self.db.execute(DELETE_VOTE_SUMMARY_QUERY, params)
+        self.db.execute(INSERT_VOTE_SUMMARY_QUERY, params)
+        self.db.execute(DELETE_PARTY_VOTE_SUMMARY_QUERY, params)
+        self.db.execute(INSERT_PARTY_VOTE_SUMMARY_QUERY, params)
+
+    def _table_exists(self, table: str) -> bool:
+        row = self.db.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,)).fetchone()
+        return row is not None
+
+    def update_vote_summaries(self, vote_ids: Iterable[str]) -> None:
+        """Recompute everything derived from the given votes after `insert_votes` and
+        `insert_member_votes` have added (or replaced) them, e.g. a day's divisions: their
+        summary rows, the stats of the members they affect, and the final reading votes of their
+        bills. Everything else is left untouched, and the result is the same as a full rebuild."""
+        vote_ids_json = json.dumps(list(vote_ids))
+        self._update_vote_summary_rows(vote_ids_json)
+        if self._table_exists(MEMBER_STATS_TABLE):
+            member_ids = [
+                member_id
+                for (member_id,) in self.db.execute(
+                    MEMBERS_AFFECTED_BY_VOTES_QUERY, {"vote_ids": vote_ids_json}
+                )
+            ]
+            params = {"member_ids": json.dumps(member_ids)}
+            self.db.execute(DELETE_MEMBER_STATS_QUERY, params)
+            self.db.execute(INSERT_MEMBER_STATS_QUERY, params)
+        if self._table_exists(BILL_FINAL_READING_VOTE_TABLE):
+            bill_ids = [
+                bill_id
+                for (bill_id,) in self.db.execute(
+                    f"SELECT DISTINCT [Bill ID] FROM {VOTES_HELD_TABLE} "
+                    "WHERE [Bill ID] IS NOT NULL AND [Vote ID] IN (SELECT value FROM json_each(?))",
+                    (vote_ids_json,),
+                )
+            ]
+            params = {"bill_ids": json.dumps(bill_ids)}
+            self.db.execute(DELETE_BILL_FINAL_READING_VOTE_QUERY, params)
+            self.db.execute(INSERT_BILL_FINAL_READING_VOTE_QUERY, params)
+
+    @traced("db")
+    def create_bill_final_reading_vote_table(self):
+        """Materializes the reading vote used for each bill in a member's voting record,
+        so `get_member_voting_record` is an index lookup rather than a scan of all their votes."""
+        self.db.execute(f"DROP TABLE IF EXISTS {BILL_FINAL_READING_VOTE_TABLE}")
+        self.db.execute(CREATE_BILL_FINAL_READING_VOTE_TABLE_QUERY)
+        self.db.execute(INSERT_BILL_FINAL_READING_VOTE_QUERY, {"bill_ids": None})
+        print(f"Inserted final reading votes into {BILL_FINAL_READING_VOTE_TABLE} table.")
+
     def get_nonunanimous_bills_voted_on_by_a_current_member(self) -> list[BillId]:
         bills = self.db.execute(NONUNANIMOUS_BILLS_VOTED_ON_BY_ANY_CURRENT_MEMBER_QUERY).fetchall()
         return [BillId(*bill) for bill in bills]
 
     def insert_bill_summaries(self, summaries: dict[BillId, str]) -> None:
-        bill_summaries = [
-            {"summary": summary, "bill_id": str(bill)} for bill, summary in summaries.items()
-        ]
+        self._update_bill_summaries(summaries.items())
+        print(f"Inserted {len(summaries)} bill summaries")
+
+    def _update_bill_summaries(self, summaries: Iterable[tuple[BillId, str]]) -> None:
         self.db.executemany(
             f"UPDATE {BILLS_TABLE} SET Summary = :summary WHERE [Bill ID] = :bill_id",
-            bill_summaries,
+            [{"summary": summary, "bill_id": str(bill)} for bill, summary in summaries],
         )
         self.db.commit()
-        print(f"Inserted {len(bill_summaries)} bill summaries")
+
+    def stream_bill_summaries(
+        self, summaries: AsyncIterable[tuple[BillId, str]]
+    ) -> AsyncIterator[tuple[BillId, str]]:
+        """Write bill summaries as they arrive, yielding each once it has been committed."""
+        return self.stream_writes(summaries, self._update_bill_summaries)
 
     def get_voting_stats(self, vote_id) -> list[tuple[str, PartyVotes]]:
         if vote_id not in self._voting_stats_cache:
@@ -602,6 +993,7 @@ class RepsheetDB:
             self._voting_stats_cache[vote_id] = stats
         return self._voting_stats_cache[vote_id]
 
+    @traced("db")
     def get_member_voting_record(self, member_id: str) -> list[BillVotingRecord]:
         rows = self.db.execute(MEMBER_BILL_VOTING_QUERY, {"member_id": member_id}).fetchall()
         voting_record: list[BillVotingRecord] = []
@@ -656,6 +1048,12 @@ class RepsheetDB:
     def insert_member_summaries(
         self, member_summaries: Iterable[tuple[str, MemberSummary]]
     ) -> None:
+        inserted = self._update_member_summaries(member_summaries)
+        print(f"Inserted {inserted} member summaries")
+
+    def _update_member_summaries(
+        self, member_summaries: Iterable[tuple[str, MemberSummary]]
+    ) -> int:
         summaries_for_db = [
             {"member_id": member_id, "summary": summary.model_dump_json()}
             for member_id, summary in member_summaries
@@ -666,11 +1064,21 @@ class RepsheetDB:
             summaries_for_db,
         )
         self.db.commit()
-        print(f"Inserted {len(summaries_for_db)} member summaries")
+        return len(summaries_for_db)
+
+    def stream_member_summaries(
+        self, member_summaries: AsyncIterable[tuple[str, MemberSummary]]
+    ) -> AsyncIterator[tuple[str, MemberSummary]]:
+        """Write member summaries as they arrive, yielding each once it has been committed."""
+        return self.stream_writes(member_summaries, self._update_member_summaries)
 
     def insert_short_member_summaries(
         self, short_summaries: Iterable[tuple[str, str]]
     ) -> None:
+        inserted = self._update_short_member_summaries(short_summaries)
+        print(f"Inserted {inserted} short member summaries")
+
+    def _update_short_member_summaries(self, short_summaries: Iterable[tuple[str, str]]) -> int:
         summaries_for_db = [
             {"member_id": member_id, "summary": summary}
             for member_id, summary in short_summaries
@@ -681,7 +1089,31 @@ class RepsheetDB:
             summaries_for_db,
         )
         self.db.commit()
-        print(f"Inserted {len(summaries_for_db)} short member summaries")
+        return len(summaries_for_db)
+
+    def stream_short_member_summaries(
+        self, short_summaries: AsyncIterable[tuple[str, str]]
+    ) -> AsyncIterator[tuple[str, str]]:
+        """Write short member summaries as they arrive, yielding each once it has been committed."""
+        return self.stream_writes(short_summaries, self._update_short_member_summaries)
+
+    async def stream_writes(
+        self,
+        results: AsyncIterable[T],
+        write_batch: Callable[[list[T]], Any],
+        batch_size: int = WRITE_BATCH_SIZE,
+        max_delay: float = WRITE_BATCH_SECONDS,
+    ) -> AsyncIterator[T]:
+        """Write results with a single writer in small transactions as they arrive, so progress
+        survives a crash and results aren't held in memory. Each result is yielded once committed
+        so downstream work can start on it straight away."""
+        written = 0
+        async for batch in micro_batches(results, batch_size, max_delay):
+            write_batch(batch)
+            written += len(batch)
+            for committed in batch:
+                yield committed
+        print(f"Committed {written} results")
 
     def get_current_members(self) -> list[MemberInfo]:
         rows = self.db.execute(
@@ -694,6 +1126,47 @@ class RepsheetDB:
         ).fetchall()
         return [MemberInfo.model_validate(dict(row)) for row in rows]
 
+    def get_member_summaries(self) -> list[tuple[str, MemberSummary]]:
+        rows = self.db.execute(
+            f"SELECT [Member ID], Summary FROM {MEMBERS_TABLE} WHERE Summary IS NOT NULL"
+        ).fetchall()
+        return [
+            (member_id, MemberSummary.model_validate_json(summary)) for member_id, summary in rows
+        ]
+
+    def get_member_page_rows(self) -> list[sqlite3.Row]:
+        """All members with the counts shown on their page."""
+        return self.db.execute(
+            f"""SELECT
+                m.*,
+                s.[Votes Attended] AS [Vote Count],
+                s.[Private Bill Count] AS [Bill Count]
+                FROM {MEMBERS_TABLE} AS m
+                LEFT JOIN {MEMBER_STATS_TABLE} AS s
+                    ON m.[Member ID] = s.[Member ID]"""
+        ).fetchall()
+
+    def get_bill_rows(self) -> list[sqlite3.Row]:
+        return self.db.execute(f"SELECT * FROM {BILLS_TABLE}").fetchall()
+
+    def export_columnar(self, directory: str = COLUMNAR_DIR) -> None:
+        """Export the tables as Parquet for analytics, load them with `columnar.load_columnar`."""
+        # pyarrow takes a second to import, only pay for it when exporting
+        from repsheet_backend.columnar import export_tables
+
+        export_tables(self.db, directory)
+
+    def query_fingerprint(self, query: str) -> str:
+        """A hash of the rows returned by a query, used to tell whether a pipeline stage's output
+        is still in the database. Queries on tables that don't exist give an empty hash."""
+        sha = hashlib.sha256()
+        try:
+            for row in self.db.execute(query):
+                sha.update(json.dumps(tuple(row)).encode())
+        except sqlite3.OperationalError:
+            return ""
+        return sha.hexdigest()
+
     def optimize(self):
         # totally pointless given we have no performance issues but I couldn't help myself
         self.db.execute("VACUUM")
@@ -701,6 +1174,39 @@ class RepsheetDB:
         print("Pointlessly optimized database.")
 
 
+def compact_member_vote_rows(member_votes: pd.DataFrame) -> str:
+    """Member votes as the JSON array of rows the compact insert queries read."""
+    voted = member_votes["Member Voted"].map(MEMBER_VOTED_VALUES.get)
+    unexpected = member_votes[member_votes["Member Voted"].notna() & voted.isna()]
+    if len(unexpected) > 0:
+        raise ValueError(f"Unexpected vote values: {unexpected}")
+    rows = pd.DataFrame(
+        {
+            "vote_id": member_votes["Vote ID"],
+            "member": member_votes["Member of Parliament"],
+            "member_id": member_votes["Member ID"],
+            "party": member_votes["Political Affiliation"],
+            "voted": voted.astype("Int64"),
+            "paired": member_votes["Paired"],
+        }
+    )
+    rows_json = rows.to_json(orient="records")
+    assert rows_json is not None
+    return rows_json
+
+
+def classify_vote_subject(subject: Optional[str]) -> VoteKind:
+    """Classifies a vote by its subject, e.g. "3rd reading and adoption of Bill C-5" is a third reading."""
+    if not subject or pd.isna(subject):
+        return "Other"
+    if AMENDMENT_SUBJECT_REGEX.search(subject):
+        return "Amendment"
+    match = READING_SUBJECT_REGEX.search(subject)
+    if match:
+        return READING_ORDINALS[match.group(1).lower()]
+    return "Other"
+
+
 def parse_parl_datetime(date_str: str) -> Optional[pd.Timestamp]:
     """Parses strings in parliamentary datetime format, e.g. 2024-12-17 3:50:01 p.m."""
     if not date_str or pd.isna(date_str):
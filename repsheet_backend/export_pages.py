@@ -0,0 +1,104 @@
+import hashlib
+import os
+from os import path
+from typing import Any, Literal, Optional
+
+import orjson
+
+from repsheet_backend.common import BillSummary, MemberSummary
+from repsheet_backend.db import RepsheetDB
+
+PAGE_DATA_DIR = "page_data"
+MANIFEST_FILENAME = "manifest.json"
+
+PageKind = Literal["members", "bills"]
+
+
+def member_page(row: dict[str, Any]) -> dict[str, Any]:
+    """Page data for a member, with the summary parsed and validated up front."""
+    summary = row.pop("Summary")
+    vote_count = row.pop("Vote Count")
+    bill_count = row.pop("Bill Count")
+    return {
+        "member": row,
+        "summary": (
+            MemberSummary.model_validate_json(summary).model_dump(mode="json")
+            if summary is not None
+            else None
+        ),
+        "voteCount": vote_count or 0,
+        "billCount": bill_count or 0,
+    }
+
+
+def bill_page(row: dict[str, Any]) -> dict[str, Any]:
+    """Page data for a bill, with the summary parsed and validated up front."""
+    summary = row.pop("Summary")
+    return {
+        "bill": row,
+        "summary": (
+            BillSummary.model_validate_json(summary).model_dump(mode="json")
+            if summary is not None
+            else None
+        ),
+    }
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def read_manifest(directory: str = PAGE_DATA_DIR) -> Optional[dict]:
+    manifest_path = path.join(directory, MANIFEST_FILENAME)
+    if not path.exists(manifest_path):
+        return None
+    with open(manifest_path, "rb") as f:
+        return orjson.loads(f.read())
+
+
+def write_pages(
+    kind: PageKind,
+    pages: dict[str, dict[str, Any]],
+    previous: dict[str, dict[str, str]],
+    directory: str = PAGE_DATA_DIR,
+) -> dict[str, dict[str, str]]:
+    """Write one JSON document per page, skipping those whose content hash is unchanged.
+    Returns the manifest entries for this kind of page."""
+    os.makedirs(path.join(directory, kind), exist_ok=True)
+    entries = {}
+    changed = 0
+    for key, page in pages.items():
+        data = orjson.dumps(page, option=orjson.OPT_SORT_KEYS)
+        relative_path = f"{kind}/{key}.json"
+        entry = {"path": relative_path, "hash": content_hash(data)}
+        file_path = path.join(directory, relative_path)
+        if previous.get(key) != entry or not path.exists(file_path):
+            with open(file_path, "wb") as f:
+                f.write(data)
+            changed += 1
+        entries[key] = entry
+
+    for key in previous.keys() - entries.keys():
+        removed_path = path.join(directory, previous[key]["path"])
+        if path.exists(removed_path):
+            os.remove(removed_path)
+    print(
+        f"Wrote {changed} changed {kind} pages ({len(entries)} total, "
+        f"{len(previous.keys() - entries.keys())} removed)"
+    )
+    return entries
+
+
+def export_pages(db: RepsheetDB, directory: str = PAGE_DATA_DIR) -> None:
+    """Export the data for every member and bill page of the static site, plus a manifest of
+    the pages. The manifest records each page's content hash, so the next export only rewrites
+    the pages that changed."""
+    previous = read_manifest(directory) or {"members": {}, "bills": {}}
+    members = {row["Slug"]: member_page(dict(row)) for row in db.get_member_page_rows()}
+    bills = {row["Bill ID"]: bill_page(dict(row)) for row in db.get_bill_rows()}
+    manifest = {
+        "members": write_pages("members", members, previous["members"], directory),
+        "bills": write_pages("bills", bills, previous["bills"], directory),
+    }
+    with open(path.join(directory, MANIFEST_FILENAME), "wb") as f:
+        f.write(orjson.dumps(manifest, option=orjson.OPT_SORT_KEYS | orjson.OPT_INDENT_2))
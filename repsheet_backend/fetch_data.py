@@ -15,40 +15,40 @@ from repsheet_backend.common import (
     VOTES_HELD_TABLE,
     MEMBER_VOTES_TABLE,
     BillId,
-    httpx,
+    http_client,
 )
-
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(path.join(DATA_DIR, BILLS_TABLE), exist_ok=True)
-os.makedirs(path.join(DATA_DIR, VOTES_HELD_TABLE), exist_ok=True)
-os.makedirs(path.join(DATA_DIR, MEMBER_VOTES_TABLE), exist_ok=True)
+from repsheet_backend.tracing import traced
 
 # maximum concurrent API requests to Parliamentary data
 data_api_semaphore = asyncio.Semaphore(8)
 
 
+@traced("fetch")
 async def fetch_members_csv() -> pd.DataFrame:
     filepath = path.join(DATA_DIR, f"members-{LATEST_PARLIAMENT}.csv")
     if not path.exists(filepath):
         async with data_api_semaphore:
-            resp = await httpx.get(
+            resp = await http_client().get(
                 f"https://www.ourcommons.ca/Members/en/search/csv?parliament={LATEST_PARLIAMENT}&caucusId=all&province=all&gender=all"
             )
         resp.raise_for_status()
+        os.makedirs(path.dirname(filepath), exist_ok=True)
         with open(filepath, "wb") as f:
             f.write(resp.content)
         print(f"Downloaded {filepath}")
     return pd.read_csv(filepath, low_memory=False)
 
 
+@traced("fetch")
 async def fetch_bills_json(session: str) -> list[dict]:
     filepath = path.join(DATA_DIR, BILLS_TABLE, f"bills-{session}.json")
     if not path.exists(filepath):
         async with data_api_semaphore:
-            resp = await httpx.get(
+            resp = await http_client().get(
                 f"https://www.parl.ca/legisinfo/en/bills/json?parlsession={session}"
             )
         resp.raise_for_status()
+        os.makedirs(path.dirname(filepath), exist_ok=True)
         with open(filepath, "wb") as f:
             f.write(resp.content)
         print(f"Downloaded {filepath}")
@@ -56,6 +56,7 @@ async def fetch_bills_json(session: str) -> list[dict]:
         return json.load(f)
 
 
+@traced("fetch")
 async def fetch_all_bills_by_session() -> dict[str, list[dict]]:
     bills = await asyncio.gather(
         *[fetch_bills_json(session) for session in PARLIMENTARY_SESSIONS],
@@ -64,20 +65,23 @@ async def fetch_all_bills_by_session() -> dict[str, list[dict]]:
     return {session: bills for session, bills in zip(PARLIMENTARY_SESSIONS, bills)}
 
 
+@traced("fetch")
 async def fetch_votes_csv(session: str) -> pd.DataFrame:
     filepath = path.join(DATA_DIR, VOTES_HELD_TABLE, f"votes-{session}.csv")
     if not path.exists(filepath):
         async with data_api_semaphore:
-            resp = await httpx.get(
+            resp = await http_client().get(
                 f"https://www.ourcommons.ca/Members/en/votes/csv?parlSession={session}"
             )
         resp.raise_for_status()
+        os.makedirs(path.dirname(filepath), exist_ok=True)
         with open(filepath, "wb") as f:
             f.write(resp.content)
         print(f"Downloaded {filepath}")
     return pd.read_csv(filepath, low_memory=False)
 
 
+@traced("fetch")
 async def fetch_all_votes_by_session() -> dict[str, pd.DataFrame]:
     votes = await asyncio.gather(
         *[fetch_votes_csv(session) for session in PARLIMENTARY_SESSIONS],
@@ -86,6 +90,7 @@ async def fetch_all_votes_by_session() -> dict[str, pd.DataFrame]:
     return {session: votes for session, votes in zip(PARLIMENTARY_SESSIONS, votes)}
 
 
+@traced("fetch")
 async def fetch_member_votes(vote_id: str) -> pd.DataFrame:
     parliament, session, vote_number = vote_id.split("-")
     parliament = int(parliament)
@@ -94,23 +99,27 @@ async def fetch_member_votes(vote_id: str) -> pd.DataFrame:
     filepath = path.join(DATA_DIR, MEMBER_VOTES_TABLE, f"member-votes-{vote_id}.csv")
     if not path.exists(filepath):
         async with data_api_semaphore:
-            resp = await httpx.get(
+            resp = await http_client().get(
                 f"https://www.ourcommons.ca/Members/en/votes/{parliament}/{session}/{vote_number}/csv"
             )
         resp.raise_for_status()
+        os.makedirs(path.dirname(filepath), exist_ok=True)
         with open(filepath, "wb") as f:
             f.write(resp.content)
         print(f"Downloaded {filepath}")
     return pd.read_csv(filepath, low_memory=False)
 
 
+@traced("fetch")
 async def fetch_all_member_votes_by_vote_id(vote_ids: Iterable[str]) -> dict[str, pd.DataFrame]:
     votes = await asyncio.gather(*[fetch_member_votes(vote_id) for vote_id in vote_ids])
     return {vote_id: votes for vote_id, votes in zip(vote_ids, votes)}
 
 
 @retry(stop=stop_after_attempt(10), wait=wait_exponential())
-async def fetch_latest_bill_text(bill: BillId) -> Optional[str]:
+@traced("fetch")
+async def fetch_latest_bill_text_path(bill: BillId) -> Optional[str]:
+    """Download every reading of the bill not yet downloaded, returning the path of the latest."""
     parliament, session, bill_number = bill
     bill_dir = path.join(DATA_DIR, "bill_text", str(parliament), str(session), str(bill_number))
     found_files = []
@@ -126,7 +135,7 @@ async def fetch_latest_bill_text(bill: BillId) -> Optional[str]:
             for bill_type in ("Private", "Government"):
                 url = f"https://www.parl.ca/Content/Bills/{parliament}{session}/{bill_type}/{bill_number}/{filename}"
                 async with data_api_semaphore:
-                    resp = await httpx.get(url)
+                    resp = await http_client().get(url)
                 os.makedirs(path.dirname(filepath), exist_ok=True)
                 with open(filepath, "wb") as f:
                     if resp.status_code == 200:
@@ -140,6 +149,13 @@ async def fetch_latest_bill_text(bill: BillId) -> Optional[str]:
                         f.write(b"")
     if not found_files:
         return None
-    latest_reading_path = max(found_files)
+    return max(found_files)
+
+
+@traced("fetch")
+async def fetch_latest_bill_text(bill: BillId) -> Optional[str]:
+    latest_reading_path = await fetch_latest_bill_text_path(bill)
+    if latest_reading_path is None:
+        return None
     with open(latest_reading_path, "r") as f:
         return f.read()
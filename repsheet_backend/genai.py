@@ -1,9 +1,20 @@
 import asyncio
+from contextlib import contextmanager
+from functools import cache
+from math import ceil
 import os
-from typing import Any, Iterable, Optional
+import time
+from typing import Any, Iterable, Iterator, Optional
+
+import orjson
+from pydantic import BaseModel, ValidationError
 from repsheet_backend.cache import GCSCache
-from repsheet_backend.common import GCP_BILLING_PROJECT, CACHE_BUCKET
+from repsheet_backend.cache_manifest import cache_manifest
+from repsheet_backend.common import GCP_BILLING_PROJECT, CACHE_BUCKET, load_prompt_template
+from repsheet_backend.tracing import traced
+from repsheet_backend.genai_metrics import DEFAULT_STAGE, GenaiCall, genai_metrics
 from google import genai
+from google.genai import types as genai_types
 from google.genai.errors import ClientError
 from google.genai._api_client import _load_auth
 from tenacity import retry, retry_if_exception_type, wait_exponential, stop_after_attempt, retry_if_exception
@@ -13,13 +24,36 @@ from anthropic.types.messages.batch_create_params import Request
 from anthropic.types.messages import MessageBatchRequestCounts
 
 GEMINI_FLASH_2 = "gemini-2.0-flash"
+GEMINI_FLASH_LITE_2 = "gemini-2.0-flash-lite"
 GEMINI_PRO_2_5 = "gemini-2.5-pro-preview-03-25"
 CLAUDE_SONNET = "claude-3-7-sonnet-20250219"
 CLAUDE_HAIKU = "claude-3-5-haiku-20241022"
 
-COST_PER_MTOK = {GEMINI_FLASH_2: 0.15}
+# USD per million (input, output) tokens
+COST_PER_MTOK = {
+    GEMINI_FLASH_2: (0.15, 0.60),
+    GEMINI_FLASH_LITE_2: (0.075, 0.30),
+    GEMINI_PRO_2_5: (1.25, 10.0),
+    CLAUDE_SONNET: (3.0, 15.0),
+    CLAUDE_HAIKU: (0.80, 4.0),
+}
+# Anthropic's message batches are half price
+BATCH_COST_MULTIPLIER = 0.5
+# Relative to the input price, writing a prompt prefix to Anthropic's prompt cache costs a bit
+# more, and reading it back much less
+CACHE_WRITE_COST_MULTIPLIER = 1.25
+CACHE_READ_COST_MULTIPLIER = 0.1
+
+CONTEXT_WINDOW = {
+    GEMINI_FLASH_2: 1e6,
+    GEMINI_FLASH_LITE_2: 1e6,
+    CLAUDE_HAIKU: 200000,
+    CLAUDE_SONNET: 200000,
+}
 
-CONTEXT_WINDOW = {GEMINI_FLASH_2: 1e6}
+# There's no local tokenizer for Claude, this is a conservative average for English prose and JSON
+# so estimates err on the side of too many tokens rather than overflowing a budget
+CHARS_PER_TOKEN = 3.5
 
 MAX_OUTPUT_TOKENS = {
     CLAUDE_HAIKU: 8192,
@@ -28,19 +62,125 @@ MAX_OUTPUT_TOKENS = {
 
 MAX_CONCURRENT_REQUESTS = 32
 
-# I think there's a weird thread-safety bug or something but it was unable to get the access token
-# unless I generated the credentials separately like this
-credentials, _ = _load_auth(project=GCP_BILLING_PROJECT)
-google_ai = genai.Client(
-    vertexai=True, project=GCP_BILLING_PROJECT, location="us-central1", credentials=credentials
-)
+GOOGLE_AI_LOCATION = "us-central1"
+ANTHROPIC_API_KEY_ENV = "ANTHROPIC_API_KEY"
+
+
+@cache
+def google_ai_client() -> genai.Client:
+    """Created on first use rather than on import, as it loads credentials, so anything that
+    doesn't call a model can be imported (e.g. by tests) without them."""
+    # I think there's a weird thread-safety bug or something but it was unable to get the access token
+    # unless I generated the credentials separately like this
+    credentials, _ = _load_auth(project=GCP_BILLING_PROJECT)
+    return genai.Client(
+        vertexai=True,
+        project=GCP_BILLING_PROJECT,
+        location=GOOGLE_AI_LOCATION,
+        credentials=credentials,
+    )
+
+
+@cache
+def anthropic_client() -> Anthropic:
+    return Anthropic(api_key=os.environ.get(ANTHROPIC_API_KEY_ENV))
 
-anthropic = Anthropic(
-    api_key=os.environ.get("ANTHROPIC_API_KEY"),
-)
 
 api_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
 
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a prompt without calling the API."""
+    return ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def record_usage(
+    call: GenaiCall,
+    input_tokens: Optional[int],
+    output_tokens: Optional[int],
+    cache_write_tokens: Optional[int] = None,
+    cache_read_tokens: Optional[int] = None,
+):
+    call.input_tokens = input_tokens or 0
+    call.output_tokens = output_tokens or 0
+    call.cache_write_tokens = cache_write_tokens or 0
+    call.cache_read_tokens = cache_read_tokens or 0
+    input_cost, output_cost = COST_PER_MTOK.get(call.model, (0.0, 0.0))
+    call.cost = (
+        call.input_tokens * input_cost
+        + call.cache_write_tokens * input_cost * CACHE_WRITE_COST_MULTIPLIER
+        + call.cache_read_tokens * input_cost * CACHE_READ_COST_MULTIPLIER
+        + call.output_tokens * output_cost
+    ) / 1e6
+    if call.mode == "batch":
+        call.cost *= BATCH_COST_MULTIPLIER
+
+
+def prompt_content(prompt: str, template: Optional[str]) -> str | list[dict[str, Any]]:
+    """The content of an Anthropic user message. A prompt rendered from a template is sent as the
+    template's prefix, marked as a prompt caching breakpoint, followed by the rest of the prompt,
+    so the instructions shared by every prompt (and the response tool before them) are processed
+    once every few minutes rather than for every prompt. Prefixes shorter than the model's
+    minimum (1024 or 2048 tokens) are just not cached."""
+    if template is None:
+        return prompt
+    prefix = load_prompt_template(template).prefix
+    if len(prefix) == 0 or len(prompt) == len(prefix) or not prompt.startswith(prefix):
+        return prompt
+    return [
+        {"type": "text", "text": prefix, "cache_control": {"type": "ephemeral"}},
+        {"type": "text", "text": prompt[len(prefix) :]},
+    ]
+
+
+def usage_params(usage: Any) -> dict[str, Optional[int]]:
+    """The record_usage arguments for an Anthropic response's usage."""
+    return {
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "cache_write_tokens": usage.cache_creation_input_tokens,
+        "cache_read_tokens": usage.cache_read_input_tokens,
+    }
+
+
+def response_tool(response_model: type[BaseModel]) -> dict[str, Any]:
+    """An Anthropic tool the model is forced to call, so its input is JSON matching the schema."""
+    return {
+        "name": response_model.__name__,
+        "description": f"Record the {response_model.__name__}",
+        "input_schema": response_model.model_json_schema(),
+    }
+
+
+def structured_output_params(response_model: Optional[type[BaseModel]]) -> dict[str, Any]:
+    if response_model is None:
+        return {}
+    tool = response_tool(response_model)
+    return {"tools": [tool], "tool_choice": {"type": "tool", "name": tool["name"]}}
+
+
+def message_output(content: list[Any]) -> str:
+    """The text of an Anthropic message, or the JSON input of the tool it called."""
+    for block in content:
+        if block.type == "tool_use":
+            return orjson.dumps(block.input).decode()
+    return content[0].text
+
+
+def validate_response(
+    response: Optional[str], response_model: Optional[type[BaseModel]]
+) -> tuple[Optional[str], bool]:
+    """Returns the response, and whether it is fit to cache. In structured mode responses that fail
+    validation are returned as is for the caller to deal with, but not cached."""
+    if response is None or response_model is None:
+        return response, True
+    try:
+        return response_model.model_validate_json(response).model_dump_json(exclude_none=True), True
+    except ValidationError as e:
+        print(f"Structured response failed validation for {response_model.__name__}: {e}")
+        return response, False
+
+
 # It says "google-ai" but I use it for everything
 genai_cache = GCSCache(
     project=GCP_BILLING_PROJECT,
@@ -49,16 +189,42 @@ genai_cache = GCSCache(
     mode="json",
 )
 
+# Set by `cache_only`
+_cache_only = False
+
+
+@contextmanager
+def cache_only() -> Iterator[None]:
+    """Answer prompts from the cache alone, returning None for anything not cached rather than
+    calling a model, e.g. to replay the pipeline and find the cache entries it still reads."""
+    global _cache_only
+    _cache_only = True
+    try:
+        yield
+    finally:
+        _cache_only = False
+
+
 @retry(
     stop=stop_after_attempt(10),
     wait=wait_exponential(min=5, max=5 * 60),
     retry=retry_if_exception(lambda e: isinstance(e, ClientError) and e.code == 429),
 )
-def _generate_text_google(prompt: str, model: str) -> Optional[str]:
+def _generate_text_google(
+    prompt: str, model: str, call: GenaiCall, response_model: Optional[type[BaseModel]] = None
+) -> Optional[str]:
     """Generate text using Google Gemini."""
+    call.attempts += 1
     print(f"Generating text with {model} ({len(prompt)} chars)")
+    config = (
+        genai_types.GenerateContentConfig(
+            response_mime_type="application/json", response_schema=response_model
+        )
+        if response_model is not None
+        else None
+    )
     try:
-        response = google_ai.models.generate_content(model=model, contents=prompt)
+        response = google_ai_client().models.generate_content(model=model, contents=prompt, config=config)
     except ClientError as e:
         if (
             e.code == 400
@@ -68,6 +234,12 @@ def _generate_text_google(prompt: str, model: str) -> Optional[str]:
             print(f"Prompt too long for {model} ({len(prompt)} chars)")
             return None
         raise e
+    if response.usage_metadata is not None:
+        record_usage(
+            call,
+            response.usage_metadata.prompt_token_count,
+            response.usage_metadata.candidates_token_count,
+        )
     print(f"Received response from {model} ({len(response.text or "")} chars)")
     return response.text
 
@@ -78,31 +250,47 @@ def _generate_text_google(prompt: str, model: str) -> Optional[str]:
     retry=retry_if_exception_type(RateLimitError),
 )
 def _generate_text_anthropic(
-    prompt: str, model: str, output_tokens: Optional[int] = None, temperature: Optional[float] = None
+    prompt: str,
+    model: str,
+    call: GenaiCall,
+    output_tokens: Optional[int] = None,
+    temperature: Optional[float] = None,
+    response_model: Optional[type[BaseModel]] = None,
+    template: Optional[str] = None,
 ) -> Optional[str]:
     """Generate text using Anthropic."""
+    call.attempts += 1
     print(f"Generating text with {model} ({len(prompt)} chars)")
-    response = anthropic.messages.create(
+    response = anthropic_client().messages.create(
         model=model,
         max_tokens=output_tokens or MAX_OUTPUT_TOKENS[model],
-        messages=[{"role": "user", "content": prompt}],
+        messages=[{"role": "user", "content": prompt_content(prompt, template)}],  # type: ignore
         temperature=temperature if temperature is not None else NOT_GIVEN,
+        **structured_output_params(response_model),  # type: ignore
     )
-    result = response.content[0].text  # type: ignore
+    record_usage(call, **usage_params(response.usage))
+    result = message_output(response.content)
     print(f"Received response from {model} ({len(result)} chars)")
     return result
 
 
+@traced("genai")
 async def generate_text(
     prompt: str, 
     model: str = GEMINI_FLASH_2, 
     output_tokens: Optional[int] = None, 
     temperature: Optional[float] = None,
     invalidate_cache: bool = False,
+    response_model: Optional[type[BaseModel]] = None,
+    stage: str = DEFAULT_STAGE,
+    template: Optional[str] = None,
 ) -> Optional[str]:
-    if "{{" in prompt:
-        raise ValueError("Prompt contains unresolved template variables")    
-
+    """Generate text for a prompt, caching the response.
+    If `response_model` is given the model is constrained to output JSON matching its schema
+    (tool use for Anthropic, a response schema for Gemini), and the validated JSON is returned.
+    The call is recorded in `genai_metrics` under `stage`, and the cache entry in `cache_manifest`
+    along with the prompt `template` it was built from. For Anthropic models the template's prefix
+    is prompt cached, see `prompt_content`."""
     cache_key: dict[str, Any] = {
         "method": "generate_text",
         "model": model,
@@ -110,24 +298,53 @@ async def generate_text(
     }
     if temperature is not None:
         cache_key["temperature"] = temperature
-    if not invalidate_cache:
-        cached_response = await genai_cache.get(cache_key)
+    if response_model is not None:
+        cache_key["response_schema"] = response_model.model_json_schema()
+    key = genai_cache.cache_key(cache_key)
+    call = GenaiCall(stage=stage, model=model, mode="online")
+    # a replay reads (and so keeps) the entry that the last regeneration wrote
+    if not invalidate_cache or _cache_only:
+        started_at = time.monotonic()
+        cached_response = await genai_cache.get(key)
         if cached_response is None:
             # No way to distinguish between a cache miss and a cached None value
             # so we have to check if the cache key exists
-            is_cached_none = await genai_cache.has(cache_key)
+            is_cached_none = await genai_cache.has(key)
             if is_cached_none:
+                genai_metrics.record(call, "none", time.monotonic() - started_at)
+                cache_manifest.record_access(key, template, model, stage)
                 return None
         else:
+            genai_metrics.record(call, "hit", time.monotonic() - started_at)
+            cache_manifest.record_access(key, template, model, stage)
             return cached_response
+    if _cache_only:
+        return None
     async with api_semaphore:
-        if model.startswith("claude"):
-            response = await asyncio.to_thread(
-                _generate_text_anthropic, prompt, model, output_tokens, temperature
-            )
-        else:
-            response = await asyncio.to_thread(_generate_text_google, prompt, model)
-    await genai_cache.set(cache_key, response)
+        started_at = time.monotonic()
+        try:
+            if model.startswith("claude"):
+                response = await asyncio.to_thread(
+                    _generate_text_anthropic,
+                    prompt,
+                    model,
+                    call,
+                    output_tokens,
+                    temperature,
+                    response_model,
+                    template,
+                )
+            else:
+                response = await asyncio.to_thread(
+                    _generate_text_google, prompt, model, call, response_model
+                )
+        finally:
+            # failed calls are recorded too, their retries are part of the cost
+            genai_metrics.record(call, "miss", time.monotonic() - started_at)
+    response, cacheable = validate_response(response, response_model)
+    if cacheable:
+        size = await genai_cache.set(cache_key, response)
+        cache_manifest.record_write(key, template, model, stage, size)
     return response
 
 
@@ -144,44 +361,58 @@ def summarize_batch_counts(counts: MessageBatchRequestCounts) -> str:
     return result
 
 
-async def anthropic_wait_for_batch(anthropic_batch_id: str, sleep: int = 60) -> dict[str, str]:
+async def anthropic_wait_for_batch(
+    anthropic_batch_id: str, sleep: int = 60
+) -> dict[str, tuple[str, Any]]:
+    """Returns the output and usage of each request in the batch, by custom ID."""
     while True:
         async with api_semaphore:
-            batch_resp = await asyncio.to_thread(anthropic.messages.batches.retrieve, anthropic_batch_id)
+            batch_resp = await asyncio.to_thread(anthropic_client().messages.batches.retrieve, anthropic_batch_id)
         if batch_resp.processing_status == "ended":
             break
         print(f"Batch {anthropic_batch_id} is still processing ({summarize_batch_counts(batch_resp.request_counts)})")
         await asyncio.sleep(sleep)
     print(f"Batch {anthropic_batch_id} is finished ({summarize_batch_counts(batch_resp.request_counts)})")
     result = {}
-    for message in await asyncio.to_thread(anthropic.messages.batches.results, anthropic_batch_id):
-        result[message.custom_id] = message.result.message.content[0].text # type: ignore
+    for message in await asyncio.to_thread(anthropic_client().messages.batches.results, anthropic_batch_id):
+        result[message.custom_id] = (
+            message_output(message.result.message.content),  # type: ignore
+            message.result.message.usage,  # type: ignore
+        )
     return result
 
 
-def prompt_cache_key(prompt: str, model: str, temperature: Optional[float] = None) -> str:
-    return genai_cache.cache_key({
+def prompt_cache_key(
+    prompt: str,
+    model: str,
+    temperature: Optional[float] = None,
+    response_model: Optional[type[BaseModel]] = None,
+) -> str:
+    cache_key_obj: dict[str, Any] = {
         "method": "generate_text",
         "model": model,
         "prompt": prompt,
         "temperature": temperature,
-    })
+    }
+    if response_model is not None:
+        cache_key_obj["response_schema"] = response_model.model_json_schema()
+    return genai_cache.cache_key(cache_key_obj)
 
 
+@traced("genai")
 async def generate_text_batch(
     prompts: Iterable[str],
     model: str,
     temperature: float = 1.0,
     output_tokens: Optional[int] = None,
+    response_model: Optional[type[BaseModel]] = None,
+    stage: str = DEFAULT_STAGE,
+    template: Optional[str] = None,
 ) -> list[Optional[str]]:
     if not model.startswith("claude"):
         raise ValueError("Batch generation is only supported for Anthropic models")
     
     prompts = list(prompts)
-    for prompt in prompts:
-        if "{{" in prompt:
-            raise ValueError("Prompt contains unresolved template variables")
-    
     results: dict[int, Optional[str]] = {}
     cache_key_objs = [
         {
@@ -189,30 +420,46 @@ async def generate_text_batch(
             "model": model,
             "prompt": prompt,
             "temperature": temperature,
+            **(
+                {"response_schema": response_model.model_json_schema()}
+                if response_model is not None
+                else {}
+            ),
         }
         for prompt in prompts
     ]
+    # we use the cache key as the ID if we fail waiting on the job we can 
+    # inject the result into the cache post-hoc and re-run
+    cache_keys = [genai_cache.cache_key(cache_key_obj) for cache_key_obj in cache_key_objs]
+    started_at = time.monotonic()
     cached_responses = await asyncio.gather(*[
-        genai_cache.get(cache_key_obj) for cache_key_obj in cache_key_objs
+        genai_cache.get(key) for key in cache_keys
     ])
+    cache_latency = time.monotonic() - started_at
     for i, cached_response in enumerate(cached_responses):
         if cached_response is None:
             # No way to distinguish between a cache miss and a cached None value
             # so we have to check if the cache key exists.
             # Parallelize this if it becomes a bottle-neck
-            is_cached_none = await genai_cache.has(cache_key_objs[i])
+            is_cached_none = await genai_cache.has(cache_keys[i])
             if is_cached_none:
                 results[i] = None
+                genai_metrics.record(
+                    GenaiCall(stage=stage, model=model, mode="batch"), "none", cache_latency
+                )
+                cache_manifest.record_access(cache_keys[i], template, model, stage)
         else:
             results[i] = cached_response
+            genai_metrics.record(
+                GenaiCall(stage=stage, model=model, mode="batch"), "hit", cache_latency
+            )
+            cache_manifest.record_access(cache_keys[i], template, model, stage)
 
     if all(i in results.keys() for i in range(len(prompts))):
         # All prompts are cached
         return [results[i] for i in range(len(prompts))]
-
-    # we use the cache key as the ID if we fail waiting on the job we can 
-    # inject the result into the cache post-hoc and re-run
-    cache_keys = [genai_cache.cache_key(cache_key_obj) for cache_key_obj in cache_key_objs]
+    if _cache_only:
+        return [results.get(i) for i in range(len(prompts))]
 
     # TODO key against cache key so it can be inserted after the fact?
     output_tokens = output_tokens or MAX_OUTPUT_TOKENS[model]  
@@ -230,22 +477,36 @@ async def generate_text_batch(
                 params=MessageCreateParamsNonStreaming(
                     model=model,
                     max_tokens=output_tokens,
-                    messages=[{"role": "user", "content": prompt}],
-                    temperature=temperature,),
+                    messages=[
+                        {"role": "user", "content": prompt_content(prompt, template)}  # type: ignore
+                    ],
+                    temperature=temperature,
+                    **structured_output_params(response_model),  # type: ignore
+                ),
             )
         )
         
+    started_at = time.monotonic()
     async with api_semaphore:
-        batch_resp = await asyncio.to_thread(anthropic.messages.batches.create,
+        batch_resp = await asyncio.to_thread(anthropic_client().messages.batches.create,
             requests=batch_requests
         )
 
     print(f"Submitted batch ({batch_resp.id}) with {len(batch_requests)} requests using {model} (total {sum(len(prompt) for prompt in prompts)} chars)")
     batch_results = await anthropic_wait_for_batch(batch_resp.id)
-    for result_key, result in batch_results.items():
-        for result_i, key in enumerate(cache_keys):
-            if key == result_key:
-                results[result_i] = result
-        await genai_cache.set(result_key, result)
+    batch_latency = time.monotonic() - started_at
+    for result_key, (result, usage) in batch_results.items():
+        call = GenaiCall(stage=stage, model=model, mode="batch", attempts=1)
+        record_usage(call, **usage_params(usage))
+        genai_metrics.record(call, "miss", batch_latency)
+        result, cacheable = validate_response(result, response_model)
+        result_indices = [i for i, key in enumerate(cache_keys) if key == result_key]
+        for result_i in result_indices:
+            results[result_i] = result
+        if cacheable:
+            # set with the key object rather than the ID, so the entry has a key.json like
+            # those written by generate_text
+            size = await genai_cache.set(cache_key_objs[result_indices[0]], result)
+            cache_manifest.record_write(result_key, template, model, stage, size)
         
     return [results[i] for i in range(len(prompts))]
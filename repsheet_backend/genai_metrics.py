@@ -0,0 +1,128 @@
+from collections import defaultdict
+from dataclasses import asdict, dataclass, field
+import os
+from os import path
+import time
+from typing import Literal, Optional
+
+import orjson
+
+GENAI_TRACE = "debug/genai_trace.jsonl"
+
+# Calls made without naming the stage they are part of
+DEFAULT_STAGE = "other"
+
+CallMode = Literal["online", "batch"]
+# "none" is a cached None response, e.g. a prompt that was too long for the model
+CacheResult = Literal["hit", "miss", "none"]
+
+
+@dataclass
+class GenaiCall:
+    """One prompt sent to (or answered from the cache for) a model.
+    Token counts come from the usage fields of the API response, so are zero for cache hits."""
+
+    stage: str
+    model: str
+    mode: CallMode
+    cache: CacheResult = "miss"
+    input_tokens: int = 0
+    output_tokens: int = 0
+    # Anthropic prompt caching, these are not included in input_tokens
+    cache_write_tokens: int = 0
+    cache_read_tokens: int = 0
+    # for online calls the time spent in the API, for batch calls the time from submitting the
+    # batch until its results were read, for cache hits the time spent reading the cache
+    latency: float = 0.0
+    attempts: int = 0
+    cost: float = 0.0
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def retries(self) -> int:
+        return max(0, self.attempts - 1)
+
+
+@dataclass
+class StageTotals:
+    calls: int = 0
+    hits: int = 0
+    misses: int = 0
+    cached_none: int = 0
+    batch_calls: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    retries: int = 0
+    # of the calls that went to the API
+    latency: float = 0.0
+    cost: float = 0.0
+
+    def add(self, call: GenaiCall) -> None:
+        self.calls += 1
+        self.hits += call.cache == "hit"
+        self.misses += call.cache == "miss"
+        self.cached_none += call.cache == "none"
+        self.batch_calls += call.mode == "batch"
+        self.input_tokens += call.input_tokens
+        self.output_tokens += call.output_tokens
+        self.cache_read_tokens += call.cache_read_tokens
+        self.retries += call.retries
+        if call.cache == "miss":
+            self.latency += call.latency
+        self.cost += call.cost
+
+
+class GenaiMetrics:
+    """Records every generate_text / generate_text_batch call, appending each to a JSONL trace
+    as it completes so a crashed run still has one, and reports totals per stage at the end."""
+
+    calls: list[GenaiCall]
+    trace_path: Optional[str]
+
+    def __init__(self, trace_path: Optional[str] = GENAI_TRACE):
+        self.calls = []
+        self.trace_path = trace_path
+
+    def record(self, call: GenaiCall, cache: CacheResult, latency: float) -> None:
+        call.cache = cache
+        call.latency = latency
+        self.calls.append(call)
+        if self.trace_path is not None:
+            os.makedirs(path.dirname(self.trace_path) or ".", exist_ok=True)
+            with open(self.trace_path, "ab") as f:
+                f.write(orjson.dumps({**asdict(call), "retries": call.retries}) + b"\n")
+
+    def totals(self) -> dict[str, StageTotals]:
+        totals: dict[str, StageTotals] = defaultdict(StageTotals)
+        for call in self.calls:
+            totals[call.stage].add(call)
+        return dict(totals)
+
+    def report(self) -> str:
+        totals = self.totals()
+        if len(totals) == 0:
+            return "No genai calls made"
+        overall = StageTotals()
+        for call in self.calls:
+            overall.add(call)
+        lines = [
+            f"{'stage':<20} {'calls':>6} {'hit %':>6} {'none':>5} {'batch':>6} "
+            f"{'input tok':>11} {'cached tok':>11} {'output tok':>11} {'retries':>7} "
+            f"{'mean s':>7} {'cost $':>8}"
+        ]
+        for stage, stage_totals in [*sorted(totals.items()), ("total", overall)]:
+            hit_rate = 100 * (stage_totals.hits + stage_totals.cached_none) / stage_totals.calls
+            misses = stage_totals.misses
+            mean_latency = stage_totals.latency / misses if misses > 0 else 0.0
+            lines.append(
+                f"{stage:<20} {stage_totals.calls:>6} {hit_rate:>6.1f} "
+                f"{stage_totals.cached_none:>5} {stage_totals.batch_calls:>6} "
+                f"{stage_totals.input_tokens:>11} {stage_totals.cache_read_tokens:>11} "
+                f"{stage_totals.output_tokens:>11} "
+                f"{stage_totals.retries:>7} {mean_latency:>7.1f} {stage_totals.cost:>8.2f}"
+            )
+        return "\n".join(lines)
+
+
+genai_metrics = GenaiMetrics()
@@ -0,0 +1,70 @@
+import re
+
+# One token per match: a string (possibly unterminated), a structural character,
+# a run of whitespace, a bare literal (number, true, false, null), or anything else left over
+JSON_TOKEN_REGEX = re.compile(
+    r'"(?:[^"\\]|\\.)*(?:"|$)|[{}\[\],:]|\s+|[^\s{}\[\],:"]+|.', re.DOTALL
+)
+STRING_FIX_REGEX = re.compile(r"\\(.)|([\x00-\x1f])", re.DOTALL)
+
+VALID_ESCAPES = set('"\\/bfnrtu')
+CONTROL_CHAR_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+# tokens that can't be followed by a value without a comma in between
+NOT_VALUE_END = {"{", "[", ",", ":"}
+NOT_VALUE_START = {"}", "]", ",", ":"}
+
+
+def _escape_control_char(char: str) -> str:
+    return CONTROL_CHAR_ESCAPES.get(char, f"\\u{ord(char):04x}")
+
+
+def _fix_string_char(match: re.Match) -> str:
+    escaped, control_char = match.groups()
+    if escaped is not None:
+        if escaped in VALID_ESCAPES:
+            return match.group(0)
+        # e.g. a backslash before a raw new line, which must still be escaped
+        if escaped < " ":
+            return _escape_control_char(escaped)
+        # e.g. \$, never seen this as an escape character before, but the AI seems to think it's real
+        return escaped
+    return _escape_control_char(control_char)
+
+
+def strip_code_fence(text: str) -> str:
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.removeprefix("```json").removeprefix("```")
+        text = text.removesuffix("```")
+    return text
+
+
+def repair_json(text: str) -> str:
+    """Fix the mistakes the AI makes when writing JSON, in a single pass over the text:
+    unescaped new lines and other control characters in strings, invalid escapes like \\$,
+    trailing commas, and missing commas between values. Valid JSON is returned unchanged."""
+    text = strip_code_fence(text)
+    parts: list[str] = []
+    previous: str | None = None
+    comma_index = -1
+    for match in JSON_TOKEN_REGEX.finditer(text):
+        token = match.group(0)
+        if token.isspace():
+            parts.append(token)
+            continue
+        if token in ("}", "]") and previous == ",":
+            parts[comma_index] = ""
+        elif (
+            previous is not None
+            and previous not in NOT_VALUE_END
+            and token not in NOT_VALUE_START
+        ):
+            parts.append(",")
+        if token[0] == '"':
+            token = STRING_FIX_REGEX.sub(_fix_string_char, token)
+        elif token == ",":
+            comma_index = len(parts)
+        parts.append(token)
+        previous = token
+    return "".join(parts)
@@ -0,0 +1,134 @@
+import asyncio
+from dataclasses import dataclass, field
+import hashlib
+import os
+from os import path
+import time
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+import orjson
+
+from repsheet_backend.tracing import tracer
+
+PIPELINE_STATE = "pipeline_state.json"
+
+
+def fingerprint(*parts: Any) -> str:
+    """A stable hash of any JSON serializable values."""
+    return hashlib.sha256(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+def fingerprint_files(paths: Iterable[str]) -> str:
+    """A hash of the names, sizes and modification times of files, recursing into directories."""
+    entries = []
+    for root_path in paths:
+        if path.isdir(root_path):
+            for dir_path, _, file_names in os.walk(root_path):
+                for file_name in file_names:
+                    file_path = path.join(dir_path, file_name)
+                    stat = os.stat(file_path)
+                    entries.append((file_path, stat.st_size, stat.st_mtime_ns))
+        elif path.exists(root_path):
+            stat = os.stat(root_path)
+            entries.append((root_path, stat.st_size, stat.st_mtime_ns))
+    return fingerprint(sorted(entries))
+
+
+@dataclass
+class Stage:
+    """A step of the pipeline.
+
+    A stage is skipped when the fingerprint of its inputs (its `inputs` plus the fingerprints of the
+    stages it depends on) matches the last successful run, and its `outputs` fingerprint shows that
+    what it produced is still there (e.g. the database hasn't been rebuilt underneath it).
+    Fingerprint functions run in a thread as they may read the database or the file system."""
+
+    name: str
+    run: Callable[[], Awaitable[Any]]
+    depends_on: tuple[str, ...] = ()
+    inputs: Optional[Callable[[], str]] = None
+    outputs: Optional[Callable[[], str]] = None
+
+
+@dataclass
+class StageState:
+    inputs: str
+    outputs: str
+    completed_at: float
+
+
+@dataclass
+class Pipeline:
+    stages: list[Stage]
+    state_path: str = PIPELINE_STATE
+    state: dict[str, StageState] = field(default_factory=dict)
+
+    def __post_init__(self):
+        # stages must come after the stages they depend on, which also rules out cycles
+        names: set[str] = set()
+        for stage in self.stages:
+            for dependency in stage.depends_on:
+                if dependency not in names:
+                    raise ValueError(f"Stage {stage.name} depends on {dependency} which is not before it")
+            names.add(stage.name)
+        if path.exists(self.state_path):
+            with open(self.state_path, "rb") as f:
+                self.state = {
+                    name: StageState(**state) for name, state in orjson.loads(f.read()).items()
+                }
+
+    def save_state(self) -> None:
+        """Written after every stage, so a failure late in the run keeps the earlier stages."""
+        with open(self.state_path, "wb") as f:
+            f.write(
+                orjson.dumps(
+                    {name: state.__dict__ for name, state in self.state.items()},
+                    option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS,
+                )
+            )
+
+    async def run(self, force: Iterable[str] = ()) -> list[str]:
+        """Run the stages, each as soon as the stages it depends on have finished.
+        Stages named in `force` run even if unchanged. Returns the names of the stages that failed
+        or were not run because a stage they depend on failed."""
+        force = set(force)
+        tasks: dict[str, asyncio.Task[str]] = {}
+        failed: list[str] = []
+
+        async def run_stage(stage: Stage) -> str:
+            dependency_fingerprints = {}
+            for dependency in stage.depends_on:
+                try:
+                    dependency_fingerprints[dependency] = await tasks[dependency]
+                except Exception:
+                    failed.append(stage.name)
+                    print(f"[{stage.name}] not run, {dependency} failed")
+                    raise
+            external_inputs = await asyncio.to_thread(stage.inputs) if stage.inputs else ""
+            inputs = fingerprint(external_inputs, dependency_fingerprints)
+            previous = self.state.get(stage.name)
+            if previous is not None and previous.inputs == inputs and stage.name not in force:
+                outputs = await asyncio.to_thread(stage.outputs) if stage.outputs else ""
+                if previous.outputs == outputs:
+                    print(f"[{stage.name}] unchanged, skipping")
+                    return fingerprint(inputs, outputs)
+
+            print(f"[{stage.name}] running")
+            started_at = time.monotonic()
+            try:
+                with tracer.span(stage.name, "stage"), tracer.profiled(stage.name):
+                    await stage.run()
+            except Exception as e:
+                failed.append(stage.name)
+                print(f"[{stage.name}] failed: {e}")
+                raise
+            outputs = await asyncio.to_thread(stage.outputs) if stage.outputs else ""
+            self.state[stage.name] = StageState(inputs, outputs, time.time())
+            self.save_state()
+            print(f"[{stage.name}] finished in {time.monotonic() - started_at:.1f}s")
+            return fingerprint(inputs, outputs)
+
+        for stage in self.stages:
+            tasks[stage.name] = asyncio.create_task(run_stage(stage))
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return failed
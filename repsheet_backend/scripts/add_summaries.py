@@ -1,17 +1,122 @@
 import asyncio
-from repsheet_backend.common import LOCAL_MPS, PARTY_LEADERS
+from typing import AsyncIterator, Optional
+
+from repsheet_backend.common import (
+    LOCAL_MPS,
+    PARTY_LEADERS,
+    BillId,
+    BillVotingRecord,
+    MemberSummary,
+)
 from repsheet_backend.db import RepsheetDB
-from repsheet_backend.summarize_bills import summarize_bill
+from repsheet_backend.summarize_bills import (
+    get_bill_summarization_prompts,
+    summarize_bill_from_prompts,
+)
 from repsheet_backend.summarize_members import (
-    condense_member_summaries,
-    condense_member_summaries_batch,
+    condense_member_summaries_stream,
     generate_member_summary,
     generate_member_summary_batch,
 )
-from repsheet_backend.genai import genai_cache
+from repsheet_backend.genai import MAX_CONCURRENT_REQUESTS, estimate_tokens, genai_cache
+from repsheet_backend.genai_metrics import genai_metrics
+from repsheet_backend.worker_pool import WorkerPool
 
 BATCH_MODE = True
 
+# Total size of the bill prompts read into memory but not yet summarized
+MAX_BILL_PROMPT_TOKENS = 4_000_000
+
+
+async def add_bill_summaries(db: RepsheetDB, bills: list[BillId]) -> list[BillId]:
+    """Summarize bills through a bounded worker pool, writing summaries to the database
+    as they arrive. Returns the bills that failed."""
+    pool = WorkerPool(
+        name="bills",
+        prepare=get_bill_summarization_prompts,
+        size=lambda prompts: sum(estimate_tokens(prompt) for prompt in prompts),
+        process=summarize_bill_from_prompts,
+        workers=MAX_CONCURRENT_REQUESTS,
+        max_tokens=MAX_BILL_PROMPT_TOKENS,
+        # preparing may download the bill text, which is limited by data_api_semaphore
+        preparers=8,
+    )
+
+    async def summaries() -> AsyncIterator[tuple[BillId, str]]:
+        async for bill, summary in pool.stream(bills):
+            yield bill, summary.model_dump_json()
+
+    async for _ in db.stream_bill_summaries(summaries()):
+        pass
+    return pool.failed
+
+
+async def add_member_summaries(db: RepsheetDB) -> list[str]:
+    """Summarize the voting record of every current member, returning the members that failed.
+    Each summary is condensed as soon as it has been written, rather than after every member
+    is done, so the run takes as long as the slowest member rather than two full batch runs."""
+    # all_member_ids = (
+    # *PARTY_LEADERS,
+    # *LOCAL_MPS,
+    # )
+    # all_member_ids = [PARTY_LEADERS[3]]
+
+    all_member_ids = [member.id for member in db.get_current_members()]
+    assert len(all_member_ids) < 10 or BATCH_MODE
+
+    print(f"Summarizing {len(all_member_ids)} members")
+    voting_records = (
+        db.get_member_voting_record(member_id) for member_id in all_member_ids
+    )
+
+    async def summarize(
+        voting_record: list[BillVotingRecord], member_id: str
+    ) -> tuple[str, Optional[MemberSummary]]:
+        if BATCH_MODE:
+            return member_id, await generate_member_summary_batch(voting_record, member_id)
+        return member_id, await generate_member_summary(
+            voting_record, member_id, dump_prompts_to_path="./debug"
+        )
+
+    if BATCH_MODE:
+        print(f"Summarizing voting records in batch mode")
+
+    async def member_summaries() -> AsyncIterator[tuple[str, MemberSummary]]:
+        for next_summary in asyncio.as_completed(
+            [
+                summarize(voting_record, member_id)
+                for voting_record, member_id in zip(voting_records, all_member_ids)
+            ]
+        ):
+            member_id, summary = await next_summary
+            # strip out failures
+            if summary is not None:
+                yield member_id, summary
+
+    summarized_member_ids = set()
+    condensed_member_ids = set()
+
+    async def written_summaries() -> AsyncIterator[tuple[str, MemberSummary]]:
+        async for member_id, summary in db.stream_member_summaries(member_summaries()):
+            summarized_member_ids.add(member_id)
+            yield member_id, summary
+
+    condensed_summaries = condense_member_summaries_stream(written_summaries(), BATCH_MODE)
+    async for member_id, _ in db.stream_short_member_summaries(condensed_summaries):
+        condensed_member_ids.add(member_id)
+    if len(condensed_member_ids) < len(summarized_member_ids):
+        print(
+            f"Failed to condense {len(summarized_member_ids) - len(condensed_member_ids)} summaries"
+        )
+    return [member_id for member_id in all_member_ids if member_id not in summarized_member_ids]
+
+
+def print_failed_members(failed_member_ids: list[str]) -> None:
+    if len(failed_member_ids) > 0:
+        print(f"Failed to summarize {len(failed_member_ids)} members:")
+        for member_id in failed_member_ids:
+            print(f"  {member_id}")
+
 
 async def add_genai_summaries():
     await genai_cache.init()
@@ -19,73 +124,16 @@ async def add_genai_summaries():
     with RepsheetDB.connect() as db:
         bills = db.get_nonunanimous_bills_voted_on_by_a_current_member()
         print(f"Summarizing {len(bills)} bills voted on by a current member")
-        bill_summaries = await asyncio.gather(*[summarize_bill(bill) for bill in bills])
-        bill_summaries_by_id = {
-            bill: summary.model_dump_json()
-            for bill, summary in zip(bills, bill_summaries)
-            if summary is not None
-        }
-        db.insert_bill_summaries(bill_summaries_by_id)
-
-        # all_member_ids = (
-        # *PARTY_LEADERS,
-        # *LOCAL_MPS,
-        # )
-        # all_member_ids = [PARTY_LEADERS[3]]
-        
-        all_member_ids = [member.id for member in db.get_current_members()]
-        assert len(all_member_ids) < 10 or BATCH_MODE
-
-        print(f"Summarizing {len(all_member_ids)} members")
-        voting_records = (
-            db.get_member_voting_record(member_id) for member_id in all_member_ids
-        )
+        failed_bills = await add_bill_summaries(db, bills)
+        if len(failed_bills) > 0:
+            print(f"Failed to summarize {len(failed_bills)} bills")
 
-        if BATCH_MODE:
-            print(f"Summarizing voting records in batch mode")
-            member_summaries = await asyncio.gather(
-                *[
-                    generate_member_summary_batch(voting_record, member_id)
-                    for voting_record, member_id in zip(voting_records, all_member_ids)
-                ]
-            )
-        else:
-            member_summaries = await asyncio.gather(
-                *[
-                    generate_member_summary(
-                        voting_record, member_id, dump_prompts_to_path="./debug"
-                    )
-                    for voting_record, member_id in zip(voting_records, all_member_ids)
-                ]
-            )
-
-        # strip out failures
-        member_ids_and_summaries = [
-            (member_id, summary)
-            for member_id, summary in zip(all_member_ids, member_summaries)
-            if summary is not None
-        ]
-
-        db.insert_member_summaries(member_ids_and_summaries)
-
-        if BATCH_MODE:
-            condensed_summaries = await condense_member_summaries_batch(
-                summary for _, summary in member_ids_and_summaries
-            )
-        else:
-            condensed_summaries = await condense_member_summaries(
-                summary for _, summary in member_ids_and_summaries
-            )
-        summarized_member_ids = [member_id for member_id, _ in member_ids_and_summaries]
-        db.insert_short_member_summaries(zip(summarized_member_ids, condensed_summaries))
+        failed_member_ids = await add_member_summaries(db)
 
         db.optimize()
 
-        failed_member_ids = set(all_member_ids) - set(summarized_member_ids)
-        if len(failed_member_ids) > 0:
-            print(f"Failed to summarize {len(failed_member_ids)} members:")
-            for member_id in failed_member_ids:
-                print(f"  {member_id}")
+        print_failed_members(failed_member_ids)
+    print(genai_metrics.report())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,267 @@
+import asyncio
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import os
+from random import Random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Iterator, Optional
+from unittest import mock
+
+import orjson
+
+from repsheet_backend import summarize_members
+from repsheet_backend.db import RepsheetDB
+from repsheet_backend.json_repair import repair_json
+from repsheet_backend.synthetic import (
+    MemoryCache,
+    SyntheticParliament,
+    build_synthetic_db,
+    generate_parliament,
+    stub_generate_text,
+    synthetic_bill_summary,
+)
+
+BENCHMARK_RESULTS = "benchmark_results.jsonl"
+
+# Synthetic parliament sizes, "full" is about the size of a real parliament
+SCALES = {
+    "small": {"members": 60, "bills_per_session": 20, "votes_per_session": 40},
+    "full": {"members": 338, "bills_per_session": 150, "votes_per_session": 400},
+}
+# Members summarized end to end with the stubbed model
+SUMMARIZED_MEMBERS = 10
+CACHE_ENTRIES = 2000
+# Seconds to import each entry point in a fresh interpreter. Importing mustn't create clients,
+# read prompts or touch the file system, so this is just the cost of the modules themselves
+IMPORT_TIME_BUDGETS = {
+    "repsheet_backend.db": 1.5,
+    "repsheet_backend.genai": 2.0,
+    "repsheet_backend.scripts.run_pipeline": 3.0,
+}
+# Changes smaller than this are reported as noise
+NOISE_THRESHOLD = 0.05
+
+Metrics = dict[str, float]
+
+
+@contextmanager
+def connect(db_path: str) -> Iterator[RepsheetDB]:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield RepsheetDB(conn)
+    finally:
+        conn.close()
+
+
+def timed(func: Callable[[], Any]) -> tuple[Any, float]:
+    started_at = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - started_at
+
+
+def benchmark_build_db(parliament: SyntheticParliament, db_path: str) -> Metrics:
+    _, seconds = timed(lambda: build_synthetic_db(parliament, db_path).db.close())
+    member_votes = sum(len(v) for v in parliament.member_votes_by_vote_id.values())
+    return {"seconds": seconds, "member_votes_per_second": member_votes / seconds}
+
+
+def benchmark_voting_records(db_path: str) -> Metrics:
+    with connect(db_path) as db:
+        member_ids = [member.id for member in db.get_current_members()]
+        records, seconds = timed(
+            lambda: [db.get_member_voting_record(member_id) for member_id in member_ids]
+        )
+    return {
+        "seconds": seconds,
+        "members_per_second": len(member_ids) / seconds,
+        "records_per_second": sum(len(record) for record in records) / seconds,
+    }
+
+
+def benchmark_member_prompts(db_path: str) -> Metrics:
+    with connect(db_path) as db:
+        records = [db.get_member_voting_record(member.id) for member in db.get_current_members()]
+    prompts, seconds = timed(
+        lambda: [summarize_members.get_member_summarisation_prompts(record) for record in records]
+    )
+    prompt_chars = sum(len(prompt) for member_prompts in prompts for prompt in member_prompts)
+    return {"seconds": seconds, "prompt_chars_per_second": prompt_chars / seconds}
+
+
+def benchmark_member_summaries(db_path: str) -> Metrics:
+    """Summarize members end to end with a stubbed model, which measures everything but the model:
+    chunking, prompt building, link checks, JSON repair and validation, and merging."""
+    with connect(db_path) as db:
+        records = {
+            member.id: db.get_member_voting_record(member.id)
+            for member in db.get_current_members()[:SUMMARIZED_MEMBERS]
+        }
+
+    async def summarize_all():
+        with mock.patch.object(summarize_members, "generate_text", stub_generate_text):
+            return await asyncio.gather(
+                *[
+                    summarize_members.generate_member_summary(record, member_id)
+                    for member_id, record in records.items()
+                ]
+            )
+
+    _, seconds = timed(lambda: asyncio.run(summarize_all()))
+    return {"seconds": seconds, "members_per_second": len(records) / seconds}
+
+
+def benchmark_import_time() -> Metrics:
+    results = {}
+    for module, budget in IMPORT_TIME_BUDGETS.items():
+        seconds = float(
+            subprocess.check_output(
+                [
+                    sys.executable,
+                    "-c",
+                    f"import time; started_at = time.perf_counter(); import {module}; "
+                    "print(time.perf_counter() - started_at)",
+                ],
+                text=True,
+            )
+        )
+        if seconds > budget:
+            print(f"[import_time] {module} took {seconds:.2f}s, over its {budget}s budget")
+        results[f"{module}.seconds"] = seconds
+    return results
+
+
+def broken_json(rng: Random) -> str:
+    """A model output with the mistakes repair_json fixes."""
+    summary = synthetic_bill_summary(rng).model_dump_json(indent=2)
+    return (
+        summary.replace(". ", ".\n", 2).replace('"\n}', '",\n}').replace("amends", "amends \\$")
+    )
+
+
+def benchmark_json_repair(rng: Random) -> Metrics:
+    outputs = [broken_json(rng) for _ in range(2000)]
+    _, seconds = timed(lambda: [repair_json(output) for output in outputs])
+    return {
+        "seconds": seconds,
+        "chars_per_second": sum(len(output) for output in outputs) / seconds,
+    }
+
+
+def benchmark_cache(rng: Random) -> Metrics:
+    """Key hashing, serialization and compression of the genai cache, without Cloud Storage."""
+    cache = MemoryCache(key_prefix="google-ai/")
+    entries = [
+        (
+            {"method": "generate_text", "model": "stub", "prompt": f"prompt {i}"},
+            synthetic_bill_summary(rng).model_dump_json(),
+        )
+        for i in range(CACHE_ENTRIES)
+    ]
+
+    async def set_and_get_all() -> tuple[float, float]:
+        # one event loop, as the cache semaphore is bound to the loop it is first used in
+        started_at = time.perf_counter()
+        await asyncio.gather(*[cache.set(key, value) for key, value in entries])
+        set_at = time.perf_counter()
+        await asyncio.gather(*[cache.get(key) for key, _ in entries])
+        return set_at - started_at, time.perf_counter() - set_at
+
+    set_seconds, get_seconds = asyncio.run(set_and_get_all())
+    return {
+        "set_per_second": CACHE_ENTRIES / set_seconds,
+        "get_per_second": CACHE_ENTRIES / get_seconds,
+    }
+
+
+def git_commit() -> tuple[Optional[str], bool]:
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], text=True).strip()
+        dirty = subprocess.check_output(["git", "status", "--porcelain"], text=True).strip() != ""
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, dirty
+
+
+def run_benchmarks(scale: str) -> dict[str, Metrics]:
+    rng = Random(0)
+    parliament = generate_parliament(**SCALES[scale])
+    results: dict[str, Metrics] = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "repsheet.sqlite")
+        benchmarks: dict[str, Callable[[], Metrics]] = {
+            "import_time": benchmark_import_time,
+            "build_db": lambda: benchmark_build_db(parliament, db_path),
+            "voting_records": lambda: benchmark_voting_records(db_path),
+            "member_prompts": lambda: benchmark_member_prompts(db_path),
+            "member_summaries": lambda: benchmark_member_summaries(db_path),
+            "json_repair": lambda: benchmark_json_repair(rng),
+            "cache": lambda: benchmark_cache(rng),
+        }
+        for name, benchmark in benchmarks.items():
+            try:
+                results[name] = benchmark()
+            except Exception as e:
+                # e.g. no model credentials, the rest of the suite is still worth running
+                print(f"[{name}] failed: {e!r}")
+                continue
+            print(f"[{name}] " + ", ".join(f"{k}={v:.4g}" for k, v in results[name].items()))
+    return results
+
+
+def load_runs() -> list[dict]:
+    if not os.path.exists(BENCHMARK_RESULTS):
+        return []
+    with open(BENCHMARK_RESULTS, "rb") as f:
+        return [orjson.loads(line) for line in f if line.strip()]
+
+
+def compare(run: dict, baseline: dict) -> None:
+    print(f"Compared with {baseline['commit'][:10]} ({baseline['timestamp']}):")
+    for name, metrics in run["results"].items():
+        for metric, value in metrics.items():
+            previous = baseline["results"].get(name, {}).get(metric)
+            if previous is None or previous == 0:
+                continue
+            change = value / previous - 1
+            # seconds are better lower, everything else is a rate
+            better = change < 0 if metric.endswith("seconds") else change > 0
+            verdict = (
+                "~" if abs(change) < NOISE_THRESHOLD else "better" if better else "WORSE"
+            )
+            print(f"  {name}.{metric}: {previous:.4g} -> {value:.4g} ({change:+.1%}) {verdict}")
+
+
+def benchmark(scale: str = "small", compare_to: Optional[str] = None) -> None:
+    """Run the suite, append the results to BENCHMARK_RESULTS, and compare them with the
+    latest earlier run of the same scale at another commit (or at `compare_to`)."""
+    commit, dirty = git_commit()
+    run = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "scale": scale,
+        "python": sys.version.split()[0],
+        "results": run_benchmarks(scale),
+    }
+    previous_runs = [previous for previous in load_runs() if previous["scale"] == scale]
+    with open(BENCHMARK_RESULTS, "ab") as f:
+        f.write(orjson.dumps(run) + b"\n")
+
+    if compare_to is not None:
+        candidates = [r for r in previous_runs if (r["commit"] or "").startswith(compare_to)]
+    else:
+        candidates = [r for r in previous_runs if r["commit"] != commit or r["dirty"] != dirty]
+    if len(candidates) == 0:
+        print("No earlier run to compare with")
+        return
+    compare(run, candidates[-1])
+
+
+if __name__ == "__main__":
+    # usage: benchmark [small|full] [commit to compare with]
+    benchmark(*sys.argv[1:3])
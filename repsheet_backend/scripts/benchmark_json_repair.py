@@ -0,0 +1,66 @@
+import glob
+import sqlite3
+import time
+from os import path
+
+import orjson
+
+from repsheet_backend.common import BILLS_TABLE, MEMBERS_TABLE
+from repsheet_backend.db import REPSHEET_DB
+from repsheet_backend.json_repair import repair_json
+
+# Raw model outputs that failed validation or had broken links, dumped by summarize_members
+CAPTURED_OUTPUT_GLOBS = ("debug/validation/*.json", "debug/broken_links/*.json")
+SCALES = (1, 4, 16, 64)
+
+
+def load_captured_outputs() -> list[str]:
+    outputs = []
+    for pattern in CAPTURED_OUTPUT_GLOBS:
+        for file_name in sorted(glob.glob(pattern)):
+            with open(file_name, "rb") as f:
+                outputs.append(orjson.loads(f.read())["summary"])
+    if path.exists(REPSHEET_DB):
+        conn = sqlite3.connect(REPSHEET_DB)
+        try:
+            for table in (MEMBERS_TABLE, BILLS_TABLE):
+                outputs.extend(
+                    summary
+                    for (summary,) in conn.execute(
+                        f"SELECT Summary FROM {table} WHERE Summary IS NOT NULL"
+                    )
+                )
+        finally:
+            conn.close()
+    return outputs
+
+
+def time_repair(texts: list[str]) -> float:
+    start = time.perf_counter()
+    for text in texts:
+        repair_json(text)
+    return time.perf_counter() - start
+
+
+def benchmark_json_repair():
+    outputs = load_captured_outputs()
+    if len(outputs) == 0:
+        print("No captured model outputs found")
+        return
+    total_chars = sum(len(output) for output in outputs)
+    seconds = time_repair(outputs)
+    print(
+        f"Repaired {len(outputs)} outputs ({total_chars / 1e6:.1f}M chars) in {seconds:.3f}s "
+        f"({total_chars / seconds / 1e6:.1f}M chars/s)"
+    )
+
+    # repair time should grow linearly with the length of the output
+    largest = max(outputs, key=len)
+    for scale in SCALES:
+        text = "[" + ",\n".join([largest] * scale) + "]"
+        seconds = time_repair([text])
+        print(f"{len(text):>10} chars: {seconds * 1000:.1f}ms ({len(text) / seconds / 1e6:.1f}M chars/s)")
+
+
+if __name__ == "__main__":
+    benchmark_json_repair()
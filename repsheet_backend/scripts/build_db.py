@@ -1,7 +1,8 @@
 import asyncio
 import os
+import sys
 
-from repsheet_backend.db import RepsheetDB, REPSHEET_DB
+from repsheet_backend.db import COMPACT_MEMBER_VOTES, RepsheetDB, REPSHEET_DB
 from repsheet_backend.fetch_data import (
     fetch_all_member_votes_by_vote_id,
     fetch_members_csv,
@@ -12,27 +13,48 @@ from repsheet_backend.fetch_data import (
 from repsheet_backend.summarize_bills import summarize_bill
 
 
-async def build_repsheet_db():
-    members, bills_by_session, votes_by_session = await asyncio.gather(
+async def fetch_source_data():
+    return await asyncio.gather(
         *[
             fetch_members_csv(),
             fetch_all_bills_by_session(),
             fetch_all_votes_by_session(),
         ]
     )
+
+
+async def load_tables():
+    members, bills_by_session, votes_by_session = await fetch_source_data()
     with RepsheetDB.connect() as db:
         db.create_parliaments_table()
         db.create_members_table(members)
         db.create_bills_table(bills_by_session)
         db.create_votes_table(votes_by_session)
+
+
+async def load_member_votes(compact: bool = COMPACT_MEMBER_VOTES):
+    with RepsheetDB.connect() as db:
         votes_held = db.get_all_votes_held()
         member_votes = await fetch_all_member_votes_by_vote_id(votes_held)
-        db.create_member_votes_table(member_votes)
+        db.create_member_votes_table(member_votes, compact=compact)
+
+
+async def create_summary_tables():
+    with RepsheetDB.connect() as db:
         db.create_vote_summary_tables()
+        db.create_bill_final_reading_vote_table()
+
+
+async def build_repsheet_db(compact_member_votes: bool = COMPACT_MEMBER_VOTES):
+    await load_tables()
+    await load_member_votes(compact_member_votes)
+    await create_summary_tables()
 
 
 if __name__ == "__main__":
     if os.path.exists(REPSHEET_DB):
         os.remove(REPSHEET_DB)
         print(f"Deleted {REPSHEET_DB}")
-    asyncio.run(build_repsheet_db())
+    # --compact-member-votes stores member votes with integer keys behind a member_votes view
+    compact_member_votes = "--compact-member-votes" in sys.argv[1:] or COMPACT_MEMBER_VOTES
+    asyncio.run(build_repsheet_db(compact_member_votes))
@@ -0,0 +1,96 @@
+"""Garbage collect the genai cache: find the entries that the current prompt templates and
+database no longer use, and delete them (with --delete, otherwise only report them).
+
+Entries are found by replaying the summaries with `cache_only`, which reads every entry the
+pipeline would read without calling a model, then comparing the entries read with those in the
+bucket. Run it against an up to date database, i.e. after the pipeline."""
+
+import asyncio
+import sys
+import time
+
+from repsheet_backend.cache_manifest import cache_manifest
+from repsheet_backend.db import RepsheetDB
+from repsheet_backend.genai import MAX_CONCURRENT_REQUESTS, cache_only, estimate_tokens, genai_cache
+from repsheet_backend.scripts.add_summaries import BATCH_MODE, MAX_BILL_PROMPT_TOKENS
+from repsheet_backend.summarize_bills import (
+    get_bill_summarization_prompts,
+    summarize_bill_from_prompts,
+)
+from repsheet_backend.summarize_members import (
+    condense_member_summaries,
+    generate_member_summary_batch,
+)
+from repsheet_backend.worker_pool import WorkerPool
+
+
+async def replay_bill_summaries(db: RepsheetDB) -> None:
+    bills = db.get_nonunanimous_bills_voted_on_by_a_current_member()
+    pool = WorkerPool(
+        name="bills",
+        prepare=get_bill_summarization_prompts,
+        size=lambda prompts: sum(estimate_tokens(prompt) for prompt in prompts),
+        process=summarize_bill_from_prompts,
+        workers=MAX_CONCURRENT_REQUESTS,
+        max_tokens=MAX_BILL_PROMPT_TOKENS,
+        preparers=8,
+    )
+    async for _ in pool.stream(bills):
+        pass
+
+
+async def replay_member_summaries(db: RepsheetDB) -> None:
+    member_ids = [member.id for member in db.get_current_members()]
+    await asyncio.gather(
+        *[
+            generate_member_summary_batch(db.get_member_voting_record(member_id), member_id)
+            for member_id in member_ids
+        ]
+    )
+    # condensed from the summaries in the database, as the pipeline does
+    await condense_member_summaries(db.get_member_summaries(), BATCH_MODE)
+
+
+async def mark_live_entries() -> set[str]:
+    """The keys of the cache entries read by the pipeline with the current templates and data."""
+    marked_at = time.time()
+    with cache_only(), RepsheetDB.connect() as db:
+        await replay_bill_summaries(db)
+        await replay_member_summaries(db)
+    return cache_manifest.accessed_since(marked_at)
+
+
+def format_size(entries: dict[str, int]) -> str:
+    return f"{len(entries)} entries, {sum(entries.values()) / 1e6:.1f} MB"
+
+
+async def cache_gc(delete: bool = False) -> None:
+    await genai_cache.init()
+    print(cache_manifest.template_changes())
+    live_keys = await mark_live_entries()
+    if len(live_keys) == 0:
+        # e.g. no database, deleting everything is never what we want
+        print("No live cache entries found, not collecting anything")
+        return
+
+    print("Listing cache entries...")
+    entries = await asyncio.to_thread(genai_cache.list_entries)
+    cache_manifest.record_sizes(entries)
+    live = {key: size for key, size in entries.items() if key in live_keys}
+    unreachable = {key: size for key, size in entries.items() if key not in live_keys}
+    print(f"Live: {format_size(live)}")
+    print(cache_manifest.report(live))
+    print(f"Unreachable: {format_size(unreachable)}")
+    print(cache_manifest.report(unreachable))
+
+    if not delete:
+        print("Dry run, pass --delete to delete unreachable entries")
+        return
+    print(f"Deleting {len(unreachable)} unreachable entries...")
+    await asyncio.to_thread(genai_cache.delete_entries, unreachable.keys())
+    cache_manifest.remove(unreachable.keys())
+    print("Done")
+
+
+if __name__ == "__main__":
+    asyncio.run(cache_gc(delete="--delete" in sys.argv[1:]))
@@ -1,4 +1,5 @@
 import asyncio
+from functools import cache
 import os
 import httpx
 
@@ -9,8 +10,12 @@ from google.cloud import storage
 
 IMAGES_BUCKET = "repsheet-images"
 
-gcs = storage.Client()
-image_bucket = gcs.bucket(IMAGES_BUCKET)
+
+@cache
+def image_bucket() -> storage.Bucket:
+    """Created on first use, as the client loads credentials."""
+    return storage.Client().bucket(IMAGES_BUCKET)
+
 
 PARTY_SHORT = {
     "Bloc Québécois": "BQ",
@@ -56,7 +61,7 @@ def photo_url(mp: MemberInfo) -> str:
 
 def _download_photo(mp: MemberInfo) -> bool:
     target_blob = f"photos/{mp.url_slug}.jpg"
-    exists = image_bucket.blob(target_blob).exists()
+    exists = image_bucket().blob(target_blob).exists()
     if exists:
         return True
     
@@ -67,7 +72,7 @@ def _download_photo(mp: MemberInfo) -> bool:
     except:
         print(f"Failed to download {mp.id} from {url}")
         return False
-    blob = image_bucket.blob(target_blob)
+    blob = image_bucket().blob(target_blob)
     blob.upload_from_string(
         resp.content,
         content_type="image/jpeg",
@@ -79,7 +84,8 @@ async def download_photo(mp: MemberInfo) -> bool:
     return await asyncio.to_thread(_download_photo, mp)
 
 
-async def main():
+async def download_photos() -> list[MemberInfo]:
+    """Upload a photo of every current member that doesn't have one yet, returning those that failed."""
     with RepsheetDB.connect() as db:
         members = db.get_current_members()
     print(f"Found {len(members)} current members")
@@ -88,12 +94,15 @@ async def main():
         *[download_photo(mp) for mp in members]
     )
     print("Done downloading photos")
+    return [member for member, success in zip(members, successes) if not success]
 
-    if any(not success for success in successes):
+
+async def main():
+    failed = await download_photos()
+    if len(failed) > 0:
         print("Some photos failed to download")
-        for member, success in zip(members, successes):
-            if not success:
-                print(f"Failed to download {member.id}")
+        for member in failed:
+            print(f"Failed to download {member.id}")
         exit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,10 @@
+from repsheet_backend.db import RepsheetDB
+
+
+def export_columnar():
+    with RepsheetDB.connect() as db:
+        db.export_columnar()
+
+
+if __name__ == "__main__":
+    export_columnar()
@@ -0,0 +1,11 @@
+from repsheet_backend.db import RepsheetDB
+from repsheet_backend.export_pages import export_pages
+
+
+def main():
+    with RepsheetDB.connect() as db:
+        export_pages(db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+import orjson
+import pandas as pd
+
+from repsheet_backend import db as repsheet_db
+from repsheet_backend.common import (
+    BILLS_TABLE,
+    MEMBER_STATS_TABLE,
+    MEMBER_VOTES_TABLE,
+    MEMBERS_TABLE,
+    VOTES_HELD_TABLE,
+)
+from repsheet_backend.db import REPSHEET_DB
+
+PROFILE_OUTPUT = "debug/query_profile.jsonl"
+
+# Statements that build a table are profiled as a rebuild of that table
+QUERY_TARGET_REGEX = re.compile(r"\b(CREATE TABLE|INSERT INTO)\s+(\w+)")
+QUERY_PARAM_REGEX = re.compile(r":(\w+)")
+
+
+def get_sql_constants() -> dict[str, str]:
+    """All the SQL query constants defined in db.py."""
+    return {
+        name: value
+        for name, value in vars(repsheet_db).items()
+        if name.endswith("_QUERY") and isinstance(value, str)
+    }
+
+
+def get_sample_params(conn: sqlite3.Connection) -> dict[str, Any]:
+    # the member with the longest voting record is the worst case for per-member queries
+    (member_id,) = conn.execute(
+        f"SELECT [Member ID] FROM {MEMBER_STATS_TABLE} ORDER BY [Votes Attended] DESC LIMIT 1"
+    ).fetchone()
+    # the most recent day of divisions, as passed to incremental updates
+    latest_vote_ids = conn.execute(
+        f"SELECT [Vote ID] FROM {VOTES_HELD_TABLE} "
+        f"WHERE substr([Date], 1, 10) = (SELECT substr(MAX([Date]), 1, 10) FROM {VOTES_HELD_TABLE})"
+    ).fetchall()
+    vote_ids = orjson.dumps([vote_id for (vote_id,) in latest_vote_ids]).decode()
+    # the members and bills those divisions affect, as update_vote_summaries refreshes them
+    member_ids = conn.execute(repsheet_db.MEMBERS_AFFECTED_BY_VOTES_QUERY, {"vote_ids": vote_ids})
+    bill_ids = conn.execute(
+        f"SELECT DISTINCT [Bill ID] FROM {VOTES_HELD_TABLE} "
+        "WHERE [Bill ID] IS NOT NULL AND [Vote ID] IN (SELECT value FROM json_each(?))",
+        (vote_ids,),
+    )
+    # their member votes, as the compact layout's insert queries are given them
+    member_votes = pd.read_sql_query(
+        f"SELECT * FROM {MEMBER_VOTES_TABLE} WHERE [Vote ID] IN (SELECT value FROM json_each(?))",
+        conn,
+        params=[vote_ids],
+    )
+    return {
+        "member_id": member_id,
+        "vote_ids": vote_ids,
+        "rows": repsheet_db.compact_member_vote_rows(member_votes),
+        "member_ids": orjson.dumps([member_id for (member_id,) in member_ids]).decode(),
+        "bill_ids": orjson.dumps([bill_id for (bill_id,) in bill_ids]).decode(),
+    }
+
+
+def get_table_sizes(conn: sqlite3.Connection) -> dict[str, int]:
+    return {
+        table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in (MEMBERS_TABLE, BILLS_TABLE, VOTES_HELD_TABLE, MEMBER_VOTES_TABLE)
+    }
+
+
+def format_query_plan(plan_rows: list[tuple]) -> list[str]:
+    """EXPLAIN QUERY PLAN rows are (id, parent, notused, detail), parents always come before children."""
+    depths = {0: -1}
+    lines = []
+    for node_id, parent_id, _, detail in plan_rows:
+        depths[node_id] = depths.get(parent_id, -1) + 1
+        lines.append("  " * depths[node_id] + detail)
+    return lines
+
+
+def profile_query(conn: sqlite3.Connection, query: str, sample_params: dict[str, Any]) -> dict:
+    """Records the query plan and wall time of a query, rolling back any changes it makes.
+    Queries that don't apply to this database (e.g. the compact member_votes layout), or that take
+    parameters there's no sample for, record the error."""
+    missing = set(QUERY_PARAM_REGEX.findall(query)) - sample_params.keys()
+    if missing:
+        return {"error": f"no sample value for {', '.join(sorted(missing))}"}
+    params = {name: sample_params[name] for name in QUERY_PARAM_REGEX.findall(query)}
+    conn.execute("SAVEPOINT profile")
+    try:
+        target = QUERY_TARGET_REGEX.search(query)
+        if target is not None:
+            statement, table = target.groups()
+            if statement == "CREATE TABLE":
+                conn.execute(f"DROP TABLE IF EXISTS {table}")
+            else:
+                conn.execute(f"DELETE FROM {table}")
+        plan = format_query_plan(conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall())
+        start = time.perf_counter()
+        rows = conn.execute(query, params).fetchall()
+        seconds = time.perf_counter() - start
+    except sqlite3.OperationalError as e:
+        return {"error": str(e)}
+    finally:
+        conn.execute("ROLLBACK TO profile")
+        conn.execute("RELEASE profile")
+    return {"seconds": seconds, "rows": len(rows), "plan": plan}
+
+
+def profile_db():
+    conn = sqlite3.connect(REPSHEET_DB, isolation_level=None)
+    try:
+        sample_params = get_sample_params(conn)
+        table_sizes = get_table_sizes(conn)
+        run_at = datetime.now(timezone.utc).isoformat()
+        results = []
+        for name, query in get_sql_constants().items():
+            result = profile_query(conn, query, sample_params)
+            if "error" in result:
+                print(f"{name}: skipped ({result['error']})")
+                continue
+            print(f"{name}: {result['seconds']:.3f}s ({result['rows']} rows)")
+            for line in result["plan"]:
+                print(f"    {line}")
+            results.append({"run_at": run_at, "query": name, "table_sizes": table_sizes, **result})
+    finally:
+        conn.close()
+
+    os.makedirs(os.path.dirname(PROFILE_OUTPUT), exist_ok=True)
+    with open(PROFILE_OUTPUT, "ab") as f:
+        for result in results:
+            f.write(orjson.dumps(result) + b"\n")
+    print(f"Appended {len(results)} query profiles to {PROFILE_OUTPUT}")
+
+
+if __name__ == "__main__":
+    profile_db()
@@ -0,0 +1,168 @@
+import asyncio
+from os import path
+import sys
+
+from repsheet_backend.common import (
+    BILL_FINAL_READING_VOTE_TABLE,
+    BILLS_TABLE,
+    DATA_DIR,
+    LATEST_PARLIAMENT,
+    MEMBER_STATS_TABLE,
+    MEMBER_VOTES_TABLE,
+    MEMBERS_TABLE,
+    PARLIAMENTS_TABLE,
+    PARLIMENTARY_SESSIONS,
+    PROMPTS_DIR,
+    VOTE_PARTY_SUMMARY_TABLE,
+    VOTE_SUMMARY_TABLE,
+    VOTES_HELD_TABLE,
+)
+from repsheet_backend.db import COMPACT_MEMBER_VOTES, RepsheetDB
+from repsheet_backend.genai import genai_cache
+from repsheet_backend.genai_metrics import genai_metrics
+from repsheet_backend.pipeline import Pipeline, Stage, fingerprint, fingerprint_files
+from repsheet_backend.scripts.add_summaries import (
+    add_bill_summaries,
+    add_member_summaries,
+    print_failed_members,
+)
+from repsheet_backend.scripts.build_db import (
+    create_summary_tables,
+    fetch_source_data,
+    load_member_votes,
+    load_tables,
+)
+from repsheet_backend.scripts.download_photos import download_photos
+from repsheet_backend.tracing import tracer
+
+SOURCE_DATA_PATHS = (
+    path.join(DATA_DIR, f"members-{LATEST_PARLIAMENT}.csv"),
+    path.join(DATA_DIR, BILLS_TABLE),
+    path.join(DATA_DIR, VOTES_HELD_TABLE),
+)
+
+
+def row_counts(*tables: str):
+    """Enough to tell whether the tables a stage built are still there."""
+
+    def outputs() -> str:
+        with RepsheetDB.connect() as db:
+            return fingerprint(
+                [db.query_fingerprint(f"SELECT COUNT(*) FROM {table}") for table in tables]
+            )
+
+    return outputs
+
+
+def column_contents(table: str, column: str):
+    def outputs() -> str:
+        with RepsheetDB.connect() as db:
+            return db.query_fingerprint(f"SELECT [{column}] FROM {table} ORDER BY rowid")
+
+    return outputs
+
+
+def columns_contents(table: str, *columns: str):
+    def outputs() -> str:
+        return fingerprint([column_contents(table, column)() for column in columns])
+
+    return outputs
+
+
+async def bill_summaries():
+    with RepsheetDB.connect() as db:
+        bills = db.get_nonunanimous_bills_voted_on_by_a_current_member()
+        print(f"Summarizing {len(bills)} bills voted on by a current member")
+        failed_bills = await add_bill_summaries(db, bills)
+    if len(failed_bills) > 0:
+        print(f"Failed to summarize {len(failed_bills)} bills")
+
+
+async def member_summaries():
+    with RepsheetDB.connect() as db:
+        failed_member_ids = await add_member_summaries(db)
+    print_failed_members(failed_member_ids)
+
+
+async def photos():
+    failed = await download_photos()
+    if len(failed) > 0:
+        raise RuntimeError(f"Failed to download photos of {len(failed)} members")
+
+
+def pipeline_stages(compact_member_votes: bool = COMPACT_MEMBER_VOTES) -> list[Stage]:
+    return [
+        Stage(
+            "fetch",
+            fetch_source_data,
+            inputs=lambda: fingerprint(PARLIMENTARY_SESSIONS),
+            outputs=lambda: fingerprint_files(SOURCE_DATA_PATHS),
+        ),
+        Stage(
+            "load",
+            load_tables,
+            depends_on=("fetch",),
+            outputs=row_counts(PARLIAMENTS_TABLE, MEMBERS_TABLE, BILLS_TABLE, VOTES_HELD_TABLE),
+        ),
+        Stage(
+            "member_votes",
+            lambda: load_member_votes(compact_member_votes),
+            depends_on=("load",),
+            # switching layout rebuilds the table, the default layout has no inputs as before
+            inputs=(lambda: "compact") if compact_member_votes else None,
+            outputs=row_counts(MEMBER_VOTES_TABLE, MEMBER_STATS_TABLE),
+        ),
+        Stage(
+            "summary_tables",
+            create_summary_tables,
+            depends_on=("member_votes",),
+            outputs=row_counts(
+                VOTE_SUMMARY_TABLE, VOTE_PARTY_SUMMARY_TABLE, BILL_FINAL_READING_VOTE_TABLE
+            ),
+        ),
+        Stage("photos", photos, depends_on=("load",)),
+        Stage(
+            "bill_summaries",
+            bill_summaries,
+            depends_on=("summary_tables",),
+            inputs=lambda: fingerprint_files([PROMPTS_DIR]),
+            outputs=column_contents(BILLS_TABLE, "Summary"),
+        ),
+        Stage(
+            "member_summaries",
+            member_summaries,
+            depends_on=("bill_summaries",),
+            inputs=lambda: fingerprint_files([PROMPTS_DIR]),
+            # short summaries are condensed as each member's summary is written
+            outputs=columns_contents(MEMBERS_TABLE, "Summary", "Short Summary"),
+        ),
+    ]
+
+
+async def run_pipeline(force: list[str], compact_member_votes: bool = COMPACT_MEMBER_VOTES):
+    await genai_cache.init()
+    try:
+        failed = await Pipeline(pipeline_stages(compact_member_votes)).run(force=force)
+    finally:
+        tracer.save()
+    print(genai_metrics.report())
+    if len(failed) > 0:
+        print(f"Failed stages: {', '.join(failed)}")
+        sys.exit(1)
+    with RepsheetDB.connect() as db:
+        db.optimize()
+
+
+if __name__ == "__main__":
+    # --trace writes a Chrome trace of the run, --profile also writes a cProfile dump per stage,
+    # --compact-member-votes stores member votes with integer keys behind a member_votes view
+    flags = {arg for arg in sys.argv[1:] if arg.startswith("--")}
+    if "--trace" in flags or "--profile" in flags:
+        tracer.enable(profile="--profile" in flags)
+    # stage names given as arguments are run even if unchanged
+    asyncio.run(
+        run_pipeline(
+            [arg for arg in sys.argv[1:] if arg not in flags],
+            compact_member_votes="--compact-member-votes" in flags or COMPACT_MEMBER_VOTES,
+        )
+    )
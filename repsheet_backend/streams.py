@@ -0,0 +1,46 @@
+import asyncio
+from typing import Any, AsyncIterable, AsyncIterator, TypeVar
+
+T = TypeVar("T")
+
+
+async def micro_batches(
+    items: AsyncIterable[T], batch_size: int, max_delay: float
+) -> AsyncIterator[list[T]]:
+    """Group a stream into batches of `batch_size`, yielding a smaller batch early once its
+    first item has waited `max_delay` seconds, so slow streams still make progress."""
+    queue: asyncio.Queue[tuple[bool, Any]] = asyncio.Queue(maxsize=batch_size)
+
+    async def read_items():
+        try:
+            async for item in items:
+                await queue.put((False, item))
+        finally:
+            await queue.put((True, None))
+
+    reader = asyncio.create_task(read_items())
+    loop = asyncio.get_running_loop()
+    batch: list[T] = []
+    deadline = 0.0
+    try:
+        finished = False
+        while not finished:
+            timeout = max(0.0, deadline - loop.time()) if batch else None
+            try:
+                finished, item = await asyncio.wait_for(queue.get(), timeout)
+            except TimeoutError:
+                pass
+            else:
+                if not finished:
+                    if not batch:
+                        deadline = loop.time() + max_delay
+                    batch.append(item)
+                    if len(batch) < batch_size:
+                        continue
+            if batch:
+                yield batch
+                batch = []
+        # raise any error from reading the stream
+        await reader
+    finally:
+        reader.cancel()
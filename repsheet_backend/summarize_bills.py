@@ -1,16 +1,41 @@
+import asyncio
+import json
+from math import ceil
+import os
+from os import path
 import re
 from typing import Optional
+from xml.etree.ElementTree import ParseError
 from pydantic import BaseModel
 
 from repsheet_backend.common import BillId, BillSummary, load_prompt_template
-from repsheet_backend.fetch_data import fetch_latest_bill_text
-from repsheet_backend.genai import generate_text, GEMINI_FLASH_2
+from repsheet_backend.fetch_data import fetch_latest_bill_text_path
+from repsheet_backend.bill_xml import BILL_XML_REDUCER_VERSION, reduce_bill_xml, section_bill_xml
+from repsheet_backend.genai import (
+    CHARS_PER_TOKEN,
+    GEMINI_FLASH_2,
+    GEMINI_FLASH_LITE_2,
+    estimate_tokens,
+    generate_text,
+)
+from repsheet_backend.json_repair import repair_json
 
-SUMMARIZE_BILL_PROMPT_TEMPLATE = load_prompt_template("summarize-bill/001.txt")
+SUMMARIZE_BILL_PROMPT = "summarize-bill/001.txt"
+SUMMARIZE_BILL_SECTION_PROMPT = "summarize-bill-section/001.txt"
+MERGE_BILL_SUMMARIES_PROMPT = "merge-bill-summaries/001.txt"
+
+# Bills longer than this are split into sections which are summarized separately and merged,
+# shorter bills are summarized in a single prompt
+LONG_BILL_TOKENS = 200000
+# The size of each section, small enough for models with a smaller context window.
+# Sections don't need the 1M context window, so they go to the cheaper Flash-Lite at half the price.
+BILL_SECTION_TOKENS = 100000
+BILL_SECTION_MODEL = GEMINI_FLASH_LITE_2
+
+# Token counts before and after reducing each bill's XML
+BILL_REDUCTION_LOG = "debug/bill_xml_reduction.jsonl"
 
 xref_external_regex = re.compile(r"<XRefExternal[^>]*>(.*?)<\/XRefExternal>")
-trailing_comma_regex = re.compile(r",\s*}")
-missing_comma_regex = re.compile(r'"\s*"')
 
 
 def simplify_bill_xml(xml_text: str) -> str:
@@ -19,35 +44,140 @@ def simplify_bill_xml(xml_text: str) -> str:
     return xref_external_regex.sub(r"\1", xml_text)
 
 
-async def get_bill_summarization_prompt(bill: BillId) -> Optional[str]:
-    xml_text = await fetch_latest_bill_text(bill)
+def reduced_bill_xml_path(xml_path: str) -> str:
+    return xml_path.removesuffix(".xml") + f".reduced-{BILL_XML_REDUCER_VERSION}.xml"
+
+
+def log_bill_reduction(bill: BillId, xml_path: str, reduced_xml_text: str):
+    # bytes rather than characters, close enough for an estimate without reading the whole file
+    raw_tokens = ceil(path.getsize(xml_path) / CHARS_PER_TOKEN)
+    reduced_tokens = estimate_tokens(reduced_xml_text)
+    print(f"Reduced {bill} from {raw_tokens} to {reduced_tokens} tokens")
+    os.makedirs(path.dirname(BILL_REDUCTION_LOG), exist_ok=True)
+    with open(BILL_REDUCTION_LOG, "a") as f:
+        f.write(
+            json.dumps(
+                {
+                    "bill": str(bill),
+                    "reducer_version": BILL_XML_REDUCER_VERSION,
+                    "raw_tokens": raw_tokens,
+                    "reduced_tokens": reduced_tokens,
+                }
+            )
+            + "\n"
+        )
+
+
+async def get_bill_xml(bill: BillId) -> Optional[str]:
+    """The latest text of the bill, reduced to just the legislative text.
+    The reduced text is cached next to the downloaded XML."""
+    xml_path = await fetch_latest_bill_text_path(bill)
+    if xml_path is None:
+        return None
+    reduced_path = reduced_bill_xml_path(xml_path)
+    if path.exists(reduced_path):
+        with open(reduced_path, "r") as f:
+            return f.read()
+    try:
+        reduced_xml_text = await asyncio.to_thread(reduce_bill_xml, xml_path)
+    except ParseError as e:
+        print(f"Unable to reduce {bill}, using the whole XML: {e}")
+        with open(xml_path, "r") as f:
+            return simplify_bill_xml(f.read())
+    log_bill_reduction(bill, xml_path, reduced_xml_text)
+    with open(reduced_path, "w") as f:
+        f.write(reduced_xml_text)
+    return reduced_xml_text
+
+
+async def get_bill_summarization_prompts(bill: BillId) -> Optional[list[str]]:
+    """A single prompt for most bills, or one prompt per section for long bills."""
+    xml_text = await get_bill_xml(bill)
     if xml_text is None:
         return None
-    xml_text = simplify_bill_xml(xml_text)
-    return SUMMARIZE_BILL_PROMPT_TEMPLATE.replace("{{BILL_XML}}", xml_text)
+    if estimate_tokens(xml_text) > LONG_BILL_TOKENS:
+        try:
+            sections = section_bill_xml(xml_text, BILL_SECTION_TOKENS)
+        except ParseError as e:
+            print(f"Unable to split {bill} into sections, summarizing whole: {e}")
+        else:
+            return [
+                load_prompt_template(SUMMARIZE_BILL_SECTION_PROMPT).render(BILL_XML=section)
+                for section in sections
+            ]
+    return [load_prompt_template(SUMMARIZE_BILL_PROMPT).render(BILL_XML=xml_text)]
+
+
+def get_bill_summary_merge_prompt(summaries: list[BillSummary]) -> str:
+    summaries_json = [summary.model_dump(mode="json") for summary in summaries]
+    summaries_json = json.dumps(summaries_json, indent=2, sort_keys=True)
+    return load_prompt_template(MERGE_BILL_SUMMARIES_PROMPT).render(
+        RAW_INPUT_DATA=summaries_json
+    )
 
 
 async def summarize_bill(bill: BillId) -> Optional[BillSummary]:
-    prompt = await get_bill_summarization_prompt(bill)
-    if prompt is None:
+    prompts = await get_bill_summarization_prompts(bill)
+    if prompts is None:
         return None
-    # Gemini Flash 2 has a 1M context window, needed for appropriation bills
-    # and is not too costly
-    response = await generate_text(prompt, model=GEMINI_FLASH_2)
+    return await summarize_bill_from_prompts(bill, prompts)
+
+
+async def summarize_bill_from_prompts(bill: BillId, prompts: list[str]) -> Optional[BillSummary]:
+    """Summarize a bill from the prompts built by `get_bill_summarization_prompts`."""
+    if len(prompts) == 1:
+        # Gemini Flash 2 has a 1M context window, needed for appropriation bills
+        # and is not too costly
+        response = await generate_text(
+            prompts[0],
+            model=GEMINI_FLASH_2,
+            response_model=BillSummary,
+            stage="bill",
+            template=SUMMARIZE_BILL_PROMPT,
+        )
+        if response is None:
+            print(f"Error generating summary for {bill}, likely exceeded token count")
+            return None
+        return cleanup_and_validate_summary_json(response)
+
+    print(f"Summarizing {bill} in {len(prompts)} sections")
+    responses = await asyncio.gather(
+        *[
+            generate_text(
+                prompt,
+                model=BILL_SECTION_MODEL,
+                response_model=BillSummary,
+                stage="bill_section",
+                template=SUMMARIZE_BILL_SECTION_PROMPT,
+            )
+            for prompt in prompts
+        ]
+    )
+    section_summaries: list[BillSummary] = []
+    for response in responses:
+        section_summary = (
+            cleanup_and_validate_summary_json(response) if response is not None else None
+        )
+        if section_summary is None:
+            print(f"Error generating section summaries for {bill}")
+            return None
+        section_summaries.append(section_summary)
+    merge_prompt = get_bill_summary_merge_prompt(section_summaries)
+    response = await generate_text(
+        merge_prompt,
+        model=GEMINI_FLASH_2,
+        response_model=BillSummary,
+        stage="bill_merge",
+        template=MERGE_BILL_SUMMARIES_PROMPT,
+    )
     if response is None:
-        print(f"Error generating summary for {bill}, likely exceeded token count")
+        print(f"Error merging section summaries for {bill}")
         return None
     return cleanup_and_validate_summary_json(response)
 
 
 def cleanup_and_validate_summary_json(json_text: str) -> Optional[BillSummary]:
-    json_text = json_text.removeprefix("```json\n").removesuffix("\n```")
-    # Remove trailing commas before closing braces
-    json_text = trailing_comma_regex.sub("}", json_text)
-    # Add any missing commas
-    json_text = missing_comma_regex.sub('", "', json_text)
-    # Never seen this as an escape character before, but the AI seems to think it's real
-    json_text = json_text.replace("\\$", "$").replace("\\$", "$")
+    json_text = repair_json(json_text)
     try:
         return BillSummary.model_validate_json(json_text)
     except Exception as e:
@@ -1,37 +1,66 @@
 import asyncio
+import hashlib
 import json
-from math import floor
+from math import ceil
 import os
-from random import Random
 import re
-from typing import Iterable, Iterator, Literal, Optional
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    Optional,
+    Sequence,
+    TypeVar,
+)
 from pydantic import BaseModel, ValidationError
 
 from repsheet_backend.common import (
     BillVotingRecord,
     MemberSummary,
-    fix_broken_newlines_in_json,
     load_prompt_template,
 )
 from repsheet_backend.db import RepsheetDB
 from repsheet_backend.genai import (
     CLAUDE_HAIKU,
     CLAUDE_SONNET,
+    CONTEXT_WINDOW,
+    MAX_OUTPUT_TOKENS,
+    estimate_tokens,
     generate_text,
     generate_text_batch,
     prompt_cache_key,
 )
+from repsheet_backend.json_repair import repair_json
+from repsheet_backend.streams import micro_batches
+
+
+SUMMARIZE_MEMBER_PROMPT = "summarize-member/001.txt"
+MERGE_SUMMARIES_PROMPT = "merge-summaries/001.txt"
+CONDENSE_SUMMARY_PROMPT = "condense-summary/001.txt"
 
+# Voting records are packed into as few prompts as fit this many input tokens.
+# Smaller prompts give more detailed sub-summaries at the cost of more calls and a bigger merge.
+RECORD_TOKENS_PER_PROMPT = 48000
 
-SUMMARIZE_MEMBER_PROMPT_TEMPLATE = load_prompt_template("summarize-member/001.txt")
-MERGE_SUMMARIES_PROMPT_TEMPLATE = load_prompt_template("merge-summaries/001.txt")
-CONDENSE_SUMMARY_PROMPT_TEMPLATE = load_prompt_template("condense-summary/001.txt")
+# Sessions too big for one prompt are split into buckets by a hash of the bill ID, with this
+# much headroom so that uneven buckets still fit. The number of buckets only doubles once they
+# outgrow it, so a growing session keeps its buckets (and their cache entries) in between.
+SESSION_BUCKET_FILL = 0.75
 
-BATCH_COUNT = int(floor(200000 / 8192)) - 1
+# Maximum number of summaries merged in one prompt, records long enough to need
+# more sub-summaries than this are merged as a tree
+MERGE_FAN_IN = 8
 
-# fixed to make sure batches are deterministic
-# to allow for caching of AI responses
-RANDOM_SEED = 338
+# Condense summaries in small batches as members finish, submitting a batch once it is full
+# or its first summary has waited this long
+CONDENSE_BATCH_SIZE = 20
+CONDENSE_BATCH_SECONDS = 60.0
+
+T = TypeVar("T")
 
 BILL_REF_REGEX = re.compile(r"\[[^\]]+\]\(([^\)]+)\)")
 
@@ -62,10 +91,6 @@ EXTRA_MANUAL_FIXES = (
     ("[Pension Protection Act](C-228)(44-1-C-228)", "[C-228](44-1-C-228)"),
 )
 
-os.makedirs("debug", exist_ok=True)
-os.makedirs("debug/broken_links", exist_ok=True)
-os.makedirs("debug/validation", exist_ok=True)
-
 
 def broken_bill_links(summary: str, all_bill_ids: set[str]) -> set[str]:
     """Check if the summary contains any broken bill links."""
@@ -77,34 +102,106 @@ def broken_bill_links(summary: str, all_bill_ids: set[str]) -> set[str]:
     return result
 
 
-def batched(iterable: list, batches: int) -> Iterator[list]:
-    batch_size = len(iterable) // batches
-    if batch_size == 0:
-        yield iterable
-    for i in range(0, batches):
-        if i == batches - 1:
-            yield iterable
-            return
-        else:
-            yield iterable[:batch_size]
-            iterable = iterable[batch_size:]
+def record_token_budget(model: str) -> int:
+    """The number of tokens of voting records that fit in one summarisation prompt for a model."""
+    available = (
+        int(CONTEXT_WINDOW[model])
+        - estimate_tokens(load_prompt_template(SUMMARIZE_MEMBER_PROMPT).source)
+        - MAX_OUTPUT_TOKENS[model]
+    )
+    return min(RECORD_TOKENS_PER_PROMPT, available)
+
+
+def batched_by_tokens(objs: list[dict], token_budget: int) -> Iterator[list[dict]]:
+    """Split objects into as few batches as fit the token budget once serialized,
+    keeping the batches of similar size rather than leaving a small one at the end."""
+    tokens = [estimate_tokens(json.dumps(obj, indent=2, sort_keys=True)) for obj in objs]
+    remaining_tokens = sum(tokens)
+    remaining_batches = max(1, ceil(remaining_tokens / token_budget))
+    batch: list[dict] = []
+    batch_tokens = 0
+    for obj, obj_tokens in zip(objs, tokens):
+        target_tokens = remaining_tokens / remaining_batches
+        if batch and (
+            batch_tokens + obj_tokens > token_budget
+            # close the batch if this object would be mostly past the target size
+            or batch_tokens + obj_tokens / 2 > target_tokens
+        ):
+            yield batch
+            remaining_tokens -= batch_tokens
+            remaining_batches = max(1, remaining_batches - 1)
+            batch = []
+            batch_tokens = 0
+        batch.append(obj)
+        batch_tokens += obj_tokens
+    if batch:
+        yield batch
+
+
+def bill_session(bill_id: str) -> tuple[int, int]:
+    """The (parliament, session) a bill belongs to, e.g. 44-1-C-11 is (44, 1)."""
+    parliament, session, *_ = bill_id.split("-")
+    return int(parliament), int(session)
+
+
+def bill_bucket(bill_id: str, bucket_count: int) -> int:
+    # hashlib rather than hash() as that is salted per process
+    return int.from_bytes(hashlib.sha1(bill_id.encode()).digest()[:8], "big") % bucket_count
+
+
+def chunk_voting_record(objs: list[dict], token_budget: int) -> list[list[dict]]:
+    """Split voting record objects into chunks that stay the same as new votes are added.
+    Whole sessions are packed together oldest first, so new votes (which are almost always in the
+    latest session) only change the last chunk. Sessions too big for one chunk are bucketed by
+    bill ID into a power of two number of buckets, so a new bill only changes the bucket it lands
+    in, except for the rare bill that makes the session outgrow its buckets."""
+    sessions: dict[tuple[int, int], list[dict]] = {}
+    for obj in sorted(objs, key=lambda obj: obj["billID"]):
+        sessions.setdefault(bill_session(obj["billID"]), []).append(obj)
+
+    chunks: list[list[dict]] = []
+    chunk: list[dict] = []
+    chunk_tokens = 0
+    for _, session_objs in sorted(sessions.items()):
+        session_tokens = sum(
+            estimate_tokens(json.dumps(obj, indent=2, sort_keys=True)) for obj in session_objs
+        )
+        if chunk and chunk_tokens + session_tokens > token_budget:
+            chunks.append(chunk)
+            chunk = []
+            chunk_tokens = 0
+        if session_tokens <= token_budget:
+            chunk.extend(session_objs)
+            chunk_tokens += session_tokens
+            continue
+
+        buckets_needed = ceil(session_tokens / (token_budget * SESSION_BUCKET_FILL))
+        bucket_count = 1 << (buckets_needed - 1).bit_length()
+        buckets: list[list[dict]] = [[] for _ in range(bucket_count)]
+        for obj in session_objs:
+            buckets[bill_bucket(obj["billID"], bucket_count)].append(obj)
+        for bucket in buckets:
+            # only split further in the unlikely case that the hash is very uneven
+            chunks.extend(batched_by_tokens(bucket, token_budget))
+    if chunk:
+        chunks.append(chunk)
+    return chunks
 
 
 def get_member_summarisation_prompts(
     voting_record: list[BillVotingRecord],
+    model: str = CLAUDE_HAIKU,
 ) -> list[str]:
-    """We split the voting record into batches, and summarize each batch separately.
-    This returns a list of prompts to be sent to the AI, one for each batch."""
+    """We split the voting record into chunks sized to fit the model, and summarize each chunk separately.
+    This returns a list of prompts to be sent to the AI, one for each chunk.
+    The chunks are stable as votes are added so that only the changed chunks miss the cache."""
     voting_record_objs = [
         vote.model_dump(mode="json", exclude_none=True) for vote in voting_record
     ]
-    Random(RANDOM_SEED).shuffle(voting_record_objs)
     result = []
-    for obj_batch in batched(voting_record_objs, BATCH_COUNT):
+    for obj_batch in chunk_voting_record(voting_record_objs, record_token_budget(model)):
         batch_json = json.dumps(obj_batch, indent=2, sort_keys=True)
-        result.append(
-            SUMMARIZE_MEMBER_PROMPT_TEMPLATE.replace("{{RAW_INPUT_DATA}}", batch_json)
-        )
+        result.append(load_prompt_template(SUMMARIZE_MEMBER_PROMPT).render(RAW_INPUT_DATA=batch_json))
     return result
 
 
@@ -112,14 +209,48 @@ def get_summary_merge_prompt(summaries: list[MemberSummary]) -> str:
     """Generate the promp for merging multiple summaries together into a single summary."""
     summaries_json = [summary.model_dump(mode="json") for summary in summaries]
     summaries_json = json.dumps(summaries_json, indent=2, sort_keys=True)
-    return MERGE_SUMMARIES_PROMPT_TEMPLATE.replace("{{RAW_INPUT_DATA}}", summaries_json)
+    return load_prompt_template(MERGE_SUMMARIES_PROMPT).render(RAW_INPUT_DATA=summaries_json)
+
+
+def group_for_merge(summaries: list[T], fan_in: int) -> list[list[T]]:
+    """Split summaries into consecutive groups of at most `fan_in` to be merged together."""
+    return [summaries[i : i + fan_in] for i in range(0, len(summaries), fan_in)]
+
+
+async def merge_summaries_tree(
+    summaries: list[MemberSummary],
+    merge_level: Callable[
+        [int, list[list[MemberSummary]]], Awaitable[Sequence[Optional[MemberSummary]]]
+    ],
+    fan_in: int = MERGE_FAN_IN,
+) -> Optional[MemberSummary]:
+    """Merge summaries as a tree, with at most `fan_in` summaries per merge prompt.
+    `merge_level` runs all the merges of one level of the tree together. Each merge is cached by its
+    prompt, so a change in one sub-summary only re-runs the merges on its path to the root."""
+    if len(summaries) == 0:
+        return None
+    level = 0
+    while True:
+        groups = group_for_merge(summaries, fan_in)
+        is_root = len(groups) == 1
+        # a group of one is carried up to the next level as is, but the root is always merged
+        to_merge = [group for group in groups if is_root or len(group) > 1]
+        merged = iter(await merge_level(level, to_merge))
+        next_summaries: list[MemberSummary] = []
+        for group in groups:
+            summary = next(merged) if is_root or len(group) > 1 else group[0]
+            if summary is None:
+                return None
+            next_summaries.append(summary)
+        if is_root:
+            return next_summaries[0]
+        summaries = next_summaries
+        level += 1
 
 
 def validate_member_summary(text: str | None) -> MemberSummary:
     assert text is not None
-    text = text.removeprefix("```json\n").removesuffix("\n```")
-    text = fix_broken_newlines_in_json(text)
-    return MemberSummary.model_validate_json(text)
+    return MemberSummary.model_validate_json(repair_json(text))
 
 
 def write_prompts_and_summaries(
@@ -147,7 +278,10 @@ async def generate_member_summary(
                 prompt,
                 model=CLAUDE_HAIKU,
                 temperature=0.0,
+                response_model=MemberSummary,
                 invalidate_cache=invalidate_cache,
+                stage="member_sub_summary",
+                template=SUMMARIZE_MEMBER_PROMPT,
             )
             for prompt in prompts
         ]
@@ -164,6 +298,9 @@ async def generate_member_summary(
                 prompts[summary_i],
                 model=CLAUDE_SONNET,
                 temperature=0.0,
+                response_model=MemberSummary,
+                stage="member_regeneration",
+                template=SUMMARIZE_MEMBER_PROMPT,
             )
             assert new_summary is not None
             broken_links = broken_bill_links(new_summary, all_bill_ids)
@@ -179,32 +316,48 @@ async def generate_member_summary(
         )
 
     processed_summaries = [validate_member_summary(summary) for summary in summaries]
-    merge_summary_prompt = get_summary_merge_prompt(processed_summaries)
-    # use the expensive model to merge them, as this is a small number of tokens,
-    # and is also the final output so should be polished
-    merged_summary = await generate_text(
-        merge_summary_prompt,
-        model=CLAUDE_SONNET,
-        temperature=0.0,
-        invalidate_cache=invalidate_cache,
-    )
-    assert merged_summary is not None
 
-    broken_links = broken_bill_links(merged_summary, all_bill_ids)
-    if len(broken_links) > 0:
-        raise ValueError(
-            f"Found {len(broken_links)} broken bill links in merged summary run with {CLAUDE_SONNET}"
+    async def merge_level(level: int, groups: list[list[MemberSummary]]) -> list[MemberSummary]:
+        merge_prompts = [get_summary_merge_prompt(group) for group in groups]
+        # use the expensive model to merge them, as this is a small number of tokens,
+        # and is also the final output so should be polished
+        merged_summaries = await asyncio.gather(
+            *[
+                generate_text(
+                    merge_prompt,
+                    model=CLAUDE_SONNET,
+                    temperature=0.0,
+                    response_model=MemberSummary,
+                    invalidate_cache=invalidate_cache,
+                    stage="member_merge",
+                    template=MERGE_SUMMARIES_PROMPT,
+                )
+                for merge_prompt in merge_prompts
+            ]
         )
+        for merged_summary in merged_summaries:
+            assert merged_summary is not None
+            broken_links = broken_bill_links(merged_summary, all_bill_ids)
+            if len(broken_links) > 0:
+                raise ValueError(
+                    f"Found {len(broken_links)} broken bill links in merged summary run with {CLAUDE_SONNET}"
+                )
 
-    if dump_prompts_to_path is not None:
-        write_prompts_and_summaries(
-            f"{dump_prompts_to_path}/{member_id}/final-summary.txt",
-            [(merge_summary_prompt, merged_summary)],
-        )
-        print(f"{member_id} merge cache key: {prompt_cache_key(merge_summary_prompt, CLAUDE_SONNET, 0.0)}")
+        if dump_prompts_to_path is not None:
+            write_prompts_and_summaries(
+                f"{dump_prompts_to_path}/{member_id}/merge-level-{level}.txt",
+                zip(merge_prompts, merged_summaries),
+            )
+            for merge_prompt in merge_prompts:
+                print(
+                    f"{member_id} level {level} merge cache key: {prompt_cache_key(merge_prompt, CLAUDE_SONNET, 0.0, MemberSummary)}"
+                )
+
+        return [validate_member_summary(merged_summary) for merged_summary in merged_summaries]
 
+    merged_summary = await merge_summaries_tree(processed_summaries, merge_level)
     assert merged_summary is not None
-    return validate_member_summary(merged_summary)
+    return merged_summary
 
 
 async def validate_summary_regenerate_if_broken(
@@ -213,9 +366,11 @@ async def validate_summary_regenerate_if_broken(
     all_bill_ids: set[str],
     member_id: str,
     model: str,
+    template: str,
     attempt: int = 0,
 ) -> Optional[MemberSummary]:
     if summary is None:
+        # e.g. a regeneration that isn't cached when replaying with `cache_only`
         return None
     broken_links = broken_bill_links(summary, all_bill_ids)
     if len(broken_links) > 0:
@@ -227,10 +382,12 @@ async def validate_summary_regenerate_if_broken(
                 [prompt],
                 model=CLAUDE_SONNET,
                 temperature=0.0,
+                response_model=MemberSummary,
+                stage="member_regeneration",
+                template=template,
             ))[0]
-            assert new_summary is not None
             return await validate_summary_regenerate_if_broken(
-                prompt, new_summary, all_bill_ids, member_id, model=CLAUDE_SONNET
+                prompt, new_summary, all_bill_ids, member_id, model=CLAUDE_SONNET, template=template
             )
         else:
             for fix_from, fix_to in EXTRA_MANUAL_FIXES:
@@ -246,6 +403,7 @@ async def validate_summary_regenerate_if_broken(
 
             if len(broken_links) > 0:
                 output_file = f"debug/broken_links/{member_id}-summary.json"
+                os.makedirs(os.path.dirname(output_file), exist_ok=True)
                 with open(output_file, "w") as f:
                     json.dump(
                         {"broken_links": list(broken_links), "summary": summary},
@@ -266,21 +424,27 @@ async def validate_summary_regenerate_if_broken(
                 [prompt],
                 model=CLAUDE_SONNET,
                 temperature=0.0,
+                response_model=MemberSummary,
+                stage="member_regeneration",
+                template=template,
             ))[0]
-            assert new_summary is not None
             return await validate_summary_regenerate_if_broken(
-                prompt, new_summary, all_bill_ids, member_id, model=CLAUDE_SONNET
+                prompt, new_summary, all_bill_ids, member_id, model=CLAUDE_SONNET, template=template
             )
         elif attempt >= MAX_REGENERATION_ATTEMPTS:
             # dump details for debug
             output_file = f"debug/validation/{member_id}-summary.json"
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
             with open(output_file, "w") as f:
                 json.dump(
                     {
                         "error": str(e),
                         "summary": summary,
                         "cache_key": prompt_cache_key(
-                            prompt, model=CLAUDE_SONNET, temperature=0.0
+                            prompt,
+                            model=CLAUDE_SONNET,
+                            temperature=0.0,
+                            response_model=MemberSummary,
                         ),
                     },
                     f,
@@ -293,27 +457,41 @@ async def validate_summary_regenerate_if_broken(
                 f"Validation failed with {CLAUDE_SONNET}, invalidating cache and retrying (attempt {attempt + 1})"
             )
             new_summary = await generate_text(
-                prompt, model=CLAUDE_SONNET, temperature=0.0, invalidate_cache=True
+                prompt,
+                model=CLAUDE_SONNET,
+                temperature=0.0,
+                response_model=MemberSummary,
+                invalidate_cache=True,
+                stage="member_regeneration",
+                template=template,
             )
-            assert new_summary is not None
             return await validate_summary_regenerate_if_broken(
                 prompt,
                 new_summary,
                 all_bill_ids,
                 member_id,
                 model=CLAUDE_SONNET,
+                template=template,
                 attempt=attempt + 1,
             )
 
 
 async def run_member_summary_prompts(
-    prompts: list[str], all_bill_ids: set[str], member_id: str, model: str
+    prompts: list[str],
+    all_bill_ids: set[str],
+    member_id: str,
+    model: str,
+    stage: str,
+    template: str,
 ) -> list[Optional[MemberSummary]]:
     """Attempts to fix broken bill links, and failed JSON validation"""
     summaries = await generate_text_batch(
         prompts,
         model=model,
         temperature=0.0,
+        response_model=MemberSummary,
+        stage=stage,
+        template=template,
     )
     return await asyncio.gather(
         *[
@@ -323,6 +501,7 @@ async def run_member_summary_prompts(
                 all_bill_ids=all_bill_ids,
                 member_id=member_id,
                 model=CLAUDE_HAIKU,
+                template=template,
             )
             for prompt, summary in zip(prompts, summaries)
         ]
@@ -336,54 +515,110 @@ async def generate_member_summary_batch(
         all_bill_ids = {vote.billID for vote in voting_record}
         prompts = get_member_summarisation_prompts(voting_record)
         sub_summaries = await run_member_summary_prompts(
-            prompts, all_bill_ids, member_id, model=CLAUDE_HAIKU
+            prompts,
+            all_bill_ids,
+            member_id,
+            model=CLAUDE_HAIKU,
+            stage="member_sub_summary",
+            template=SUMMARIZE_MEMBER_PROMPT,
         )
-        if any(summary is None for summary in sub_summaries):
+        complete_sub_summaries = [summary for summary in sub_summaries if summary is not None]
+        if len(complete_sub_summaries) < len(sub_summaries):
             return None
-        merge_summary_prompt = get_summary_merge_prompt(sub_summaries)  # type: ignore
-        # use the expensive model to merge them, as this is a small number of tokens,
-        # and is also the final output so should be polished
-        merged_summary = await run_member_summary_prompts(
-            [merge_summary_prompt], all_bill_ids, member_id, model=CLAUDE_SONNET
-        )
-        return merged_summary[0]
+
+        async def merge_level(
+            level: int, groups: list[list[MemberSummary]]
+        ) -> list[Optional[MemberSummary]]:
+            # use the expensive model to merge them, as this is a small number of tokens,
+            # and is also the final output so should be polished
+            return await run_member_summary_prompts(
+                [get_summary_merge_prompt(group) for group in groups],
+                all_bill_ids,
+                member_id,
+                model=CLAUDE_SONNET,
+                stage="member_merge",
+                template=MERGE_SUMMARIES_PROMPT,
+            )
+
+        return await merge_summaries_tree(complete_sub_summaries, merge_level)
     except Exception as e:
         print(f"Error generating summary for {member_id}: {e}")
         return None
 
 
-async def condense_member_summaries(
-    full_summaries: Iterable[MemberSummary],
-) -> list[str]:
-    """Generate a condensed version of the summary, which is more readable and less verbose."""
-    prompts = [
-        CONDENSE_SUMMARY_PROMPT_TEMPLATE.replace(
-            "{{RAW_INPUT_DATA}}", full_summary.model_dump_json()
-        )
-        for full_summary in full_summaries
-    ]
-    condensed_summaries = await asyncio.gather(
-        *[
-            generate_text(prompt, model=CLAUDE_SONNET, temperature=0.0)
-            for prompt in prompts
-        ]
+def get_condense_prompt(full_summary: MemberSummary) -> str:
+    return load_prompt_template(CONDENSE_SUMMARY_PROMPT).render(
+        RAW_INPUT_DATA=full_summary.model_dump_json()
     )
-    assert all(summary is not None for summary in condensed_summaries)
-    return condensed_summaries  # type: ignore
 
 
-async def condense_member_summaries_batch(
-    full_summaries: Iterable[MemberSummary],
-) -> list[str]:
-    """Generate a condensed version of the summary, which is more readable and less verbose."""
-    prompts = [
-        CONDENSE_SUMMARY_PROMPT_TEMPLATE.replace(
-            "{{RAW_INPUT_DATA}}", full_summary.model_dump_json()
+async def condense_member_summaries(
+    full_summaries: list[tuple[str, MemberSummary]], batch_mode: bool
+) -> list[tuple[str, str]]:
+    """Generate a condensed version of the summary, which is more readable and less verbose.
+    Members whose summary couldn't be condensed are left out."""
+    prompts = [get_condense_prompt(full_summary) for _, full_summary in full_summaries]
+    if batch_mode:
+        condensed_summaries = await generate_text_batch(
+            prompts,
+            model=CLAUDE_SONNET,
+            temperature=0.0,
+            stage="condense",
+            template=CONDENSE_SUMMARY_PROMPT,
         )
-        for full_summary in full_summaries
-    ]
-    condensed_summaries = await generate_text_batch(
-        prompts, model=CLAUDE_SONNET, temperature=0.0
-    )
-    assert all(summary is not None for summary in condensed_summaries)
-    return condensed_summaries  # type: ignore
+    else:
+        condensed_summaries = await asyncio.gather(
+            *[
+                generate_text(
+                    prompt,
+                    model=CLAUDE_SONNET,
+                    temperature=0.0,
+                    stage="condense",
+                    template=CONDENSE_SUMMARY_PROMPT,
+                )
+                for prompt in prompts
+            ]
+        )
+    result = []
+    for (member_id, _), condensed_summary in zip(full_summaries, condensed_summaries):
+        if condensed_summary is None:
+            print(f"Failed to condense summary for {member_id}")
+        else:
+            result.append((member_id, condensed_summary))
+    return result
+
+
+async def condense_member_summaries_stream(
+    full_summaries: AsyncIterable[tuple[str, MemberSummary]],
+    batch_mode: bool,
+    batch_size: int = CONDENSE_BATCH_SIZE,
+    max_delay: float = CONDENSE_BATCH_SECONDS,
+) -> AsyncIterator[tuple[str, str]]:
+    """Condense summaries as they arrive, rather than waiting for every member to be summarized.
+    Summaries are grouped into small batches (for batch pricing) which are submitted straight
+    away and run concurrently, so condensed summaries are yielded as each batch completes."""
+    condensed: asyncio.Queue[Optional[list[tuple[str, str]]]] = asyncio.Queue()
+
+    async def condense(batch: list[tuple[str, MemberSummary]]):
+        try:
+            await condensed.put(await condense_member_summaries(batch, batch_mode))
+        except Exception as e:
+            print(f"Error condensing summaries for {[member_id for member_id, _ in batch]}: {e}")
+
+    async def submit_all():
+        try:
+            async with asyncio.TaskGroup() as condense_tasks:
+                async for batch in micro_batches(full_summaries, batch_size, max_delay):
+                    condense_tasks.create_task(condense(batch))
+        finally:
+            await condensed.put(None)
+
+    submitter = asyncio.create_task(submit_all())
+    try:
+        while (batch_result := await condensed.get()) is not None:
+            for result in batch_result:
+                yield result
+        # raise any error from the incoming summaries
+        await submitter
+    finally:
+        submitter.cancel()
@@ -0,0 +1,234 @@
+"""Synthetic parliaments in the shape of the source data, for benchmarking and testing
+the database build and summarisation pipeline offline, at any size."""
+
+from dataclasses import dataclass
+from random import Random
+import re
+import sqlite3
+from typing import Any, Iterable, Optional
+
+import pandas as pd
+
+from repsheet_backend.cache import (
+    CacheKey,
+    GCSCache,
+    cache_key,
+    decompress_and_load_json,
+    dump_json_and_compress,
+)
+from repsheet_backend.common import PARLIMENTARY_SESSIONS, BillIssues, BillSummary, MemberSummary
+from repsheet_backend.db import RepsheetDB
+
+# Members that create_members_table checks can be found, in (honorific, first, last, riding) form
+REQUIRED_MEMBERS = (
+    ("Mr.", "Justin", "Trudeau", "Papineau"),
+    ("Mr.", "Harjit S.", "Sajjan", "Vancouver South"),
+    ("Ms.", "Soraya", "Martinez Ferrada", "Hochelaga"),
+    ("Mr.", "Gord", "Johns", "Courtenay—Alberni"),
+)
+PARTIES = ("Liberal", "Conservative", "NDP", "Bloc Québécois", "Green Party")
+VOTE_SUBJECTS = (
+    "2nd reading and referral to a committee of Bill",
+    "3rd reading and adoption of Bill",
+    "Amendment to the motion at 3rd reading of Bill",
+    "Opposition Motion (Cost of living)",
+)
+MEMBER_VOTES = ("Yea", "Yea", "Nay", None)
+# Share of members missing from each division
+ABSENT_RATE = 0.1
+
+BILL_ID_REGEX = re.compile(r"\b\d+-\d+-[A-Z]+-\d+\b")
+
+
+def synthetic_member_name(i: int) -> tuple[str, str, str, str]:
+    # fixed width, as find_member_id matches names by prefix and suffix
+    return ("Mx.", f"Member{i:05d}", f"Surname{i:05d}", f"Riding {i:05d}")
+
+
+def synthetic_bill_summary(rng: Random) -> BillSummary:
+    return BillSummary(
+        summary=" ".join(["This bill amends an Act to change how something works."] * 4),
+        issues=BillIssues(
+            **{
+                issue: f"It affects {issue} in a way that is described here at some length."
+                for issue in rng.sample(sorted(BillIssues.model_fields), 3)
+            }
+        ),
+    )
+
+
+def synthetic_member_summary(bill_ids: list[str]) -> MemberSummary:
+    """A member summary that links to bills, as the model's are."""
+    links = ", ".join(f"[Bill {bill_id}]({bill_id})" for bill_id in bill_ids[:5])
+    return MemberSummary(
+        summary=f"The member voted for several bills, including {links}.",
+        issues=BillIssues.model_validate(
+            {"jobs": f"Supported {links}.", "climate": "Opposed a climate bill."}
+        ),
+    )
+
+
+async def stub_generate_text(prompt: str, *args: Any, **kwargs: Any) -> str:
+    """Stands in for generate_text in member summarisation, answering every prompt (voting
+    record or merge) with a valid summary that links to bills mentioned in the prompt."""
+    return synthetic_member_summary(sorted(set(BILL_ID_REGEX.findall(prompt)))).model_dump_json()
+
+
+@dataclass
+class SyntheticParliament:
+    """Source data as returned by the fetch_* functions."""
+
+    members: pd.DataFrame
+    bills_by_session: dict[str, list[dict]]
+    votes_by_session: dict[str, pd.DataFrame]
+    member_votes_by_vote_id: dict[str, pd.DataFrame]
+
+    @property
+    def vote_count(self) -> int:
+        return len(self.member_votes_by_vote_id)
+
+
+def generate_parliament(
+    members: int = 338,
+    bills_per_session: int = 100,
+    votes_per_session: int = 300,
+    seed: int = 0,
+) -> SyntheticParliament:
+    rng = Random(seed)
+    names = list(REQUIRED_MEMBERS) + [
+        synthetic_member_name(i) for i in range(max(0, members - len(REQUIRED_MEMBERS)))
+    ]
+    member_rows = [
+        {
+            "Honorific Title": honorific,
+            "First Name": first_name,
+            "Last Name": last_name,
+            "Constituency": riding,
+            "Province / Territory": "Ontario",
+            "Political Affiliation": rng.choice(PARTIES),
+            "Start Date": "2021-09-20 12:00:00 a.m.",
+            "End Date": None,
+        }
+        for honorific, first_name, last_name, riding in names
+    ]
+    full_names = [
+        f"{honorific} {first_name} {last_name} ({riding})"
+        for honorific, first_name, last_name, riding in names
+    ]
+
+    bills_by_session = {}
+    votes_by_session = {}
+    member_votes_by_vote_id = {}
+    for parliamentary_session in PARLIMENTARY_SESSIONS:
+        parliament, session = (int(part) for part in parliamentary_session.split("-"))
+        bills_by_session[parliamentary_session] = [
+            {
+                "FirstReadingDateTime": f"20{parliament - 22}-01-{bill % 28 + 1:02d}T10:00:00",
+                "LongTitleEn": f"An Act to amend the Synthetic Act ({bill})",
+                "ShortTitleEn": "Appropriation Act" if bill == 0 else f"Synthetic Act {bill}",
+                "BillTypeEn": "Private Member’s Bill" if bill % 5 == 0 else "Government Bill",
+                "OriginatingChamberId": 1,
+                "SponsorEn": rng.choice(full_names),
+                "BillNumberFormatted": f"C-{bill + 1}",
+                "ReceivedRoyalAssentDateTime": "2022-06-01T10:00:00" if bill % 2 else None,
+            }
+            for bill in range(bills_per_session)
+        ]
+        vote_rows = []
+        for vote_number in range(1, votes_per_session + 1):
+            subject = rng.choice(VOTE_SUBJECTS)
+            bill_number = (
+                f"C-{rng.randint(1, bills_per_session)}" if subject.endswith("Bill") else None
+            )
+            vote_rows.append(
+                {
+                    "Parliament": parliament,
+                    "Session": session,
+                    "Date": f"20{parliament - 22}-03-{vote_number % 28 + 1:02d} 3:50:01 p.m.",
+                    "Vote Number": vote_number,
+                    "Vote Subject": subject,
+                    "Vote Result": rng.choice(("Agreed To", "Negatived")),
+                    "Yeas": 170,
+                    "Nays": 150,
+                    "Paired": 0,
+                    "Bill Number": bill_number,
+                }
+            )
+            member_votes_by_vote_id[f"{parliament}-{session}-{vote_number}"] = pd.DataFrame(
+                [
+                    {
+                        "Member of Parliament": full_name,
+                        "Political Affiliation": member["Political Affiliation"],
+                        "Member Voted": rng.choice(MEMBER_VOTES),
+                        "Paired": None,
+                    }
+                    for full_name, member in zip(full_names, member_rows)
+                    if rng.random() >= ABSENT_RATE
+                ]
+            )
+        votes_by_session[parliamentary_session] = pd.DataFrame(vote_rows)
+    return SyntheticParliament(
+        pd.DataFrame(member_rows), bills_by_session, votes_by_session, member_votes_by_vote_id
+    )
+
+
+def build_synthetic_db(
+    parliament: SyntheticParliament, db_path: str = ":memory:", seed: int = 0
+) -> RepsheetDB:
+    """Build every table the way build_db does, with a summary for every bill."""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    db = RepsheetDB(conn)
+    # the create_* methods modify the frames they're given
+    db.create_parliaments_table()
+    db.create_members_table(parliament.members.copy())
+    db.create_bills_table(parliament.bills_by_session)
+    db.create_votes_table({k: v.copy() for k, v in parliament.votes_by_session.items()})
+    db.create_member_votes_table(
+        {k: v.copy() for k, v in parliament.member_votes_by_vote_id.items()}
+    )
+    db.create_vote_summary_tables()
+    db.create_bill_final_reading_vote_table()
+    rng = Random(seed)
+    bill_ids = [bill_id for (bill_id,) in conn.execute("SELECT [Bill ID] FROM bills")]
+    db.insert_bill_summaries(
+        {bill_id: synthetic_bill_summary(rng).model_dump_json() for bill_id in bill_ids}  # type: ignore
+    )
+    conn.commit()
+    return db
+
+
+class MemoryCache(GCSCache):
+    """A GCSCache kept in memory, serialized and compressed the same way, so cache throughput
+    can be measured without Cloud Storage."""
+
+    def __init__(self, key_prefix: str = ""):
+        self.key_prefix = key_prefix
+        self.mode = "json"
+        self.blobs: dict[str, bytes] = {}
+
+    def _key(self, key: CacheKey) -> str:
+        if not isinstance(key, str):
+            key, _ = cache_key(key)
+        return f"{self.key_prefix}{key}"
+
+    def _has_sync(self, key: CacheKey) -> bool:
+        return self._key(key) in self.blobs
+
+    def _set_sync(self, key: CacheKey, value: Any) -> int:
+        data = self.blobs[self._key(key)] = dump_json_and_compress(value)
+        return len(data)
+
+    def _get_sync(self, key: CacheKey) -> Optional[Any]:
+        data = self.blobs.get(self._key(key))
+        return decompress_and_load_json(data) if data is not None else None
+
+    def list_entries(self) -> dict[str, int]:
+        return {key.removeprefix(self.key_prefix): len(data) for key, data in self.blobs.items()}
+
+    def delete_entries(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self.blobs.pop(self._key(key), None)
+
+    async def init(self):
+        pass
@@ -0,0 +1,72 @@
+from io import BytesIO
+
+from repsheet_backend.bill_xml import reduce_bill_xml, section_bill_xml
+
+
+def heading(level: int, label: str) -> str:
+    return f'<Heading level="{level}"><Label>{label}</Label></Heading>'
+
+
+def section(text: str) -> str:
+    return f"<Section><Text>{'word ' * 200}{text}</Text></Section>"
+
+
+def test_section_bill_xml():
+    body = (
+        heading(1, "PART 1")
+        + section("1")
+        + heading(1, "PART 2")
+        + "".join(heading(2, f"DIVISION {d}") + section(f"2.{d}") * 6 for d in range(1, 4))
+    )
+    xml_text = (
+        "<Bill><Identification><LongTitle>An Act</LongTitle></Identification>"
+        f"<Body>{body}</Body><Schedule><Text>schedule</Text></Schedule></Bill>"
+    )
+    sections = section_bill_xml(xml_text, 2000)
+    assert all(s.startswith("<Identification><LongTitle>An Act") for s in sections)
+    # the Part 2 heading stays with its first Division rather than the end of Part 1
+    assert "PART 2" not in sections[0]
+    assert "PART 2" in sections[1] and "DIVISION 1" in sections[1]
+    assert "DIVISION 2" in sections[2] and "DIVISION 3" in sections[3]
+    assert "schedule" in sections[-1]
+    assert len(section_bill_xml(xml_text, 100000)) == 1
+
+
+def test_reduce_bill_xml():
+    xml_text = (
+        '<Bill xml:lang="en"><Identification><LongTitle>An Act</LongTitle>'
+        '<BillHistory><Stages stage="first-reading"/></BillHistory></Identification>'
+        '<Body><Heading level="1" id="h1"><Label>PART 1</Label></Heading>'
+        '<Section id="s1"><Text>Amends the <XRefExternal link="I-3.3">Income Tax Act</XRefExternal>'
+        "   &amp; <DefinedTermFr>imp\u00f4t</DefinedTermFr></Text></Section></Body></Bill>"
+    )
+    reduced = reduce_bill_xml(BytesIO(xml_text.encode()))
+    assert "BillHistory" not in reduced and "id=" not in reduced and "imp" not in reduced
+    assert '<Heading level="1"><Label>PART 1</Label></Heading>' in reduced
+    assert "<Text>Amends the Income Tax Act &amp;</Text>" in reduced
+    # the reduced XML can still be split into sections
+    assert len(section_bill_xml(reduced, 100000)) == 1
+
+
+def test_section_bill_xml_splits_schedules():
+    schedule = (
+        "<Schedule><ScheduleFormHeading><Label>SCHEDULE 1</Label></ScheduleFormHeading>"
+        + "".join(section(f"item {i}") for i in range(12))
+        + "</Schedule>"
+    )
+    xml_text = (
+        "<Bill><Identification><LongTitle>An Appropriation Act</LongTitle></Identification>"
+        f"<Body>{section('body')}</Body>{schedule}"
+        "<Schedule><ScheduleFormHeading><Label>SCHEDULE 2</Label></ScheduleFormHeading></Schedule>"
+        "</Bill>"
+    )
+    sections = section_bill_xml(xml_text, 1000)
+    # the schedule is much bigger than the budget, so is split between sections
+    assert len(sections) > 3
+    schedule_1 = [s for s in sections if "SCHEDULE 1" in s]
+    assert len(schedule_1) > 1
+    assert all(s.count("<Schedule>") == s.count("</Schedule>") for s in sections)
+    # every part of the schedule is wrapped in it, with its heading
+    for i in range(12):
+        assert any(f"item {i}" in s for s in schedule_1)
+    assert "<Schedule><ScheduleFormHeading><Label>SCHEDULE 2" in sections[-1]
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from unittest import mock
+
+from repsheet_backend import genai
+from repsheet_backend.cache_manifest import CacheManifest
+from repsheet_backend.common import load_prompt_template
+from repsheet_backend.genai_metrics import GenaiMetrics
+from repsheet_backend.synthetic import MemoryCache
+
+TEMPLATE = "condense-summary/001.txt"
+
+
+def test_cache_manifest_records_writes_and_accesses(tmp_path):
+    manifest = CacheManifest(str(tmp_path / "manifest.sqlite"))
+    manifest.record_write("a", TEMPLATE, "claude", "condense", 100)
+    marked_at = time.time()
+    manifest.record_access("a", TEMPLATE, "claude", "condense")
+    # first seen on a read, e.g. written before the manifest existed
+    manifest.record_access("b", None, "gemini", "bill")
+
+    entries = manifest.entries()
+    assert entries["a"].size == 100
+    assert entries["a"].template_version == load_prompt_template(TEMPLATE).version
+    assert entries["b"].size is None
+    assert manifest.accessed_since(marked_at) == {"a", "b"}
+
+    report = manifest.report({"a": 100, "c": 50})
+    assert load_prompt_template(TEMPLATE).version in report
+    assert "unknown" in report
+
+    manifest.remove(["a"])
+    assert set(manifest.entries()) == {"b"}
+
+
+def test_cache_only_reads_and_marks_cached_entries(tmp_path):
+    cache = MemoryCache(key_prefix="google-ai/")
+    manifest = CacheManifest(str(tmp_path / "manifest.sqlite"))
+    key = {"method": "generate_text", "model": "claude", "prompt": "cached"}
+    asyncio.run(cache.set(key, "response"))
+
+    async def generate(prompt: str):
+        return await genai.generate_text(prompt, model="claude", template=TEMPLATE)
+
+    with (
+        mock.patch.object(genai, "genai_cache", cache),
+        mock.patch.object(genai, "cache_manifest", manifest),
+        mock.patch.object(genai, "genai_metrics", GenaiMetrics(trace_path=None)),
+        mock.patch.object(genai, "_generate_text_anthropic") as generate_anthropic,
+        genai.cache_only(),
+    ):
+        assert asyncio.run(generate("cached")) == "response"
+        assert asyncio.run(generate("not cached")) is None
+        # rendered data may contain braces, render() has already checked the slots
+        assert asyncio.run(generate("data with {{braces}}")) is None
+    generate_anthropic.assert_not_called()
+    assert set(manifest.entries()) == {cache.cache_key(key)}
+    assert set(cache.list_entries()) == {cache.cache_key(key)}
+
+
+def test_cache_manifest_template_changes(tmp_path):
+    manifest = CacheManifest(str(tmp_path / "manifest.sqlite"))
+    assert "current" in manifest.template_changes()
+    manifest.record_write("a", TEMPLATE, "claude", "condense", 100)
+    manifest.db.execute("UPDATE cache_manifest SET [Template Version] = 'old'")
+    assert "old (now " in manifest.template_changes()
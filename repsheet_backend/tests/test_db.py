@@ -0,0 +1,109 @@
+import asyncio
+import dataclasses
+import sqlite3
+from unittest import mock
+
+from repsheet_backend import db as db_module
+from repsheet_backend.db import RepsheetDB, classify_vote_subject
+from repsheet_backend.synthetic import build_synthetic_db, generate_parliament
+
+def test_classify_vote_subject():
+    assert classify_vote_subject("2nd reading and referral to a committee of Bill C-234") == "Second Reading"
+    assert classify_vote_subject("3rd reading and adoption of Bill C-5") == "Third Reading"
+    assert classify_vote_subject("Amendment to the motion at 3rd reading of Bill C-69") == "Amendment"
+    assert classify_vote_subject("Concurrence in Senate amendments to Bill C-11") == "Amendment"
+    assert classify_vote_subject("Concurrence at report stage of Bill C-21") == "Other"
+    assert classify_vote_subject(None) == "Other"
+
+
+def test_stream_writes_commits_in_batches():
+    db = RepsheetDB(sqlite3.connect(":memory:"))
+    batches: list[list[int]] = []
+
+    async def results():
+        for i in range(5):
+            yield i
+
+    async def write_all() -> list[int]:
+        return [r async for r in db.stream_writes(results(), batches.append, batch_size=2)]
+
+    assert asyncio.run(write_all()) == [0, 1, 2, 3, 4]
+    assert batches == [[0, 1], [2, 3], [4]]
+
+
+def table_rows(db: RepsheetDB, table: str) -> list[tuple]:
+    return sorted(tuple(map(repr, row)) for row in db.db.execute(f"SELECT * FROM {table}"))
+
+
+def test_update_vote_summaries_matches_full_rebuild():
+    parliament = generate_parliament(members=20, bills_per_session=6, votes_per_session=12)
+    full_db = build_synthetic_db(parliament)
+
+    # the latest divisions arrive after the database was built
+    votes = parliament.votes_by_session["44-1"]
+    is_new = votes["Vote Number"] > 7
+    new_vote_ids = [f"44-1-{number}" for number in votes[is_new]["Vote Number"]]
+    db = build_synthetic_db(
+        dataclasses.replace(
+            parliament,
+            votes_by_session={**parliament.votes_by_session, "44-1": votes.loc[~is_new]},
+            member_votes_by_vote_id={
+                k: v
+                for k, v in parliament.member_votes_by_vote_id.items()
+                if k not in new_vote_ids
+            },
+        )
+    )
+    assert db.insert_votes({"44-1": votes.loc[is_new].copy()}) == new_vote_ids
+    db.insert_member_votes(
+        {k: parliament.member_votes_by_vote_id[k].copy() for k in new_vote_ids}
+    )
+    db.update_vote_summaries(new_vote_ids)
+
+    for table in [
+        "vote_summary",
+        "vote_party_summary",
+        "member_stats",
+        "bill_final_reading_vote",
+    ]:
+        assert table_rows(db, table) == table_rows(full_db, table), table
+
+
+def test_compact_member_votes_view_matches_wide_table():
+    parliament = generate_parliament(members=20, bills_per_session=6, votes_per_session=12)
+    # a paired member, and a former member without a Member ID
+    old_votes = parliament.member_votes_by_vote_id["41-1-1"]
+    old_votes.loc[0, ["Member Voted", "Paired"]] = ["Paired", "Paired"]
+    old_votes.loc[len(old_votes)] = ["Mr. Former Member (Nowhere)", "Liberal", "Nay", None]
+    wide_db = build_synthetic_db(parliament)
+    db = build_synthetic_db(parliament)
+    # inserted in several chunks
+    with mock.patch.object(db_module, "COMPACT_INSERT_ROWS", 100):
+        db.create_member_votes_table(
+            {k: v.copy() for k, v in parliament.member_votes_by_vote_id.items()}, compact=True
+        )
+    assert db._has_compact_member_votes()
+    assert table_rows(db, "member_votes") == table_rows(wide_db, "member_votes")
+    assert table_rows(db, "member_stats") == table_rows(wide_db, "member_stats")
+
+    # reinserting votes replaces their rows and reuses their keys
+    vote_ids = list(parliament.member_votes_by_vote_id)[:3]
+    member_keys = table_rows(db, "member_keys")
+    db.insert_member_votes({k: parliament.member_votes_by_vote_id[k].copy() for k in vote_ids})
+    assert table_rows(db, "member_votes") == table_rows(wide_db, "member_votes")
+    assert table_rows(db, "member_keys") == member_keys
+
+
+def test_final_reading_vote_is_the_highest_numbered():
+    parliament = generate_parliament(members=6, bills_per_session=2, votes_per_session=100)
+    votes = parliament.votes_by_session["44-1"]
+    for vote_number, subject in [(99, "2nd reading"), (100, "3rd reading and adoption")]:
+        row = votes["Vote Number"] == vote_number
+        votes.loc[row, "Vote Subject"] = f"{subject} of Bill C-1"
+        votes.loc[row, "Bill Number"] = "C-1"
+    db = build_synthetic_db(parliament)
+
+    final_votes = db.db.execute(
+        "SELECT DISTINCT [Vote ID] FROM bill_final_reading_vote WHERE [Bill ID] = '44-1-C-1'"
+    ).fetchall()
+    assert [vote_id for (vote_id,) in final_votes] == ["44-1-100"]
@@ -0,0 +1,38 @@
+import orjson
+import pytest
+
+from repsheet_backend.genai import CLAUDE_SONNET, COST_PER_MTOK, record_usage
+from repsheet_backend.genai_metrics import GenaiCall, GenaiMetrics
+
+
+def test_genai_metrics_totals_by_stage(tmp_path):
+    trace_path = tmp_path / "trace.jsonl"
+    metrics = GenaiMetrics(str(trace_path))
+    metrics.record(
+        GenaiCall("merge", "claude", "batch", input_tokens=100, output_tokens=10, attempts=1),
+        "miss",
+        30.0,
+    )
+    metrics.record(GenaiCall("merge", "claude", "batch"), "hit", 0.1)
+    metrics.record(GenaiCall("bill", "gemini", "online", attempts=3), "miss", 2.0)
+
+    totals = metrics.totals()
+    assert totals["merge"].calls == 2
+    assert totals["merge"].hits == 1
+    assert totals["merge"].input_tokens == 100
+    # only calls that went to the API count towards latency
+    assert totals["merge"].latency == 30.0
+    assert totals["bill"].retries == 2
+
+    trace = [orjson.loads(line) for line in trace_path.read_bytes().splitlines()]
+    assert [call["cache"] for call in trace] == ["miss", "hit", "miss"]
+    assert trace[2]["retries"] == 2
+    assert "total" in metrics.report()
+
+
+def test_record_usage_prices_prompt_cache_tokens():
+    call = GenaiCall("merge", CLAUDE_SONNET, "online")
+    record_usage(call, 1_000_000, 0, cache_write_tokens=1_000_000, cache_read_tokens=1_000_000)
+    input_cost, _ = COST_PER_MTOK[CLAUDE_SONNET]
+    assert call.cost == pytest.approx(input_cost * (1 + 1.25 + 0.1))
+    assert call.cache_read_tokens == 1_000_000
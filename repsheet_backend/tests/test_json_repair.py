@@ -0,0 +1,18 @@
+import json
+
+from repsheet_backend.json_repair import repair_json
+
+
+def test_repair_json_leaves_valid_json_unchanged():
+    text = json.dumps({"summary": 'a "quoted"\nline \\$ [x](y)', "issues": {"jobs": None}}, indent=2)
+    assert repair_json(text) == text
+
+
+def test_repair_json():
+    assert json.loads(repair_json('```json\n{"a": "line\nbreak"}\n```')) == {"a": "line\nbreak"}
+    assert json.loads(repair_json('{"a": "costs \\$5"}')) == {"a": "costs $5"}
+    assert json.loads(repair_json('{"a": "b",\n}')) == {"a": "b"}
+    assert json.loads(repair_json('{"a": ["b", "c",],}')) == {"a": ["b", "c"]}
+    assert json.loads(repair_json('{"a": "b"\n"c": ""\n"d": {}}')) == {"a": "b", "c": "", "d": {}}
+    assert json.loads(repair_json('{"a": "escaped \\\\"}')) == {"a": "escaped \\"}
+    assert json.loads(repair_json('{"a": "x\\\ny\\\tz"}')) == {"a": "x\ny\tz"}
@@ -0,0 +1,42 @@
+import asyncio
+
+from repsheet_backend.pipeline import Pipeline, Stage, fingerprint
+
+
+def test_pipeline_skips_unchanged_stages(tmp_path):
+    source = {"version": 1}
+    runs: list[str] = []
+
+    def stage(name: str, fail: bool = False):
+        async def run():
+            runs.append(name)
+            if fail:
+                raise ValueError(name)
+
+        return run
+
+    def stages(fail: bool = False) -> list[Stage]:
+        return [
+            Stage("fetch", stage("fetch"), inputs=lambda: fingerprint(source)),
+            Stage("load", stage("load", fail), depends_on=("fetch",)),
+            Stage("summarize", stage("summarize"), depends_on=("load",)),
+            Stage("photos", stage("photos"), depends_on=("fetch",)),
+        ]
+
+    state_path = str(tmp_path / "state.json")
+    assert asyncio.run(Pipeline(stages(fail=True), state_path).run()) == ["load", "summarize"]
+    assert sorted(runs) == ["fetch", "load", "photos"]
+
+    # the stages that succeeded are not run again
+    runs.clear()
+    assert asyncio.run(Pipeline(stages(), state_path).run()) == []
+    assert runs == ["load", "summarize"]
+
+    runs.clear()
+    asyncio.run(Pipeline(stages(), state_path).run(force=["summarize"]))
+    assert runs == ["summarize"]
+
+    runs.clear()
+    source["version"] = 2
+    asyncio.run(Pipeline(stages(), state_path).run())
+    assert sorted(runs) == ["fetch", "load", "photos", "summarize"]
@@ -0,0 +1,63 @@
+import pytest
+
+from repsheet_backend.common import (
+    PROMPT_PARTIALS,
+    compile_prompt_template,
+    load_prompt_template,
+    read_prompt_file,
+)
+from repsheet_backend.genai import prompt_content
+from repsheet_backend.summarize_members import (
+    CONDENSE_SUMMARY_PROMPT,
+    MERGE_SUMMARIES_PROMPT,
+    SUMMARIZE_MEMBER_PROMPT,
+)
+
+
+def test_prompt_template_renders_slots():
+    template = compile_prompt_template("test.txt", "A {{X}} b {{Y}} c {{X}}")
+    assert template.slots == ("X", "Y", "X")
+    assert template.render(X="1", Y="{{not a slot}}") == "A 1 b {{not a slot}} c 1"
+    assert template.source == "A {{X}} b {{Y}} c {{X}}"
+    with pytest.raises(ValueError):
+        template.render(X="1")
+    with pytest.raises(ValueError):
+        compile_prompt_template("test.txt", "{{PARTIALS/UNKNOWN/001}} {{X}}")
+
+
+def test_prompt_template_version_changes_with_content():
+    version = compile_prompt_template("test.txt", "A {{X}}").version
+    assert version == compile_prompt_template("test.txt", "A {{X}}").version
+    assert version != compile_prompt_template("test.txt", "B {{X}}").version
+
+
+def test_prompt_template_renders_like_replace():
+    # rendering must give exactly the prompts (and so the cache keys) replacing did
+    template = read_prompt_file(SUMMARIZE_MEMBER_PROMPT)
+    for placeholder, partial_file_name in PROMPT_PARTIALS.items():
+        template = template.replace(placeholder, read_prompt_file(partial_file_name))
+    compiled = load_prompt_template(SUMMARIZE_MEMBER_PROMPT)
+    assert compiled.render(RAW_INPUT_DATA="[]") == template.replace("{{RAW_INPUT_DATA}}", "[]")
+    assert len(compiled.partials) == 3
+
+
+@pytest.mark.parametrize(
+    "file_name", [SUMMARIZE_MEMBER_PROMPT, MERGE_SUMMARIES_PROMPT, CONDENSE_SUMMARY_PROMPT]
+)
+def test_member_templates_put_data_last(file_name):
+    # everything before the data is the prefix shared (and prompt cached) across prompts
+    template = load_prompt_template(file_name)
+    assert template.slots == ("RAW_INPUT_DATA",)
+    assert template.segments[-1].strip() == ""
+
+
+def test_prompt_content_marks_template_prefix():
+    prompt = load_prompt_template(CONDENSE_SUMMARY_PROMPT).render(RAW_INPUT_DATA="{}")
+    content = prompt_content(prompt, CONDENSE_SUMMARY_PROMPT)
+    assert isinstance(content, list)
+    prefix_block, data_block = content
+    assert prefix_block["cache_control"] == {"type": "ephemeral"}
+    assert prefix_block["text"] + data_block["text"] == prompt
+    assert prompt_content(prompt, None) == prompt
+    other_prompt = "not rendered from the template"
+    assert prompt_content(other_prompt, CONDENSE_SUMMARY_PROMPT) == other_prompt
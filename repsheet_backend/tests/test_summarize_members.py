@@ -1,8 +1,140 @@
-from repsheet_backend.summarize_members import broken_bill_links
+import asyncio
+from typing import Optional
+from unittest import mock
+
+from repsheet_backend import genai
+from repsheet_backend.cache_manifest import CacheManifest
+from repsheet_backend.common import BillIssues, MemberSummary
+from repsheet_backend.genai_metrics import GenaiMetrics
+from repsheet_backend.summarize_members import (
+    SUMMARIZE_MEMBER_PROMPT,
+    batched_by_tokens,
+    broken_bill_links,
+    chunk_voting_record,
+    group_for_merge,
+    merge_summaries_tree,
+    validate_summary_regenerate_if_broken,
+)
+from repsheet_backend.synthetic import MemoryCache
+
+
+def member_summary(text: str) -> MemberSummary:
+    return MemberSummary(summary=text, issues=BillIssues.model_validate({}))
+
+
+def merge_summaries(
+    summaries: list[MemberSummary], fail_level: Optional[int] = None
+) -> tuple[Optional[MemberSummary], list[list[list[str]]]]:
+    """Merge with a fake model that joins summaries, returning the groups merged at each level."""
+    levels = []
+
+    async def merge_level(level: int, groups: list[list[MemberSummary]]):
+        levels.append([[summary.summary for summary in group] for group in groups])
+        if level == fail_level:
+            return [None for _ in groups]
+        return [member_summary("(" + " ".join(s.summary for s in group) + ")") for group in groups]
+
+    return asyncio.run(merge_summaries_tree(summaries, merge_level, fan_in=2)), levels
 
 def test_has_broken_bills_links():
     assert broken_bill_links("", set()) == set()
     assert broken_bill_links("[C-11](44-1-C-11)", {"44-1-C-11"}) == set()
     assert broken_bill_links("[C-11](44-1-C-11)", set()) == {"44-1-C-11"}
     assert broken_bill_links("[C-11](44-1-C-11)", {"44-1-C-1"}) == {"44-1-C-11"}
-    
\ No newline at end of file
+
+def test_batched_by_tokens():
+    objs = [{"summary": "x" * 350} for _ in range(10)]
+    assert list(batched_by_tokens([], 1000)) == []
+    assert list(batched_by_tokens(objs, 10000)) == [objs]
+    batches = list(batched_by_tokens(objs, 500))
+    assert [len(batch) for batch in batches] == [3, 4, 3]
+    assert [obj for batch in batches for obj in batch] == objs
+
+def test_group_for_merge():
+    assert group_for_merge([], 8) == []
+    assert group_for_merge([1, 2, 3], 8) == [[1, 2, 3]]
+    assert group_for_merge(list(range(5)), 2) == [[0, 1], [2, 3], [4]]
+
+def test_merge_summaries_tree():
+    assert merge_summaries([])[0] is None
+    summaries = [member_summary(str(i)) for i in range(5)]
+    merged, levels = merge_summaries(summaries)
+    assert merged is not None and merged.summary == "(((0 1) (2 3)) 4)"
+    # an odd group out is carried up a level unmerged
+    assert levels == [[["0", "1"], ["2", "3"]], [["(0 1)", "(2 3)"]], [["((0 1) (2 3))", "4"]]]
+    # the root is always merged, even a single summary
+    merged, levels = merge_summaries(summaries[:1])
+    assert merged is not None and merged.summary == "(0)"
+    assert merge_summaries(summaries, fail_level=1)[0] is None
+
+
+def test_chunk_voting_record_is_append_stable():
+    objs = [
+        {"billID": f"{session}-C-{i}", "summary": "x" * 350}
+        for session, count in [("43-1", 5), ("43-2", 30), ("44-1", 30)]
+        for i in range(count)
+    ]
+    chunks = chunk_voting_record(objs, 1000)
+    assert sorted(obj["billID"] for chunk in chunks for obj in chunk) == sorted(
+        obj["billID"] for obj in objs
+    )
+    new_chunks = chunk_voting_record(objs + [{"billID": "44-1-C-99", "summary": "x"}], 1000)
+    changed = [chunk for chunk in new_chunks if chunk not in chunks]
+    assert len(changed) == 1
+
+
+def test_chunk_voting_record_is_stable_as_session_grows():
+    objs = [{"billID": f"43-1-C-{i}", "summary": "x" * 350} for i in range(10)]
+    chunks = chunk_voting_record(objs, 1000)
+    rebucketed = 0
+    for i in range(60):
+        objs.append({"billID": f"44-1-C-{i}", "summary": "x" * 350})
+        new_chunks = chunk_voting_record(objs, 1000)
+        changed = [chunk for chunk in new_chunks if chunk not in chunks]
+        # only the bucket the new bill landed in, which may overflow into two chunks
+        if len(changed) > 2:
+            rebucketed += 1
+        else:
+            assert objs[-1] in changed[0] + changed[-1]
+        chunks = new_chunks
+    # the session doubling to 4, 8 and 16 buckets
+    assert rebucketed <= 3
+
+
+def test_regeneration_replays_from_cache(tmp_path):
+    cache = MemoryCache()
+    valid_summary = member_summary("Voted for [Bill C-1](44-1-C-1).").model_dump_json()
+    # the regeneration after invalidating the cache, as generate_text keys it
+    asyncio.run(
+        cache.set(
+            {
+                "method": "generate_text",
+                "model": genai.CLAUDE_SONNET,
+                "prompt": "regenerated",
+                "temperature": 0.0,
+                "response_schema": MemberSummary.model_json_schema(),
+            },
+            valid_summary,
+        )
+    )
+
+    def replay(prompt: str, summary: str, model: str) -> Optional[MemberSummary]:
+        return asyncio.run(
+            validate_summary_regenerate_if_broken(
+                prompt, summary, {"44-1-C-1"}, "member", model, SUMMARIZE_MEMBER_PROMPT
+            )
+        )
+
+    with (
+        mock.patch.object(genai, "genai_cache", cache),
+        mock.patch.object(genai, "cache_manifest", CacheManifest(str(tmp_path / "manifest.sqlite"))),
+        mock.patch.object(genai, "genai_metrics", GenaiMetrics(trace_path=None)),
+        genai.cache_only(),
+    ):
+        # a broken link whose regeneration isn't cached
+        broken_summary = member_summary("Voted for [Bill C-2](44-1-C-2).").model_dump_json()
+        assert replay("not regenerated", broken_summary, genai.CLAUDE_HAIKU) is None
+        # invalid with Sonnet, so the cache was invalidated and the summary regenerated
+        regenerated = replay("regenerated", "not json", genai.CLAUDE_SONNET)
+        assert regenerated is not None and regenerated.summary == "Voted for [Bill C-1](44-1-C-1)."
+        assert replay("not regenerated", "not json", genai.CLAUDE_SONNET) is None
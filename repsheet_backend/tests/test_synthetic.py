@@ -0,0 +1,25 @@
+import asyncio
+
+from repsheet_backend.synthetic import (
+    MemoryCache,
+    build_synthetic_db,
+    generate_parliament,
+)
+
+
+def test_synthetic_parliament_builds():
+    parliament = generate_parliament(members=12, bills_per_session=4, votes_per_session=6)
+    db = build_synthetic_db(parliament)
+    members = db.get_current_members()
+    assert len(members) == 12
+    assert any(len(db.get_member_voting_record(member.id)) > 0 for member in members)
+
+
+def test_memory_cache_round_trips():
+    cache = MemoryCache()
+
+    async def round_trip():
+        await cache.set({"prompt": "a"}, {"summary": "b"})
+        return await cache.get({"prompt": "a"}), await cache.has({"prompt": "c"})
+
+    assert asyncio.run(round_trip()) == ({"summary": "b"}, False)
@@ -0,0 +1,27 @@
+import asyncio
+
+from repsheet_backend.tracing import Tracer
+
+
+def test_tracer_spans():
+    tracer = Tracer()
+    with tracer.span("disabled"):
+        pass
+    assert tracer.events == []
+
+    tracer.enable()
+
+    async def task(name: str):
+        with tracer.span(name):
+            await asyncio.sleep(0.01)
+
+    async def run():
+        with tracer.span("outer"):
+            await asyncio.gather(task("a"), task("b"))
+
+    asyncio.run(run())
+    spans = {event["name"]: event for event in tracer.events if event["ph"] == "X"}
+    assert set(spans) == {"outer", "a", "b"}
+    # concurrent tasks are on their own tracks so their spans don't overlap on one track
+    assert len({spans[name]["tid"] for name in spans}) == 3
+    assert spans["outer"]["dur"] >= spans["a"]["dur"]
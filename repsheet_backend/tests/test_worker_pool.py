@@ -0,0 +1,102 @@
+import asyncio
+from typing import Optional
+
+from repsheet_backend.worker_pool import WorkerPool
+
+
+def run_pool(pool: WorkerPool, items: list[int]) -> list[tuple[int, int]]:
+    async def collect():
+        return [result async for result in pool.stream(items)]
+
+    return asyncio.run(collect())
+
+
+def test_worker_pool_bounds_prepared_tokens():
+    in_flight = 0
+    peak = 0
+
+    async def prepare(item: int) -> list[int]:
+        nonlocal in_flight, peak
+        await asyncio.sleep(0.001 * (item % 3))
+        # the prepared work exists from here until it has been processed
+        in_flight += 10
+        peak = max(peak, in_flight)
+        return [item] * 10
+
+    async def process(item: int, prepared: list[int]) -> int:
+        nonlocal in_flight
+        await asyncio.sleep(0.002)
+        in_flight -= len(prepared)
+        return item * 2
+
+    pool = WorkerPool(
+        name="test",
+        prepare=prepare,
+        size=len,
+        process=process,
+        workers=4,
+        max_tokens=35,
+        preparers=3,
+    )
+    results = run_pool(pool, list(range(40)))
+    assert sorted(results) == [(i, i * 2) for i in range(40)]
+    assert pool.failed == []
+    assert 20 <= peak <= 35
+    assert pool.budget.used == 0
+
+
+def test_worker_pool_recovers_concurrency_after_a_large_item():
+    processing = 0
+    peak = 0
+
+    async def prepare(item: int) -> list[int]:
+        # the first item is far bigger than the rest, and than the whole budget
+        return [item] * (1000 if item == 0 else 5)
+
+    async def process(item: int, prepared: list[int]) -> int:
+        nonlocal processing, peak
+        processing += 1
+        peak = max(peak, processing)
+        await asyncio.sleep(0.002)
+        processing -= 1
+        return item
+
+    pool = WorkerPool(
+        name="test",
+        prepare=prepare,
+        size=len,
+        process=process,
+        workers=4,
+        max_tokens=40,
+        preparers=4,
+    )
+    results = run_pool(pool, list(range(30)))
+    assert sorted(results) == [(i, i) for i in range(30)]
+    assert peak == 4
+    assert pool.budget.used == 0
+
+
+def test_worker_pool_collects_failures():
+    async def prepare(item: int) -> Optional[list[int]]:
+        if item == 1:
+            raise ValueError("could not prepare")
+        return None if item == 2 else [item]
+
+    async def process(item: int, prepared: list[int]) -> Optional[int]:
+        if item == 3:
+            raise ValueError("could not process")
+        return None if item == 4 else item
+
+    pool = WorkerPool(
+        name="test",
+        prepare=prepare,
+        size=len,
+        process=process,
+        workers=2,
+        max_tokens=2,
+        preparers=2,
+    )
+    results = run_pool(pool, list(range(8)))
+    assert sorted(results) == [(i, i) for i in (0, 5, 6, 7)]
+    assert sorted(pool.failed) == [1, 2, 3, 4]
+    assert pool.budget.used == 0
@@ -0,0 +1,147 @@
+import asyncio
+import cProfile
+from contextlib import contextmanager
+import functools
+import inspect
+import os
+from os import path
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+import orjson
+
+TRACE_OUTPUT = "debug/trace.json"
+PROFILE_DIR = "debug/profiles"
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Tracer:
+    """Records timed spans as Chrome trace events, viewable in Perfetto (ui.perfetto.dev) or
+    chrome://tracing. Does nothing unless enabled, so spans can stay in hot paths.
+
+    Each asyncio task gets its own track, as concurrent tasks on one thread would otherwise
+    overlap, and code run in a thread (e.g. with asyncio.to_thread) is shown on that thread."""
+
+    enabled: bool
+    profile: bool
+    events: list[dict[str, Any]]
+
+    def __init__(self):
+        self.enabled = False
+        self.profile = False
+        self.events = []
+        self._started_at = time.perf_counter()
+        self._tracks: dict[tuple[str, int], int] = {}
+        self._active_profile: Optional[str] = None
+
+    def enable(self, profile: bool = False) -> None:
+        """Start recording spans, and a cProfile dump for each profiled block if `profile`."""
+        self.enabled = True
+        self.profile = profile
+        self._started_at = time.perf_counter()
+
+    def _track(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        # tasks only run on the event loop's thread, so this is only a task if we're on that thread
+        key, name = (
+            (("task", id(task)), task.get_name())
+            if task is not None
+            else (("thread", threading.get_ident()), None)
+        )
+        if key not in self._tracks:
+            self._tracks[key] = len(self._tracks) + 1
+            self.events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": os.getpid(),
+                    "tid": self._tracks[key],
+                    "args": {"name": name or threading.current_thread().name},
+                }
+            )
+        return self._tracks[key]
+
+    def _now_us(self) -> float:
+        return (time.perf_counter() - self._started_at) * 1e6
+
+    @contextmanager
+    def span(self, name: str, category: str = "", **args: Any) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        track = self._track()
+        started_at = self._now_us()
+        try:
+            yield
+        finally:
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": started_at,
+                    "dur": self._now_us() - started_at,
+                    "pid": os.getpid(),
+                    "tid": track,
+                    "args": args,
+                }
+            )
+
+    @contextmanager
+    def profiled(self, name: str) -> Iterator[None]:
+        """cProfile the block into PROFILE_DIR/{name}.prof (open with snakeviz or pstats).
+        Only one block can be profiled at a time, others running alongside it are not profiled.
+        For async code the profile includes anything else run by the event loop in the meantime."""
+        if not self.profile or self._active_profile is not None:
+            yield
+            return
+        self._active_profile = name
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            self._active_profile = None
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(path.join(PROFILE_DIR, f"{name}.prof"))
+
+    def save(self, output_path: str = TRACE_OUTPUT) -> None:
+        if not self.enabled:
+            return
+        os.makedirs(path.dirname(output_path) or ".", exist_ok=True)
+        with open(output_path, "wb") as f:
+            f.write(orjson.dumps({"traceEvents": self.events, "displayTimeUnit": "ms"}))
+        print(f"Wrote {len(self.events)} trace events to {output_path}")
+
+
+tracer = Tracer()
+
+
+def traced(category: str = "") -> Callable[[F], F]:
+    """Record each call of a function (sync or async) as a span named after it."""
+
+    def decorator(func: F) -> F:
+        name = func.__qualname__
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name, category):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper  # type: ignore
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name, category):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
@@ -0,0 +1,200 @@
+import asyncio
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Generic, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+P = TypeVar("P")
+R = TypeVar("R")
+
+# How often to print progress, in seconds
+PROGRESS_INTERVAL = 10.0
+
+# How many recent item sizes reservations are estimated from, and the percentile of them reserved
+SIZE_WINDOW = 100
+SIZE_PERCENTILE = 0.9
+
+
+class Progress:
+    """Prints throughput and an estimated time remaining as items complete."""
+
+    name: str
+    total: int
+    interval: float
+    done: int
+    failed: int
+    started_at: float
+    last_reported_at: float
+
+    def __init__(self, name: str, total: int, interval: float = PROGRESS_INTERVAL):
+        self.name = name
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.started_at = time.monotonic()
+        self.last_reported_at = self.started_at
+
+    def update(self, succeeded: bool) -> None:
+        self.done += 1
+        if not succeeded:
+            self.failed += 1
+        now = time.monotonic()
+        if now - self.last_reported_at >= self.interval or self.done == self.total:
+            self.last_reported_at = now
+            print(self.report(now))
+
+    def report(self, now: float) -> str:
+        elapsed = now - self.started_at
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        eta = f"{remaining / rate / 60:.1f}m" if rate > 0 else "unknown"
+        return (
+            f"[{self.name}] {self.done}/{self.total} done ({self.failed} failed), "
+            f"{rate:.2f}/s, ETA {eta}"
+        )
+
+
+class TokenBudget:
+    """A semaphore weighted by prompt size, to bound how much prompt text is held in memory.
+    Work bigger than the whole budget is admitted on its own once everything else has finished."""
+
+    capacity: int
+    used: int
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.used = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, tokens: int) -> int:
+        tokens = min(tokens, self.capacity)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.used + tokens <= self.capacity)
+            self.used += tokens
+        return tokens
+
+    async def release(self, tokens: int) -> None:
+        async with self._condition:
+            self.used -= tokens
+            self._condition.notify_all()
+
+    async def resize(self, held: int, tokens: int) -> int:
+        """Change an acquired reservation to the actual size of the work. Work that turns out
+        bigger than its reservation already exists, so the difference is taken without waiting."""
+        tokens = min(tokens, self.capacity)
+        async with self._condition:
+            self.used += tokens - held
+            self._condition.notify_all()
+        return tokens
+
+
+class WorkerPool(Generic[T, P, R]):
+    """Runs work through a fixed number of workers fed by a bounded queue, so only a bounded
+    amount of prepared work (e.g. prompts) exists at once, and results are streamed as they arrive.
+
+    Each item is prepared (e.g. reading a bill and building its prompts) by one of `preparers`
+    producers, then processed by a worker. Its size isn't known until it has been prepared, so
+    each preparer first reserves an estimate (a high percentile of recent sizes, or an even share
+    of the budget until there are any) and the reservation is then corrected to the item's size,
+    releasing the unused part. Prepared work therefore stays within `max_tokens` except while
+    items come in bigger than their estimate."""
+
+    def __init__(
+        self,
+        name: str,
+        prepare: Callable[[T], Awaitable[Optional[P]]],
+        size: Callable[[P], int],
+        process: Callable[[T, P], Awaitable[Optional[R]]],
+        workers: int,
+        max_tokens: int,
+        preparers: int = 1,
+    ):
+        self.name = name
+        self.prepare = prepare
+        self.size = size
+        self.process = process
+        self.failed: list[T] = []
+        self.workers = workers
+        self.preparers = preparers
+        self.budget = TokenBudget(max_tokens)
+        self.sizes: deque[int] = deque(maxlen=SIZE_WINDOW)
+
+    def estimate(self) -> int:
+        """How many tokens to reserve for an item that hasn't been prepared yet."""
+        if not self.sizes:
+            return max(1, self.budget.capacity // self.preparers)
+        sizes = sorted(self.sizes)
+        return sizes[min(len(sizes) - 1, int(len(sizes) * SIZE_PERCENTILE))]
+
+    async def stream(self, items: Iterable[T]) -> AsyncIterator[tuple[T, R]]:
+        """Process every item, yielding results as they complete.
+        Items that failed are in `failed` once the stream is exhausted."""
+        items = list(items)
+        progress = Progress(self.name, len(items))
+        queue: asyncio.Queue[Optional[tuple[T, P, int]]] = asyncio.Queue(maxsize=self.workers)
+        results: asyncio.Queue[Optional[tuple[T, R]]] = asyncio.Queue()
+        failed = self.failed = []
+
+        def fail(item: T, error: Optional[Exception] = None) -> None:
+            if error is not None:
+                print(f"[{self.name}] Error processing {item}: {error}")
+            failed.append(item)
+            progress.update(succeeded=False)
+
+        items_iter = iter(items)
+
+        async def produce():
+            # producers share the iterator, so each item is prepared once
+            for item in items_iter:
+                reserved = await self.budget.acquire(self.estimate())
+                try:
+                    prepared = await self.prepare(item)
+                except Exception as e:
+                    await self.budget.release(reserved)
+                    fail(item, e)
+                    continue
+                if prepared is None:
+                    await self.budget.release(reserved)
+                    fail(item)
+                    continue
+                size = self.size(prepared)
+                self.sizes.append(size)
+                tokens = await self.budget.resize(reserved, size)
+                await queue.put((item, prepared, tokens))
+
+        async def produce_all():
+            await asyncio.gather(*[produce() for _ in range(self.preparers)])
+            for _ in range(self.workers):
+                await queue.put(None)
+
+        async def work():
+            while (work_item := await queue.get()) is not None:
+                item, prepared, tokens = work_item
+                try:
+                    result = await self.process(item, prepared)
+                except Exception as e:
+                    result = None
+                    fail(item, e)
+                else:
+                    if result is None:
+                        fail(item)
+                    else:
+                        progress.update(succeeded=True)
+                        await results.put((item, result))
+                finally:
+                    await self.budget.release(tokens)
+
+        async def run_all():
+            try:
+                await asyncio.gather(produce_all(), *[work() for _ in range(self.workers)])
+            finally:
+                await results.put(None)
+
+        runner = asyncio.create_task(run_all())
+        try:
+            while (result := await results.get()) is not None:
+                yield result
+            await runner
+        finally:
+            runner.cancel()
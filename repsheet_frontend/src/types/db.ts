@@ -11,6 +11,29 @@ export interface Member {
   Summary: string | null;
   "Short Summary": string | null;
   "Photo URL": string | null;
+  Slug: string;
+}
+
+export interface MemberPage {
+  member: Omit<Member, "Summary">;
+  summary: MemberSummary | null;
+  voteCount: number;
+  billCount: number;
+}
+
+export interface BillPage {
+  bill: Omit<Bill, "Summary">;
+  summary: BillSummary | null;
+}
+
+export interface PageManifestEntry {
+  path: string;
+  hash: string;
+}
+
+export interface PageManifest {
+  members: Record<string, PageManifestEntry>;
+  bills: Record<string, PageManifestEntry>;
 }
 
 export interface MemberSummary {
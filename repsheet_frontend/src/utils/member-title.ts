@@ -1,6 +1,8 @@
 import type { Member } from "../types/db";
 
-export function memberTitle(member: Member) {
+export function memberTitle(
+  member: Pick<Member, "Honorific Title" | "First Name" | "Last Name">
+) {
   return `${member["Honorific Title"] ?? ""} ${member["First Name"]} ${
     member["Last Name"]
   }`.trim();
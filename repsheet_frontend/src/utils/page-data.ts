@@ -0,0 +1,26 @@
+import { readFileSync } from "node:fs";
+import { resolve } from "node:path";
+import type { BillPage, MemberPage, PageManifest } from "../types/db";
+
+// Written by `make db-export-pages`, one pre-validated JSON document per page
+const pageDataDir = resolve("..", "page_data");
+
+function readJson<T>(relativePath: string): T {
+  return JSON.parse(readFileSync(resolve(pageDataDir, relativePath), "utf-8"));
+}
+
+let manifest: PageManifest | undefined;
+
+// Read once per build, every summary's bill links are checked against it
+export function readManifest(): PageManifest {
+  manifest ??= readJson<PageManifest>("manifest.json");
+  return manifest;
+}
+
+export function readMemberPage(slug: string): MemberPage {
+  return readJson<MemberPage>(`members/${slug}.json`);
+}
+
+export function readBillPage(billId: string): BillPage {
+  return readJson<BillPage>(`bills/${billId}.json`);
+}
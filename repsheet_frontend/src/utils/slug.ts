@@ -1,5 +0,0 @@
-import type { Member } from "../types/db";
-
-export function makeMemberSlug(member: Member) {
-  return `${member["First Name"]}_${member["Last Name"]}`;
-}